@@ -8,7 +8,7 @@ import json
 class BusinessAdmin(admin.ModelAdmin):
     list_display  = ("id","name","narxlar_diap_davri","yil_bosh_sotil_suv_soni","oy_bosh_sotil_suv_soni","created_at")
     search_fields = ("name",)
-    list_filter   = ("narxlar_diap_davri",)
+    list_filter   = ("narxlar_diap_davri", "order_num_scheme")
 
 @admin.register(UserMenedjer)
 class UserMenedjerAdmin(admin.ModelAdmin):
@@ -54,4 +54,4 @@ class AuditLogAdmin(admin.ModelAdmin):
 
     # Audit’ни админдан қўл билан ўзгартирмаслик қулай
     def has_add_permission(self, request): return False
-    def has_change_permission(self, request, obj=None): return False
\ No newline at end of file
+    def has_change_permission(self, request, obj=None): return False
\ No newline at end of file
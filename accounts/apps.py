@@ -4,3 +4,17 @@ from django.apps import AppConfig
 class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accounts'
+
+    def ready(self):
+        # geo_list ўзгарса — хотирадаги ҳудуд индексини ташлаймиз
+        from django.db.models.signals import post_save, post_delete
+        from .business_cache import business_cache
+        from .geo_index import geo_index
+        from .models import Business, GeoList
+
+        post_save.connect(geo_index.invalidate, sender=GeoList, dispatch_uid="geo_index_save")
+        post_delete.connect(geo_index.invalidate, sender=GeoList, dispatch_uid="geo_index_delete")
+
+        # ORM орқали ўзгарган бизнес — профил кэшидан ўчади (хом SQL йўллари ўзи чақиради)
+        post_save.connect(business_cache.on_business_change, sender=Business, dispatch_uid="business_cache_save")
+        post_delete.connect(business_cache.on_business_change, sender=Business, dispatch_uid="business_cache_delete")
@@ -0,0 +1,191 @@
+# accounts/audit.py
+"""
+audit_log учун буферли ёзувчи (sink).
+
+Аввал ҳар логин/рўйхат/пароль тиклаш қадамида сўров ичида алоҳида INSERT
+бажариларди. Энди ҳодиса процесс ичидаги навбатга қўйилади, фон оқими
+уларни пакет қилиб (битта кўп қаторли INSERT) ёзади:
+  - навбатда AUDIT_LOG_BATCH_SIZE та йиғилганда ёки
+  - AUDIT_LOG_FLUSH_INTERVAL сония ўтганда.
+Процесс тўхтаётганда (atexit) навбат охиригача ёзилади. Навбат тўлиб
+қолса ҳодиса ташланади ва `dropped` ҳисоблагичи ошади.
+
+AUDIT_LOG_ASYNC=0 бўлса — аввалгидек сўров ичида дарҳол ёзилади.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.utils import timezone
+
+logger = logging.getLogger("audit")
+
+COLUMNS = "(ts, actor_id, action, path, method, status, ip, user_agent, object_type, object_id, meta)"
+ROW_SQL = "(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s::jsonb)"
+
+_STOP = object()
+
+
+def build_event(action: str, request, *, actor_id=None, status=None,
+                object_type=None, object_id=None, meta=None) -> tuple:
+    """Сўровдан audit_log қатори (сўров оқимида, БДсиз)."""
+    ip = request.META.get("HTTP_X_FORWARDED_FOR", "").split(",")[0].strip() or request.META.get("REMOTE_ADDR")
+    return (
+        timezone.now(), actor_id, action, request.path, request.method, status, ip,
+        request.META.get("HTTP_USER_AGENT"), object_type, object_id, json.dumps(meta or {}),
+    )
+
+
+def write_events(events: list[tuple]) -> None:
+    """Пакетни битта кўп қаторли INSERT билан ёзади."""
+    sql = f"INSERT INTO public.audit_log {COLUMNS} VALUES " + ", ".join([ROW_SQL] * len(events))
+    params = [v for ev in events for v in ev]
+    with connection.cursor() as cur:
+        cur.execute(sql, params)
+
+
+class AuditSink:
+    def __init__(self, max_queue: int = 10000, batch_size: int = 200, flush_interval: float = 1.0):
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0   # навбат тўлгани учун ташланган ҳодисалар
+        self.failed = 0    # ёзишда хато чиққан ҳодисалар
+        self.written = 0
+        self._lock = threading.Lock()  # оқим/pid ҳолати ва юқоридаги ҳисоблагичлар
+        self._pid = None
+        self._queue = None
+        self._thread = None
+
+    def _ensure_started(self) -> None:
+        # gunicorn fork'идан кейин ҳар worker ўз оқимини бошлайди
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            self._queue = queue.Queue(maxsize=self.max_queue)
+            self._thread = threading.Thread(target=self._run, name="audit-sink", daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+
+    def emit(self, event: tuple) -> bool:
+        """Ҳодисани навбатга қўяди (кутмайди). Навбат тўла бўлса — False."""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(event)
+            return True
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+                dropped = self.dropped
+            if dropped == 1 or dropped % 1000 == 0:
+                logger.warning("audit_log навбати тўла: жами %s та ҳодиса ташланди", dropped)
+            return False
+
+    def _run(self) -> None:
+        q = self._queue
+        batch, deadline = [], None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = q.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                self._flush(batch)
+                q.task_done()
+                return
+            if item is not None:
+                batch.append(item)
+                q.task_done()
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+
+            if batch and (len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                self._flush(batch)
+                batch, deadline = [], None
+
+    def _flush(self, batch: list[tuple]) -> None:
+        if not batch:
+            return
+        try:
+            close_old_connections()  # CONN_MAX_AGE ва узилган уланишлар
+            write_events(batch)
+            with self._lock:
+                self.written += len(batch)
+        except Exception:
+            with self._lock:
+                self.failed += len(batch)
+            logger.exception("audit_log: %s та ҳодисани ёзиб бўлмади", len(batch))
+
+    def drain(self, timeout: float = 5.0) -> None:
+        """Навбатдагиларни ёзиб, оқимни тўхтатади (atexit)."""
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            logger.warning("audit_log: тўхташда навбат тўла, %s та ҳодиса ёзилмай қолди",
+                           self._queue.qsize())
+            return
+        self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "queued": self._queue.qsize() if self._queue is not None else 0,
+                "written": self.written,
+                "failed": self.failed,
+                "dropped": self.dropped,
+            }
+
+
+audit_sink = AuditSink(
+    max_queue=int(getattr(settings, "AUDIT_LOG_QUEUE_SIZE", 10000)),
+    batch_size=int(getattr(settings, "AUDIT_LOG_BATCH_SIZE", 200)),
+    flush_interval=float(getattr(settings, "AUDIT_LOG_FLUSH_INTERVAL", 1.0)),
+)
+atexit.register(audit_sink.drain)
+
+
+def deferred(action: str, request, *, meta=None, **kwargs):
+    """
+    Ҳодиса кейинроқ (масалан, фон оқимида натижа маълум бўлгач) ёзилади:
+    сўров маълумотлари ҳозир олинади, қайтарилган emit(**extra_meta) эса
+    ts'ни янгилаб meta'ни тўлдиради ва ҳодисани навбатга қўяди. emit ҳар
+    доим audit_sink орқали ёзади (AUDIT_LOG_ASYNC=0 бўлса ҳам) — чақирувчи
+    оқим БД уланишини очмайди.
+    """
+    event = build_event(action, request, meta=meta, **kwargs)
+    base_meta = dict(meta or {})
+
+    def emit(**extra_meta) -> None:
+        try:
+            audit_sink.emit((timezone.now(), *event[1:-1], json.dumps({**base_meta, **extra_meta})))
+        except Exception:
+            logger.exception("audit_log: %s ҳодисасини ёзиб бўлмади", action)
+
+    return emit
+
+
+def record(action: str, request, **kwargs) -> None:
+    """
+    audit_log ёзуви: AUDIT_LOG_ASYNC бўлса навбатга, бўлмаса дарҳол.
+    Лог ёзишдаги хато сервисни тўхтатмайди, лекин логга тушади.
+    """
+    try:
+        event = build_event(action, request, **kwargs)
+        if getattr(settings, "AUDIT_LOG_ASYNC", True):
+            audit_sink.emit(event)
+        else:
+            write_events([event])
+    except Exception:
+        logger.exception("audit_log: %s ҳодисасини ёзиб бўлмади", action)
@@ -0,0 +1,113 @@
+# accounts/business_cache.py
+"""
+accounts_business профилининг процесс ичидаги кэши.
+
+Бот, логин, буюртма ва молия йўллари бизнес қаторини id бўйича қайта-қайта
+ўқирди (lang, кейин boss_tel_num; мавжудлик текшируви ва ҳ.к.). Кам ўзгарадиган
+устунлар (PROFILE_FIELDS) битта SELECT билан олинади ва BUSINESS_CACHE_TTL
+сония сақланади. Ҳисоблагичлар, парол ва reset кодлар кэшга тушмайди —
+улар доим БДдан ўқилади.
+
+Қатор ўзгарганда (нархлар, рўйхатдан ўтиш, паролни тиклаш, ORM save/delete)
+`business_cache.invalidate(id)` чақирилади. Кэш процесс ичида — бошқа
+worker'лардаги нусха TTL ўтганда янгиланади.
+
+SELECT ва put() орасида invalidate() келса, ўқилган қатор эскирган бўлиши
+мумкин: шунинг учун ҳар id'нинг авлод (generation) рақами SELECT'дан олдин
+олинади ва у ўзгарган бўлса натижа кэшга ёзилмайди.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+from django.conf import settings
+
+PROFILE_FIELDS = (
+    "id", "name", "lang", "viloyat", "boss_tel_num",
+    "narxlar_diap_davri", "service_price_rules", "order_num_scheme",
+)
+
+
+class BusinessProfile(NamedTuple):
+    id: int
+    name: str
+    lang: str
+    viloyat: str | None
+    boss_tel_num: str | None
+    narxlar_diap_davri: str | None
+    service_price_rules: list | None
+    order_num_scheme: str
+
+
+class BusinessProfileCache:
+    def __init__(self, ttl_seconds: int = 60, missing_ttl_seconds: int = 5, max_size: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.missing_ttl_seconds = missing_ttl_seconds  # йўқ id'лар (рўйхатдан ўтиши мумкин) қисқароқ
+        self.max_size = max_size
+        self._items = OrderedDict()  # id -> (expires_at, BusinessProfile | None)
+        self._lock = threading.Lock()
+        self._gens = {}   # id -> invalidate() сони
+        self._epoch = 0   # invalidate(None) сони
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, business_id) -> BusinessProfile | None:
+        """Профиль (кэшдан ёки битта SELECT билан); бизнес топилмаса — None."""
+        try:
+            business_id = int(business_id)
+        except (TypeError, ValueError):
+            return None
+        now = time.monotonic()
+        with self._lock:
+            item = self._items.get(business_id)
+            if item is not None and item[0] > now:
+                self.hits += 1
+                return item[1]
+            self.misses += 1
+            gen = (self._epoch, self._gens.get(business_id, 0))
+        return self._load(business_id, gen)
+
+    def exists(self, business_id) -> bool:
+        return self.get(business_id) is not None
+
+    def _load(self, business_id: int, gen: tuple | None = None) -> BusinessProfile | None:
+        from .models import Business
+
+        row = Business.objects.filter(id=business_id).values_list(*PROFILE_FIELDS).first()
+        return self.put(business_id, BusinessProfile(*row) if row else None, gen)
+
+    def put(self, business_id: int, profile: BusinessProfile | None, gen: tuple | None = None) -> BusinessProfile | None:
+        """gen — SELECT'дан олдинги авлод; орада invalidate() бўлган бўлса кэшга ёзилмайди."""
+        ttl = self.ttl_seconds if profile is not None else self.missing_ttl_seconds
+        with self._lock:
+            if gen is not None and gen != (self._epoch, self._gens.get(business_id, 0)):
+                return profile
+            self._items[business_id] = (time.monotonic() + ttl, profile)
+            self._items.move_to_end(business_id)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+        return profile
+
+    def invalidate(self, business_id=None) -> None:
+        """Битта бизнес (ёки business_id=None — ҳаммаси) кэшдан ўчирилади."""
+        if business_id is None:
+            with self._lock:
+                self._items.clear()
+                self._gens.clear()  # epoch ўзгаргани учун эски авлодлар барибир мос келмайди
+                self._epoch += 1
+            return
+        try:
+            business_id = int(business_id)
+        except (TypeError, ValueError):
+            return
+        with self._lock:
+            self._items.pop(business_id, None)
+            self._gens[business_id] = self._gens.get(business_id, 0) + 1
+
+    def on_business_change(self, sender, instance, **kwargs) -> None:
+        # post_save/post_delete receiver
+        self.invalidate(instance.pk)
+
+
+business_cache = BusinessProfileCache(ttl_seconds=int(getattr(settings, "BUSINESS_CACHE_TTL", 60)))
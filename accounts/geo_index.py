@@ -0,0 +1,115 @@
+# accounts/geo_index.py
+"""
+geo_list марказларининг процесс ичидаги индекси.
+
+geo_list кичик ва кам ўзгаради, шунинг учун марказлар бир марта юкланади
+ва вилоят бўйича гуруҳланади. "Энг яқин марказ радиус ичидами?" саволи
+haversine билан хотирада ҳисобланади — ҳар буюртмада БДга бормаймиз.
+Вилоят ичида марказлар саноқли (10–30 та), шунинг учун вилоят калити
+фазовий бўлак вазифасини бажаради ва ичида оддий кўриб чиқиш етарли.
+
+Индекс GeoList сақланганда/ўчирилганда (signals) ва TTL ўтганда янгиланади.
+"""
+import logging
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+
+logger = logging.getLogger("orders")
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+class GeoIndexCold(Exception):
+    """Индекс юкланмаган ва юклаб бўлмади — чақирувчи PostGIS'га қайтади."""
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lng2 - lng1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class GeoIndex:
+    def __init__(self, ttl_seconds: int = 600):
+        self.ttl_seconds = ttl_seconds
+        # битта ўзгармас кортеж: (by_viloyat, incomplete, loaded_at) ёки None.
+        #   by_viloyat — {viloyat: ((nomi, lat, lng, radius_km), ...)}
+        #   incomplete — center_lat/lng тўлдирилмаган қатори бор вилоятлар
+        # Ҳар юклашда бутунлай алмаштирилади — ўқувчи уни бир марта олади ва
+        # invalidate()/load() параллел бўлса ҳам битта юклашнинг ҳолатини кўради.
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def _fresh(self, snapshot) -> bool:
+        return snapshot is not None and time.monotonic() - snapshot[2] < self.ttl_seconds
+
+    def is_warm(self) -> bool:
+        return self._fresh(self._snapshot)
+
+    def invalidate(self, *args, **kwargs) -> None:
+        # signal receiver сифатида ҳам ишлатилади (sender, instance, ...)
+        self._snapshot = None
+
+    def load(self) -> tuple:
+        from .models import GeoList
+
+        # savepoint: юклаш йиқилса, чақирувчининг транзакцияси бузилмасин (PostGIS fallback учун)
+        with transaction.atomic():
+            rows = list(GeoList.objects.values_list(
+                "viloyat", "shaxar_yoki_tuman_nomi", "center_lat", "center_lng", "radius_km"
+            ))
+        by_viloyat, incomplete = {}, set()
+        for viloyat, nomi, lat, lng, radius_km in rows:
+            if lat is None or lng is None:
+                incomplete.add(viloyat)
+                continue
+            by_viloyat.setdefault(viloyat, []).append(
+                (nomi, float(lat), float(lng), float(radius_km or 0))
+            )
+        by_viloyat = {k: tuple(v) for k, v in by_viloyat.items()}
+        snapshot = (by_viloyat, frozenset(incomplete), time.monotonic())
+        self._snapshot = snapshot
+        logger.info("geo_index loaded: %s viloyat, %s centers",
+                    len(by_viloyat), sum(len(v) for v in by_viloyat.values()))
+        return snapshot
+
+    def _ensure_loaded(self) -> tuple:
+        snapshot = self._snapshot
+        if self._fresh(snapshot):
+            return snapshot
+        with self._lock:
+            snapshot = self._snapshot
+            if self._fresh(snapshot):
+                return snapshot
+            try:
+                return self.load()
+            except DatabaseError as e:
+                raise GeoIndexCold(str(e)) from e
+
+    def nearest(self, viloyat: str, lat: float, lng: float):
+        """
+        Вилоятдаги энг яқин марказ.
+        Қайтаради: (nomi, dist_km, radius_km) | None (вилоятда марказ йўқ).
+        Индексни юклаб бўлмаса ёки вилоятда координатасиз марказ бўлса — GeoIndexCold.
+        """
+        by_viloyat, incomplete, _loaded_at = self._ensure_loaded()
+        centers = by_viloyat.get(viloyat)
+        if viloyat in incomplete:
+            raise GeoIndexCold(f"geo_list: '{viloyat}' марказларида center_lat/lng йўқ")
+        if not centers:
+            return None
+        best = None
+        for nomi, c_lat, c_lng, radius_km in centers:
+            d = haversine_km(lat, lng, c_lat, c_lng)
+            if best is None or d < best[1]:
+                best = (nomi, d, radius_km)
+        return best
+
+
+geo_index = GeoIndex(ttl_seconds=int(getattr(settings, "GEO_INDEX_TTL", 600)))
@@ -0,0 +1,26 @@
+from django.db import migrations, models
+
+from accounts.migrations._helpers import add_missing_columns
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0015_alter_geolist_options'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='business',
+            name='order_num_scheme',
+            field=models.CharField(choices=[('global', 'global'), ('business', 'business')], default='global', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='business',
+            name='order_num_seq',
+            field=models.BigIntegerField(default=0),
+        ),
+        # accounts_business — managed=False: order_num схемаси устунлари Postgres'да
+        # қўлда қўшилади, локал SQLite'да йўқ бўлса — шу ерда (order_num_seq default 0).
+        migrations.RunPython(add_missing_columns("Business", "order_num_scheme", "order_num_seq"), migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations, models
+
+from accounts.migrations._helpers import add_missing_columns
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0016_business_order_num_scheme'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='geolist',
+            name='center_lat',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='geolist',
+            name='center_lng',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='geolist',
+            name='radius_km',
+            field=models.FloatField(blank=True, default=20, null=True),
+        ),
+        # geo_list — managed=False; Postgres'да марказ/радиус устунлари SQL билан қўшилган.
+        # Локал SQLite базасида йўқ бўлса — қўшамиз, geo_index у ерда ҳам ишласин.
+        migrations.RunPython(add_missing_columns("GeoList", "center_lat", "center_lng", "radius_km"), migrations.RunPython.noop),
+    ]
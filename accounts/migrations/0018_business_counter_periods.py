@@ -0,0 +1,26 @@
+from django.db import migrations, models
+
+from accounts.migrations._helpers import add_missing_columns
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0017_geolist_center_columns'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='business',
+            name='hisob_oy_boshi',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='business',
+            name='hisob_yil_boshi',
+            field=models.DateField(blank=True, null=True),
+        ),
+        # accounts_business — managed=False: ҳисоблагич даври белгилари (NULL — ҳали
+        # нолланмаган) Postgres'да қўлда қўшилади, локал SQLite'да — шу ерда.
+        migrations.RunPython(add_missing_columns("Business", "hisob_oy_boshi", "hisob_yil_boshi"), migrations.RunPython.noop),
+    ]
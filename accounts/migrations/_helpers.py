@@ -0,0 +1,27 @@
+# accounts/migrations/_helpers.py
+"""
+managed=False жадваллар (accounts_business, geo_list) учун миграция ёрдамчилари.
+
+Бундай моделда AddField фақат миграция ҳолатини ўзгартиради — жадвалга тегмайди.
+Postgres'даги жадваллар ташқаридан бошқарилади, локал/тест SQLite базасида эса
+устунни ким қўшади — шу ерда. Модул номи "_" билан бошланади: Django уни
+миграция деб юкламайди.
+"""
+
+
+def add_missing_columns(model_name: str, *field_names: str):
+    """
+    RunPython учун функция: model_name жадвалида field_names устунларидан
+    йўқлари schema_editor.add_field() билан қўшилади, борлари ўзгармайди.
+    """
+    def forwards(apps, schema_editor):
+        model = apps.get_model("accounts", model_name)
+        conn = schema_editor.connection
+        with conn.cursor() as cur:
+            existing = {c.name for c in conn.introspection.get_table_description(cur, model._meta.db_table)}
+        for name in field_names:
+            field = model._meta.get_field(name)
+            if field.column not in existing:
+                schema_editor.add_field(model, field)
+
+    return forwards
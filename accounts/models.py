@@ -30,6 +30,9 @@ class Business(models.Model):
     # ҳисоблагичлар
     oy_bosh_sotil_suv_soni = models.IntegerField(null=True, blank=True)
     yil_bosh_sotil_suv_soni = models.IntegerField(null=True, blank=True)
+    # ҳисоблагичлар қайси ой/йил учун (давр боши); эскирган бўлса — нолланади (orders/sales_counters.py)
+    hisob_oy_boshi = models.DateField(null=True, blank=True)
+    hisob_yil_boshi = models.DateField(null=True, blank=True)
 
     # сана ва сервис қоидалари
     sana = models.DateField(default=timezone.localdate, editable=False)
@@ -55,6 +58,13 @@ class Business(models.Model):
     reset_code_expires_at = models.DateTimeField(null=True, blank=True)
     reset_code_attempts = models.SmallIntegerField(default=0)
 
+    # буюртма рақами (order_num) схемаси:
+    #   global   — умумий йил/ой/кун жами сув сегментлари ("05-03-02")
+    #   business — бизнес префикси + ўз кетма-кетлиги ("B12-000045")
+    ORDER_NUM_SCHEMES = (("global", "global"), ("business", "business"))
+    order_num_scheme = models.CharField(max_length=10, choices=ORDER_NUM_SCHEMES, default="global")
+    order_num_seq = models.BigIntegerField(default=0)  # business схемасида охирги берилган рақам
+
     class Meta:
         managed = False  # мавжуд жадвал билан миграция қилмасдан тўғридан-тўғри ишлаш
         db_table = "accounts_business"
@@ -1,3 +1,140 @@
-from django.test import TestCase
+import threading
+from unittest import mock
 
-# Create your tests here.
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+
+from .audit import AuditSink
+from .business_cache import BusinessProfileCache
+from .geo_index import GeoIndex
+from .models import GeoList
+
+
+class AuditSinkTests(SimpleTestCase):
+
+    def test_batches_by_size_and_drains_on_stop(self):
+        batches = []
+        sink = AuditSink(batch_size=3, flush_interval=60)
+        with mock.patch("accounts.audit.write_events", side_effect=lambda b: batches.append(len(b))):
+            for i in range(7):
+                sink.emit(("ev", i))
+            sink.drain()
+        self.assertEqual(batches, [3, 3, 1])
+        self.assertEqual(sink.stats()["written"], 7)
+
+    def test_full_queue_counts_dropped(self):
+        release = threading.Event()
+        sink = AuditSink(max_queue=1, batch_size=1, flush_interval=60)
+        with mock.patch("accounts.audit.write_events", side_effect=lambda b: release.wait(5)):
+            sink.emit(("ev", 0))          # оқим шуни ёзиш билан банд
+            while sink.stats()["queued"]:
+                pass
+            sink.emit(("ev", 1))          # навбатда
+            self.assertFalse(sink.emit(("ev", 2)))
+            release.set()
+            sink.drain()
+        self.assertEqual(sink.stats()["dropped"], 1)
+        self.assertEqual(sink.stats()["written"], 2)
+
+    def test_dropped_counter_under_concurrent_emit(self):
+        release = threading.Event()
+        sink = AuditSink(max_queue=1, batch_size=1, flush_interval=60)
+        rejected = []
+        with mock.patch("accounts.audit.write_events", side_effect=lambda b: release.wait(5)):
+            sink.emit(("ev", 0))
+            while sink.stats()["queued"]:
+                pass
+            sink.emit(("ev", 1))          # навбат тўла — қолганлари ташланади
+
+            def burst():
+                rejected.append(sum(not sink.emit(("ev", n)) for n in range(500)))
+
+            threads = [threading.Thread(target=burst) for _ in range(8)]
+            with self.assertLogs("audit", "WARNING"):
+                for t in threads:
+                    t.start()
+                for t in threads:
+                    t.join()
+            release.set()
+            sink.drain()
+        self.assertEqual((sink.stats()["dropped"], sum(rejected)), (4000, 4000))
+
+
+class BusinessProfileCacheTests(TestCase):
+    """Бизнес профили: битта SELECT, кейин кэшдан; invalidate ва TTL."""
+
+    def setUp(self):
+        with connection.cursor() as cur:
+            cur.execute(
+                "INSERT INTO accounts_business (id, name, created_at, sana, lang, viloyat, boss_tel_num, "
+                "order_num_scheme, order_num_seq) VALUES (5, 'biz-5', '2025-01-01 00:00:00', '2025-01-01', "
+                "'ru', 'Қашқадарё вилояти', '+998901112233', 'global', 0)"
+            )
+        self.cache = BusinessProfileCache(ttl_seconds=60)
+
+    def test_single_select_then_cached(self):
+        with self.assertNumQueries(1):
+            profile = self.cache.get(5)
+        self.assertEqual((profile.lang, profile.boss_tel_num), ("ru", "+998901112233"))
+        with self.assertNumQueries(0):
+            self.assertIs(self.cache.get("5"), profile)
+            self.assertTrue(self.cache.exists(5))
+
+        with connection.cursor() as cur:
+            cur.execute("UPDATE accounts_business SET lang = 'en' WHERE id = 5")
+        self.cache.invalidate(5)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.cache.get(5).lang, "en")
+
+    def test_missing_and_ttl(self):
+        with self.assertNumQueries(1):
+            self.assertIsNone(self.cache.get(6))
+            self.assertFalse(self.cache.exists(6))  # йўқлиги ҳам кэшланади
+        self.assertFalse(self.cache.exists("abc"))
+
+        expired = BusinessProfileCache(ttl_seconds=0)
+        expired.get(5)
+        with self.assertNumQueries(1):
+            expired.get(5)
+
+    def test_invalidate_during_load_is_not_cached(self):
+        real = self.cache.put
+
+        def put_after_update(business_id, profile, gen=None):
+            # SELECT тугади, put'дан олдин бошқа оқим қаторни ўзгартириб invalidate қилди
+            with connection.cursor() as cur:
+                cur.execute("UPDATE accounts_business SET lang = 'en' WHERE id = 5")
+            self.cache.invalidate(business_id)
+            return real(business_id, profile, gen)
+
+        with mock.patch.object(self.cache, "put", put_after_update):
+            self.assertEqual(self.cache.get(5).lang, "ru")  # шу чақирувчи эски қаторни олади
+        self.assertEqual(self.cache.get(5).lang, "en")      # лекин у кэшда қолмади
+
+        gen = (self.cache._epoch, 0)
+        self.cache.invalidate()
+        self.cache.put(6, None, gen)
+        with self.assertNumQueries(1):
+            self.cache.get(6)
+
+
+class GeoIndexSnapshotTests(TestCase):
+    """geo_index: nearest() битта юклашнинг ҳолатини ўқийди, invalidate() параллел бўлса ҳам."""
+
+    def test_invalidate_during_nearest(self):
+        GeoList.objects.create(viloyat="V", shaxar_yoki_tuman_nomi="Марказ", shaxar_yoki_tuman="шаҳар",
+                               center_lat=38.86, center_lng=65.79, radius_km=20)
+        index = GeoIndex(ttl_seconds=600)
+        index.load()
+
+        real = index._ensure_loaded
+
+        def ensure_then_invalidate():
+            snapshot = real()
+            index.invalidate()  # сигнал бошқа оқимда шу пайт келди
+            return snapshot
+
+        with mock.patch.object(index, "_ensure_loaded", ensure_then_invalidate):
+            self.assertEqual(index.nearest("V", 38.86, 65.79)[0], "Марказ")
+        self.assertFalse(index.is_warm())
+        self.assertEqual(index.nearest("V", 38.86, 65.79)[0], "Марказ")  # қайта юкланди
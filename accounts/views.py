@@ -6,10 +6,14 @@ from django.views.decorators.http import require_http_methods
 from django.conf import settings
 from django.db import connection, transaction        # ✅ Django connection
 from datetime import datetime
-import json, re, time, requests
+import json, logging, re, time, requests
 from django.contrib.auth.hashers import make_password, check_password
 from django.utils import timezone
 import secrets, string
+from .audit import record as audit_record
+from .business_cache import business_cache
+
+logger = logging.getLogger("audit")
 
 
 #Аудит назорат учун қайд логи
@@ -21,25 +25,10 @@ def audit_log(action: str,
               object_type: str | None = None,
               object_id: int | None = None,
               meta: dict | None = None):
-    try:
-        ip = request.META.get("HTTP_X_FORWARDED_FOR", "").split(",")[0].strip() or request.META.get("REMOTE_ADDR")
-        ua = request.META.get("HTTP_USER_AGENT")
-        path = request.path
-        method = request.method
-        print(f"action {action}")
-        with connection.cursor() as cur:
-            cur.execute(
-                """
-                INSERT INTO public.audit_log
-                    (ts, actor_id, action, path, method, status, ip, user_agent, object_type, object_id, meta)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s::jsonb)
-                """,
-                [timezone.now(), actor_id, action, path, method, status, ip, ua, object_type, object_id,
-                 json.dumps(meta or {})]
-            )
-    except Exception:
-        # лог ёзишдан хатолик сервисни тўхтатмасин
-        pass
+    # INSERT сўров ичида эмас — буферли sink фон оқимида пакет қилиб ёзади (accounts/audit.py)
+    logger.debug("audit_log: %s", action)
+    audit_record(action, request, actor_id=actor_id, status=status,
+                 object_type=object_type, object_id=object_id, meta=meta)
 
 
 # helpers (Ёрдамчи функциялар)
@@ -317,10 +306,11 @@ def set_business_prices(request):
             )
             if cur.rowcount == 0:
                 return JsonResponse({"status": "error", "detail": "business not found"}, status=404)
+    business_cache.invalidate(business_id)  # нарх қоидалари профил кэшида
 
     return JsonResponse({
         "status": "ok",
         "period": period_val,
         "rules": cleaned_rules,
         "business_id": business_id,
-    }, status=200)
\ No newline at end of file
+    }, status=200)
\ No newline at end of file
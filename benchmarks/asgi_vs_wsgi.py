@@ -0,0 +1,125 @@
+# benchmarks/asgi_vs_wsgi.py
+"""
+WSGI (gunicorn sync worker'лари) ва ASGI (uvicorn, async view'лар) режимларида
+bots эндпоинтларининг ўтказувчанлиги (сўров/сония).
+
+Локал сохта Bot API сервери кўтарилади (--api-delay — Telegram'гача тармоқ
+вақти ўрнида), иккала сервер ҳам бир хил worker сони билан ишга туширилади
+ва httpx билан --concurrency та параллел клиент --duration сония юклайди.
+
+    BOT_TOKEN=1:a python benchmarks/asgi_vs_wsgi.py [--workers 2] [--concurrency 50]
+
+Эндпоинтлар:
+  webhook  — /aiogram-bot-webhook/ ("/start" update'и → битта sendMessage)
+  forgot   — /bots/boss/forgot-password/start/ (--with-db; accounts_business
+             "public." схемаси билан ўқилади, яъни Postgres DATABASE_URL керак)
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+from bot_session import _free_port, _update, start_fake_api
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _server_cmd(mode: str, port: int, workers: int) -> list[str]:
+    if mode == "wsgi":
+        return [sys.executable, "-m", "gunicorn", "suv_kerak.wsgi", "-w", str(workers),
+                "-b", f"127.0.0.1:{port}", "--log-level", "warning"]
+    return [sys.executable, "-m", "uvicorn", "suv_kerak.asgi:application", "--workers", str(workers),
+            "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning", "--no-access-log"]
+
+
+def _wait_ready(port: int, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/bots/outbox/status", timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"сервер {port} портда кўтарилмади")
+
+
+async def _load(url: str, body_fn, concurrency: int, duration: float) -> tuple[int, int, float]:
+    ok = err = 0
+    counter = 0
+    deadline = time.monotonic() + duration
+
+    async def client_loop(client):
+        nonlocal ok, err, counter
+        while time.monotonic() < deadline:
+            counter += 1
+            try:
+                r = await client.post(url, content=body_fn(counter), headers={"Content-Type": "application/json"})
+                if r.status_code < 500:
+                    ok += 1
+                else:
+                    err += 1
+            except httpx.HTTPError:
+                err += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=60.0, limits=limits) as client:
+        t0 = time.monotonic()
+        await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+        elapsed = time.monotonic() - t0
+    return ok, err, elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--api-delay", type=float, default=0.1, help="сохта Bot API жавоб кечикиши (сония)")
+    parser.add_argument("--with-db", action="store_true", help="forgot эндпоинтини ҳам ўлчаш (Postgres)")
+    parser.add_argument("--forgot-id", type=int, default=1)
+    args = parser.parse_args()
+
+    api_port = _free_port()
+    stats = start_fake_api(api_port, delay=args.api_delay)
+
+    env = dict(os.environ)
+    env.setdefault("BOT_TOKEN", "1:bench")
+    env.update({
+        "TELEGRAM_API_BASE": f"http://127.0.0.1:{api_port}",
+        "METRICS_TOKEN": env.get("METRICS_TOKEN", ""),
+        "ACCESS_LOG_SAMPLE_RATE": "0",
+        "PYTHONPATH": ROOT,
+    })
+
+    endpoints = {"webhook": ("/aiogram-bot-webhook/", _update)}
+    if args.with_db:
+        endpoints["forgot"] = ("/bots/boss/forgot-password/start/",
+                               lambda n: json.dumps({"id": args.forgot_id}))
+
+    print(f"workers={args.workers} concurrency={args.concurrency} duration={args.duration}s "
+          f"api_delay={args.api_delay * 1000:.0f}ms")
+    for mode in ("wsgi", "asgi"):
+        port = _free_port()
+        server_env = dict(env, SERVER_MODE=mode)
+        proc = subprocess.Popen(_server_cmd(mode, port, args.workers), cwd=ROOT, env=server_env)
+        try:
+            _wait_ready(port)
+            for name, (path, body_fn) in endpoints.items():
+                reqs0 = stats["requests"]
+                ok, err, elapsed = asyncio.run(
+                    _load(f"http://127.0.0.1:{port}{path}", body_fn, args.concurrency, args.duration)
+                )
+                print(f"{mode:<5} {name:<8} {ok / elapsed:9.1f} req/s  ok={ok} err={err}  "
+                      f"api_calls={stats['requests'] - reqs0}")
+        finally:
+            proc.terminate()
+            proc.wait(15)
+
+
+if __name__ == "__main__":
+    main()
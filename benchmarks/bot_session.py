@@ -0,0 +1,129 @@
+# benchmarks/bot_session.py
+"""
+Webhook update'ини ишлаш нархи: ҳар update'да янги Bot сессияси (эски йўл)
+ва bot_runtime'нинг доимий сессияси.
+
+Локал сохта Bot API сервери кўтарилади (TELEGRAM_API_BASE унга қаратилади),
+ҳар update "/start" хабари — cmd_start битта sendMessage юборади.
+Сохта сервер оддий HTTP'да ишлайди; ҳақиқий api.telegram.org'да ҳар янги
+уланишга TLS handshake ҳам қўшилади, яъни фарқ бу ердагидан катта бўлади.
+
+    BOT_TOKEN=1:a python benchmarks/bot_session.py [-n 300]
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_fake_api(port: int, delay: float = 0.0) -> dict:
+    """
+    Bot API'га ўхшаш жавоб берувчи aiohttp сервер (алоҳида оқимда).
+    delay — ҳар жавобдан олдин кутиш (api.telegram.org гача тармоқ вақти ўрнида).
+    """
+    from aiohttp import web
+
+    stats = {"requests": 0, "peers": set()}
+
+    async def handle(request):
+        if delay:
+            await asyncio.sleep(delay)
+        # ҳар янги TCP уланиш — янги клиент порти
+        stats["peers"].add(request.transport.get_extra_info("peername"))
+        stats["requests"] += 1
+        return web.json_response({"ok": True, "result": {
+            "message_id": stats["requests"], "date": int(time.time()),
+            "chat": {"id": 1, "type": "private"}, "text": "ok",
+        }})
+
+    ready = threading.Event()
+
+    def _run():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        app = web.Application()
+        app.router.add_post("/{path:.*}", handle)
+        runner = web.AppRunner(app, handle_signals=False, access_log=None)
+        loop.run_until_complete(runner.setup())
+        loop.run_until_complete(web.TCPSite(runner, "127.0.0.1", port).start())
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=_run, name="fake-telegram", daemon=True).start()
+    ready.wait()
+    return stats
+
+
+def _update(n: int) -> str:
+    return (
+        '{"update_id": %d, "message": {"message_id": %d, "date": 0, "text": "/start",'
+        ' "chat": {"id": 1, "type": "private"}, "from": {"id": 1, "is_bot": false, "first_name": "b"}}}'
+    ) % (n, n)
+
+
+def _measure(label: str, fn, n: int, stats: dict) -> None:
+    fn(0)  # иситиш
+    stats["peers"].clear()
+    reqs0 = stats["requests"]
+    samples = []
+    for i in range(1, n + 1):
+        t0 = time.perf_counter()
+        fn(i)
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    samples.sort()
+    print(f"{label:<22} n={n}  mean={statistics.fmean(samples):7.3f}ms  "
+          f"p50={samples[len(samples) // 2]:7.3f}ms  p95={samples[int(len(samples) * 0.95)]:7.3f}ms  "
+          f"tcp_connections={len(stats['peers'])}  api_calls={stats['requests'] - reqs0}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=300)
+    args = parser.parse_args()
+
+    port = _free_port()
+    os.environ["TELEGRAM_API_BASE"] = f"http://127.0.0.1:{port}"
+    os.environ.setdefault("BOT_TOKEN", "1:bench")
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "suv_kerak.settings")
+
+    import logging
+    import django
+    django.setup()
+    for name in ("bots", "aiogram"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    from aiogram import Bot
+    from aiogram.client.default import DefaultBotProperties
+    from aiogram.enums import ParseMode
+    from asgiref.sync import async_to_sync
+
+    from bots.runtime import bot_runtime, make_session
+    from bots.suv_kerak_bot import BOT_TOKEN, _process_update
+
+    stats = start_fake_api(port)
+
+    async def per_update_session(body: str) -> None:
+        # эски йўл: ҳар update'да янги сессия ва Bot
+        defaults = DefaultBotProperties(parse_mode=ParseMode.HTML)
+        async with Bot(token=BOT_TOKEN, session=make_session(), default=defaults) as bot:
+            await _process_update(bot, body)
+
+    _measure("per-update session", lambda i: async_to_sync(per_update_session)(_update(i)), args.n, stats)
+    _measure("bot_runtime (shared)", lambda i: bot_runtime.run(_process_update, _update(i), timeout=10), args.n, stats)
+    bot_runtime.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# benchmarks/pricing.py
+"""
+Бир буюртма нархини аниқлаш: аввалги йўл (ҳар сафар service_price_rules
+JSON'ини сортлаш ва чизиқли кўриб чиқиш) ва finance/pricing.py'нинг
+компиляция қилинган жадвали (кэшдан + bisect).
+
+    python benchmarks/pricing.py [--rules 12] [-n 200000]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from finance.pricing import business_price_table  # noqa: E402
+
+
+def _old_price(rules, counter_value):
+    try:
+        rules = sorted(rules or [], key=lambda r: int(r.get("start", 0)))
+    except Exception:
+        rules = []
+    unit_price = 0
+    for r in rules:
+        try:
+            start = int(r.get("start", 0))
+            end_raw = r.get("end", None)
+            end = None if end_raw is None else int(end_raw)
+            price = int(r.get("price", 0))
+        except Exception:
+            continue
+        if counter_value >= start and (end is None or counter_value <= end):
+            unit_price = price
+            break
+    if unit_price == 0 and rules:
+        last = rules[-1]
+        if last.get("end") is None:
+            try:
+                unit_price = int(last.get("price", 0))
+            except Exception:
+                unit_price = 0
+    return unit_price
+
+
+def _rules(count: int) -> list[dict]:
+    # JSON'дан келгандек: сонлар қатор кўринишида ҳам бўлиши мумкин
+    rules = [{"start": str(i * 100), "end": str(i * 100 + 99), "price": 2000 - i * 10} for i in range(count - 1)]
+    rules.append({"start": (count - 1) * 100, "end": None, "price": 1000})
+    random.Random(1).shuffle(rules)
+    return rules
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rules", type=int, default=12)
+    parser.add_argument("-n", type=int, default=200000)
+    args = parser.parse_args()
+
+    rules = _rules(args.rules)
+    counters = [random.Random(2).randint(0, args.rules * 110) for _ in range(args.n)]
+    # ҳар буюртмада бизнес қатори БДдан қайта ўқилади — JSON ҳам янги объект
+    raw = json.dumps(rules)
+    copies = [json.loads(raw) for _ in range(args.n)]
+
+    t0 = time.perf_counter()
+    old = [_old_price(r, x) for r, x in zip(copies, counters)]
+    old_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    new = [business_price_table(1, r).unit_price(x) for r, x in zip(copies, counters)]
+    new_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    table = business_price_table(1, rules)
+    batch = [table.unit_price(x) for x in counters]
+    batch_s = time.perf_counter() - t0
+
+    assert old == new == batch
+    print(f"rules={args.rules} n={args.n}")
+    print(f"old (sort + linear)   {old_s / args.n * 1e6:8.2f} us/order")
+    print(f"compiled (cache+bisect) {new_s / args.n * 1e6:6.2f} us/order")
+    print(f"compiled (one table)  {batch_s / args.n * 1e6:8.2f} us/order")
+
+
+if __name__ == "__main__":
+    main()
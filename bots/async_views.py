@@ -0,0 +1,92 @@
+# bots/async_views.py
+"""
+ASGI режими (SERVER_MODE=asgi, suv_kerak/asgi.py) учун bots view'ларининг async вариантлари.
+
+ASGI остида Django оддий sync view'ларни битта умумий оқимда (thread_sensitive)
+навбат билан бажаради — I/O кутаётган view қолганларини ҳам тўхтатади. Шунинг учун:
+  - webhook: update bot_runtime loop'ига юборилади ва `await` қилинади —
+    Telegram'га жавоблар кутилаётганда сервер оқими банд бўлмайди;
+  - рўйхатдан ўтиш ва паролни тиклаш: view'нинг БД қисми чекланган thread
+    pool'да (ASGI_DB_THREADS) параллел бажарилади; Telegram хабарлари эса
+    telegram_outbox орқали кетади (кутилмайди).
+"""
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import HttpResponseNotAllowed, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+
+from suv_kerak.middleware import track_queries
+from .runtime import bot_runtime
+from .suv_kerak_bot import (
+    _enqueue_update,
+    _pretty_json,
+    _process_update,
+    forgot_boss_password_start,
+    forgot_boss_password_verify,
+    register_boss,
+)
+
+logger = logging.getLogger("bots")
+
+# ҳар оқим ўз БД уланишини сақлайди — pool ҳажми уланишлар сонини ҳам чеклайди
+_db_executor = ThreadPoolExecutor(
+    max_workers=int(getattr(settings, "ASGI_DB_THREADS", 16)), thread_name_prefix="asgi-db",
+)
+
+
+def offload_to_db_thread(view):
+    """
+    БД билан ишлайдиган sync view'ни _db_executor'да бажарадиган async view.
+    Уланиш ҳолати ўша оқимда (request_started/finished каби) текширилади.
+    """
+    def run(request, *args, **kwargs):
+        close_old_connections()
+        try:
+            with track_queries():  # SQL шу оқим уланишида — /metrics'га шу ерда саналади
+                return view(request, *args, **kwargs)
+        finally:
+            close_old_connections()
+
+    run_async = sync_to_async(run, thread_sensitive=False, executor=_db_executor)
+
+    @functools.wraps(view)  # csrf_exempt ва бошқа атрибутлар ҳам кўчади
+    async def wrapper(request, *args, **kwargs):
+        return await run_async(request, *args, **kwargs)
+
+    return wrapper
+
+
+register_boss_async = offload_to_db_thread(register_boss)
+forgot_boss_password_start_async = offload_to_db_thread(forgot_boss_password_start)
+forgot_boss_password_verify_async = offload_to_db_thread(forgot_boss_password_verify)
+
+
+@csrf_exempt
+async def aiogram_webhook_view_async(request):
+    if request.method != "POST":
+        return HttpResponseNotAllowed(["POST"])
+
+    try:
+        body = (request.body or b"").decode("utf-8", errors="ignore")
+        if not body.strip():
+            logger.warning("Empty Telegram webhook body")
+            return JsonResponse({"ok": True})
+
+        logger.debug("Webhook body (pretty):\n%s", _pretty_json(body)[:2000])
+
+        if settings.BOT_WEBHOOK_MODE == "queue":
+            return _enqueue_update(body)
+
+        # bot_runtime loop'ида ишланади; бу ерда фақат натижа кутилади (оқим банд эмас)
+        future = bot_runtime.submit(_process_update, body)
+        await asyncio.wait_for(asyncio.wrap_future(future), settings.BOT_UPDATE_TIMEOUT)
+        return JsonResponse({"ok": True})
+    except Exception:
+        logger.exception("❌ webhook top-level exception")
+        return JsonResponse({"ok": True})
@@ -0,0 +1,53 @@
+# bots/management/commands/replay_webhook_dead_letters.py
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from bots.models import WebhookDeadLetter
+from bots.runtime import bot_runtime
+from bots.suv_kerak_bot import _process_update
+from bots.webhook_queue import run_update
+
+
+class Command(BaseCommand):
+    help = (
+        "bot_webhook_dead_letter'даги ишланмаган Telegram update'ларини эски→янги "
+        "тартибда қайта ишлайди. Муваффақиятлилари replayed_at билан белгиланади, "
+        "қолганларида attempts ва error янгиланади. Update бошидан ишланади: хатодан "
+        "олдин жавоб кетган (replies_sent) update'лар жавобни такрорлайди, шунинг "
+        "учун улар фақат --include-sent билан олинади; қайта ишлашда жавобдан кейин "
+        "хато бўлса, қатор replies_sent деб белгиланади."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=100, help="Бир ишга туширишда нечтаси")
+        parser.add_argument("--chat", type=int, help="Фақат шу chat_id")
+        parser.add_argument("--include-sent", action="store_true",
+                            help="Жавоби (қисман) кетган update'ларни ҳам қайта ишлаш — жавоб такрорланади")
+
+    def handle(self, *args, **options):
+        qs = WebhookDeadLetter.objects.filter(replayed_at__isnull=True).order_by("id")
+        if options["chat"]:
+            qs = qs.filter(chat_id=options["chat"])
+        if not options["include_sent"]:
+            qs = qs.filter(replies_sent=False)
+
+        ok = failed = 0
+        for dl in qs[: options["limit"]]:
+            try:
+                e, sent = bot_runtime.run(run_update, _process_update, dl.body, settings.BOT_UPDATE_TIMEOUT)
+            except Exception as err:  # runtime'нинг ўзи ишламаса
+                e, sent = err, set()
+            if e is not None:
+                failed += 1
+                dl.attempts += 1
+                dl.error = f"{type(e).__name__}: {e}"[:4000]
+                dl.replies_sent = dl.replies_sent or bool(sent)
+                dl.save(update_fields=["attempts", "error", "replies_sent"])
+                self.stderr.write(f"update {dl.update_id}: {dl.error}")
+                continue
+            ok += 1
+            dl.replayed_at = timezone.now()
+            dl.save(update_fields=["replayed_at"])
+
+        self.stdout.write(self.style.SUCCESS(f"Қайта ишланди: {ok} та, хато: {failed} та."))
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebhookDeadLetter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('update_id', models.BigIntegerField(blank=True, null=True)),
+                ('chat_id', models.BigIntegerField(blank=True, null=True)),
+                ('body', models.TextField()),
+                ('error', models.TextField(blank=True, default='')),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('replayed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Ишланмаган webhook update',
+                'verbose_name_plural': "Ишланмаган webhook update'лари",
+                'db_table': 'bot_webhook_dead_letter',
+                'indexes': [models.Index(fields=['replayed_at', 'id'], name='idx_wdl_replayed_id')],
+            },
+        ),
+    ]
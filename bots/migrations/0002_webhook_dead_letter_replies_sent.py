@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 13:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bots', '0001_webhook_dead_letter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='webhookdeadletter',
+            name='replies_sent',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# bots/models.py
+from django.db import models
+
+
+class WebhookDeadLetter(models.Model):
+    """
+    Навбат режимида (BOT_WEBHOOK_MODE=queue) барча уринишлардан кейин ҳам
+    ишланмаган Telegram update'лари. replay_webhook_dead_letters буйруғи
+    уларни қайта ишлайди (replies_sent белгилиларини — фақат --include-sent билан).
+    """
+    update_id = models.BigIntegerField(null=True, blank=True)
+    chat_id = models.BigIntegerField(null=True, blank=True)
+    body = models.TextField()                       # update JSON — ўзгаришсиз
+    error = models.TextField(blank=True, default="")
+    attempts = models.PositiveIntegerField(default=0)
+    replies_sent = models.BooleanField(default=False)  # хатодан олдин Telegram'га жавоб кетган
+    created_at = models.DateTimeField(auto_now_add=True)
+    replayed_at = models.DateTimeField(null=True, blank=True)  # қайта ишланган вақт
+
+    class Meta:
+        db_table = "bot_webhook_dead_letter"
+        verbose_name = "Ишланмаган webhook update"
+        verbose_name_plural = "Ишланмаган webhook update'лари"
+        indexes = [
+            models.Index(fields=["replayed_at", "id"], name="idx_wdl_replayed_id"),
+        ]
+
+    def __str__(self):
+        return f"update {self.update_id} (chat {self.chat_id}): {self.attempts} уриниш"
@@ -0,0 +1,309 @@
+# bots/outbox.py
+"""
+Telegram'га чиқувчи хабарлар навбати (sendMessage).
+
+Аввал хабарлар сўров оқимида requests.post билан юбориларди, 429 бўлса
+worker `time.sleep(retry_after)` билан сонияларга қотиб қоларди. Энди
+`telegram_outbox.send()` хабарни навбатга қўйиб дарҳол id қайтаради,
+юбориш bot_runtime loop'ида:
+  - умумий token bucket (TELEGRAM_GLOBAL_RATE хабар/сония) ва ҳар чат учун
+    алоҳида bucket (шахсий чат — TELEGRAM_CHAT_RATE, гуруҳ — TELEGRAM_GROUP_RATE);
+  - битта чатга хабарлар навбатдаги тартибда кетади;
+  - 429 да чат retry_after'гача тўхтатилади, тармоқ/5xx хатоларида ўсиб
+    борувчи кутиш билан TELEGRAM_SEND_RETRIES марта қайта уринилади;
+    400/403 каби хатолар қайта уринилмайди.
+Ҳар хабар ҳолати (queued/sending/sent/failed) процесс хотирасида сақланади —
+`status()`/`stats()` ва /bots/outbox/status шулардан ўқийди. Хабар id'си
+юборган worker pid'и билан бошланади (`<pid>-<hex>`): бошқа worker ундан
+хабар бермайди. Якуний FAILED ҳолати эса ERROR логига ва (send(on_failed=...)
+берилган бўлса) audit_log'га ҳам тушади — процесс тўхтаса ҳам сақланади.
+"""
+import asyncio
+import atexit
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+from django.conf import settings
+
+from .runtime import bot_runtime, note_outbound
+
+logger = logging.getLogger("bots")
+
+QUEUED, SENDING, SENT, FAILED = "queued", "sending", "sent", "failed"
+
+
+class TokenBucket:
+    """rate токен/сония, capacity — портлаш (burst). Фақат битта loop оқимида ишлатилади."""
+    __slots__ = ("rate", "capacity", "tokens", "updated", "blocked_until")
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def reserve(self) -> float:
+        """Битта токен олади (қарзга ҳам); токен тайёр бўлгунча кутиш вақтини қайтаради."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        return max(wait, self.blocked_until - now)
+
+    def block(self, seconds: float) -> None:
+        """429 retry_after: шу муддатгача янги юбориш йўқ."""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class OutboundMessage:
+    __slots__ = ("id", "chat_id", "text", "kwargs", "status", "attempts", "error",
+                 "created_at", "updated_at", "on_failed")
+
+    def __init__(self, chat_id: int, text: str, kwargs: dict, on_failed=None):
+        self.id = f"{os.getpid()}-{uuid.uuid4().hex}"
+        self.chat_id = chat_id
+        self.text = text
+        self.kwargs = kwargs
+        self.status = QUEUED
+        self.attempts = 0
+        self.error = ""
+        self.created_at = self.updated_at = time.time()
+        self.on_failed = on_failed
+
+    def as_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "chat_id": self.chat_id,
+            "status": self.status,
+            "attempts": self.attempts,
+            "error": self.error,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+
+class _Chat:
+    __slots__ = ("queue", "bucket", "task", "last_used")
+
+    def __init__(self, bucket: TokenBucket):
+        self.queue = deque()
+        self.bucket = bucket
+        self.task = None
+        self.last_used = time.monotonic()
+
+
+class TelegramOutbox:
+    def __init__(self, runtime, global_rate: float = 25.0, chat_rate: float = 1.0,
+                 group_rate: float = 20 / 60, concurrency: int = 16, retries: int = 4,
+                 retry_delay: float = 1.0, max_pending: int = 10000, history: int = 5000):
+        self.runtime = runtime
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.concurrency = concurrency
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.max_pending = max_pending
+        self.history = history
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.rejected = 0
+        self._pending = 0
+        self._lock = threading.Lock()     # _messages ва ҳисоблагичлар (сўров оқимлари ҳам ўқийди)
+        self._messages = OrderedDict()    # id -> OutboundMessage (охирги `history` таси)
+        self._loop = None
+        self._chats = None
+        self._global = None
+        self._sem = None
+
+    def _ensure_started(self):
+        loop = self.runtime.loop
+        if self._loop is loop:
+            return loop
+        with self._lock:
+            if self._loop is not loop:
+                # fork'дан кейин runtime янги loop очади — ҳолат ҳам янгидан
+                self._chats = {}
+                self._global = TokenBucket(self.global_rate, max(1.0, self.global_rate))
+                self._sem = asyncio.run_coroutine_threadsafe(self._make_semaphore(), loop).result()
+                self._pending = 0
+                self._loop = loop
+        return loop
+
+    async def _make_semaphore(self) -> asyncio.Semaphore:
+        return asyncio.Semaphore(self.concurrency)
+
+    def send(self, chat_id: int, text: str, on_failed=None, **kwargs) -> str | None:
+        """
+        Хабарни навбатга қўяди (кутмайди) ва унинг id'сини қайтаради.
+        Навбат тўла бўлса — None. kwargs bot.send_message'га узатилади.
+        on_failed(item) — хабар охир-оқибат юборилмаса, loop оқимида чақирилади
+        (item — status() кўриниши); тез ва блокламайдиган бўлиши керак.
+        """
+        loop = self._ensure_started()
+        msg = OutboundMessage(int(chat_id), text, kwargs, on_failed)
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                return None
+            self._pending += 1
+            self._messages[msg.id] = msg
+            self._trim_history()
+        note_outbound("SendMessage")  # update ишланаётган бўлса — жавоб навбатга кетди
+        loop.call_soon_threadsafe(self._enqueue, msg)
+        return msg.id
+
+    def _trim_history(self) -> None:
+        # фақат якунланганлар ўчирилади; навбатдагилар ҳолати доим кўринади.
+        # Ҳар хабарда кўриб чиқмаслик учун тарих 90% гача қисқартирилади.
+        if len(self._messages) <= self.history:
+            return
+        extra = len(self._messages) - int(self.history * 0.9)
+        for mid in [m.id for m in self._messages.values() if m.status in (SENT, FAILED)][:extra]:
+            del self._messages[mid]
+
+    # --- loop оқими ---
+
+    def _enqueue(self, msg: OutboundMessage) -> None:
+        chat = self._chats.get(msg.chat_id)
+        if chat is None:
+            rate = self.group_rate if msg.chat_id < 0 else self.chat_rate
+            chat = self._chats[msg.chat_id] = _Chat(TokenBucket(rate))
+            if len(self._chats) > 10000:
+                self._prune_chats()
+        chat.queue.append(msg)
+        if chat.task is None:
+            chat.task = asyncio.get_running_loop().create_task(self._drain_chat(chat))
+
+    def _prune_chats(self) -> None:
+        idle = time.monotonic() - 60
+        for chat_id in [k for k, c in self._chats.items() if c.task is None and c.last_used < idle]:
+            del self._chats[chat_id]
+
+    async def _drain_chat(self, chat: _Chat) -> None:
+        try:
+            while chat.queue:
+                msg = chat.queue.popleft()
+                try:
+                    await self._deliver(msg, chat.bucket)
+                except Exception as e:  # кутилмаган хато навбатни тўхтатмасин
+                    logger.exception("outbox: chat %s хабарида кутилмаган хато", msg.chat_id)
+                    self._finish(msg, FAILED, f"{type(e).__name__}: {e}")
+                chat.last_used = time.monotonic()
+        finally:
+            chat.task = None
+
+    async def _deliver(self, msg: OutboundMessage, bucket: TokenBucket) -> None:
+        while True:
+            wait = max(self._global.reserve(), bucket.reserve())
+            if wait > 0:
+                await asyncio.sleep(wait)
+            msg.attempts += 1
+            msg.status, msg.updated_at = SENDING, time.time()
+            try:
+                async with self._sem:
+                    await self.runtime.bot.send_message(msg.chat_id, msg.text, **msg.kwargs)
+                self._finish(msg, SENT)
+                return
+            except TelegramRetryAfter as e:
+                bucket.block(e.retry_after)
+                delay, error = 0.0, f"429 retry_after={e.retry_after}"
+            except (TelegramNetworkError, TelegramServerError) as e:
+                delay, error = self.retry_delay * 2 ** (msg.attempts - 1), f"{type(e).__name__}: {e}"
+            except Exception as e:  # 400/403 ва ҳ.к. — қайта уриниш фойдасиз
+                self._finish(msg, FAILED, f"{type(e).__name__}: {e}")
+                return
+
+            if msg.attempts > self.retries:
+                self._finish(msg, FAILED, error)
+                return
+            with self._lock:
+                self.retried += 1
+            msg.status, msg.error, msg.updated_at = QUEUED, error, time.time()
+            logger.warning("outbox: chat %s, %s-уриниш муваффақиятсиз (%s)", msg.chat_id, msg.attempts, error)
+            if delay:
+                await asyncio.sleep(delay)
+
+    def _finish(self, msg: OutboundMessage, status: str, error: str = "") -> None:
+        msg.status, msg.error, msg.updated_at = status, error, time.time()
+        with self._lock:
+            self._pending -= 1
+            if status == SENT:
+                self.sent += 1
+            else:
+                self.failed += 1
+        if status == FAILED:
+            logger.error("outbox: chat %s га хабар юборилмади (%s уриниш): %s",
+                         msg.chat_id, msg.attempts, error)
+            if msg.on_failed is not None:
+                try:
+                    msg.on_failed(msg.as_dict())
+                except Exception:
+                    logger.exception("outbox: %s хабари on_failed'ида хато", msg.id)
+        msg.on_failed = None
+
+    # --- ҳолат ---
+
+    @staticmethod
+    def owner_pid(message_id: str) -> int | None:
+        """Хабарни навбатга қўйган worker pid'и (id'дан)."""
+        pid, sep, _rest = message_id.partition("-")
+        return int(pid) if sep and pid.isdigit() else None
+
+    def status(self, message_id: str) -> dict | None:
+        with self._lock:
+            msg = self._messages.get(message_id)
+            return msg.as_dict() if msg is not None else None
+
+    def recent(self, status: str | None = None, limit: int = 50) -> list[dict]:
+        """Охирги хабарлар (янгилари олдин), керак бўлса ҳолат бўйича."""
+        with self._lock:
+            out = []
+            for msg in reversed(self._messages.values()):
+                if status is None or msg.status == status:
+                    out.append(msg.as_dict())
+                    if len(out) >= limit:
+                        break
+            return out
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "pending": self._pending,
+                "sent": self.sent,
+                "failed": self.failed,
+                "retried": self.retried,
+                "rejected": self.rejected,
+            }
+
+    def drain(self, timeout: float = 10.0) -> bool:
+        """Навбатдаги хабарлар юборилишини кутади (atexit). Ҳаммаси якунланса — True."""
+        deadline = time.monotonic() + timeout
+        while self._loop is not None and self._pending > 0:
+            if time.monotonic() >= deadline:
+                logger.warning("outbox: тўхташда %s та хабар юборилмай қолди", self._pending)
+                return False
+            time.sleep(0.05)
+        return True
+
+
+
+telegram_outbox = TelegramOutbox(
+    bot_runtime,
+    global_rate=float(getattr(settings, "TELEGRAM_GLOBAL_RATE", 25)),
+    chat_rate=float(getattr(settings, "TELEGRAM_CHAT_RATE", 1)),
+    group_rate=float(getattr(settings, "TELEGRAM_GROUP_RATE", 20 / 60)),
+    concurrency=int(getattr(settings, "TELEGRAM_SEND_CONCURRENCY", 16)),
+    retries=int(getattr(settings, "TELEGRAM_SEND_RETRIES", 4)),
+    retry_delay=float(getattr(settings, "TELEGRAM_SEND_RETRY_DELAY", 1.0)),
+    max_pending=int(getattr(settings, "TELEGRAM_OUTBOX_SIZE", 10000)),
+)
+atexit.register(telegram_outbox.drain)  # bot_runtime.close'дан олдин ишлайди
@@ -0,0 +1,164 @@
+# bots/runtime.py
+"""
+Webhook update'лари учун доимий event loop ва битта Bot сессияси.
+
+Аввал ҳар update'да янги AiohttpSession + Bot яратилиб, async_to_sync ичида
+ишлатиларди — ҳар сафар api.telegram.org билан янги TCP+TLS уланиш.
+aiohttp сессияси яратилган event loop'га боғланади, async_to_sync эса ҳар
+чақирувда loop'ни алмаштиради. Шунинг учун worker процессида битта фон
+оқими ва унинг loop'и ишлайди; Bot ва унинг уланишлар пули (keep-alive)
+шу loop'да яшайди, sync view'лар update'ни шу loop'га юбориб натижани кутади.
+
+gunicorn fork'идан кейин ҳар worker ўз оқими ва сессиясини очади.
+
+Сессияга OutboundTracker уланади: track_outbound() блоки ичида бот
+Telegram'га нима юборганини билиш мумкин (қайта уриниш жавобни такрорламасин).
+"""
+import asyncio
+import atexit
+import contextlib
+import contextvars
+import logging
+import os
+import threading
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from aiogram import Bot
+from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.enums import ParseMode
+from django.conf import settings
+
+logger = logging.getLogger("bots")
+
+# track_outbound() блокидаги ёзувчи API методлари номлари (set — блокдан ташқарида None)
+_outbound = contextvars.ContextVar("bot_outbound", default=None)
+
+
+@contextlib.contextmanager
+def track_outbound():
+    """
+    with track_outbound() as sent: — блок ичида (ва ундан яратилган task'ларда)
+    Telegram'га юборилган методлар номи sent'га тушади ("SendMessage", ...).
+    Чақирув жавобини кутмай белгиланади: timeout бўлса ҳам хабар етиб бориши мумкин.
+    """
+    sent = set()
+    token = _outbound.set(sent)
+    try:
+        yield sent
+    finally:
+        _outbound.reset(token)
+
+
+def note_outbound(method_name: str) -> None:
+    sent = _outbound.get()
+    if sent is not None:
+        sent.add(method_name)
+
+
+class OutboundTracker(BaseRequestMiddleware):
+    """Сессия middleware'и: Get* (ўқувчи) методлардан бошқа ҳар чақирув — note_outbound()."""
+
+    async def __call__(self, make_request, bot, method):
+        name = type(method).__name__
+        if not name.startswith("Get"):
+            note_outbound(name)
+        return await make_request(bot, method)
+
+
+def make_session() -> AiohttpSession:
+    """TELEGRAM_API_BASE ва уланишлар пули чеклови билан сессия."""
+    base = getattr(settings, "TELEGRAM_API_BASE", "https://api.telegram.org").rstrip("/")
+    session = AiohttpSession(
+        api=TelegramAPIServer.from_base(base),
+        limit=int(getattr(settings, "TELEGRAM_POOL_SIZE", 20)),
+    )
+    session.middleware(OutboundTracker())
+    return session
+
+
+class BotRuntime:
+    def __init__(self, token: str | None):
+        self.token = token
+        self._lock = threading.Lock()
+        self._pid = None
+        self._loop = None
+        self._thread = None
+        self._bot = None
+
+    def _ensure_started(self) -> None:
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def _run():
+                asyncio.set_event_loop(loop)
+                loop.call_soon(ready.set)
+                loop.run_forever()
+
+            self._bot = Bot(
+                token=self.token,
+                session=make_session(),
+                default=DefaultBotProperties(parse_mode=ParseMode.HTML),
+            )
+            self._loop = loop
+            self._thread = threading.Thread(target=_run, name="bot-runtime", daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+            ready.wait()
+
+    @property
+    def bot(self) -> Bot:
+        self._ensure_started()
+        return self._bot
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        self._ensure_started()
+        return self._loop
+
+    def submit(self, coro_fn, *args):
+        """coro_fn(bot, *args) ни runtime loop'ига юборади; concurrent.futures.Future қайтаради."""
+        self._ensure_started()
+        return asyncio.run_coroutine_threadsafe(coro_fn(self._bot, *args), self._loop)
+
+    def run(self, coro_fn, *args, timeout: float | None = None):
+        """
+        coro_fn(bot, *args) ни runtime loop'ида бажаради ва натижасини қайтаради.
+        timeout ўтса — корутина бекор қилинади ва TimeoutError кўтарилади.
+        """
+        future = self.submit(coro_fn, *args)
+        try:
+            return future.result(timeout)
+        except FutureTimeout:
+            future.cancel()
+            raise TimeoutError(f"bot runtime: {timeout}s ичида тугамади")
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Сессияни ёпиб, loop'ни тўхтатади (atexit)."""
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result(timeout)
+        except Exception:
+            logger.warning("bot runtime: сессияни ёпиб бўлмади", exc_info=True)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout)
+
+    async def _shutdown(self) -> None:
+        # сессия ёпилади, loop'да қолган вазифалар (масалан навбат worker'лари) бекор қилинади
+        await self._bot.session.close()
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+bot_runtime = BotRuntime(os.getenv("BOT_TOKEN"))
+atexit.register(bot_runtime.close)
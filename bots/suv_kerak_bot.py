@@ -1,26 +1,32 @@
 # bots/suv_kerak_bot.py
 import sys, os
 import asyncio
+import atexit
 from aiogram import Bot, Dispatcher, F
 from aiogram.enums import ParseMode, ContentType
 from aiogram.client.default import DefaultBotProperties
-from aiogram.client.session.aiohttp import AiohttpSession
 from aiogram.filters import CommandStart
 from aiogram.types import Update, Message, ContentType
 from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 from aiogram.exceptions import TelegramBadRequest
 from aiohttp import web
-from asgiref.sync import async_to_sync
 from dotenv import load_dotenv
 from django.db import connection
 from django.utils import timezone
 import json, re, time, requests
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET
 from django.conf import settings
 from django.http import JsonResponse, HttpRequest, HttpResponseNotAllowed
 from datetime import datetime
 import secrets, string
 from django.contrib.auth.hashers import make_password, check_password
+from accounts.audit import deferred as audit_deferred, record as audit_record
+from accounts.business_cache import business_cache
+from suv_kerak.views import check_ops_token
+from .outbox import telegram_outbox
+from .runtime import bot_runtime
+from .webhook_queue import UpdateQueue, parse_update
 import logging
 
 
@@ -82,27 +88,38 @@ async def cmd_start(msg: Message):
 
 
 
-async def _process_update(body_text: str) -> None:
+async def _process_update(bot: Bot, body_text: str) -> None:
+    # bot — bot_runtime'нинг доимий сессияли Bot'и (ҳар update'да янги уланиш очилмайди)
     update = Update.model_validate_json(body_text)
-    session = AiohttpSession()
-    bot_defaults = DefaultBotProperties(parse_mode=ParseMode.HTML)
-    async with Bot(token=BOT_TOKEN, session=session, default=bot_defaults) as bot:
-        m = update.message
-        if m:
-            logger.info(
-                "From: %s %s (%s) | Chat: %s (%s) | Type: %s",
-                m.from_user.first_name,
-                (m.from_user.last_name or ""),
-                m.from_user.id,
-                m.chat.title or m.chat.full_name or "",
-                m.chat.id,
-                m.chat.type,
-            )
-            if m.caption:
-                logger.info("Caption: %s", m.caption)
-            if m.text:
-                logger.info("Text: %s", m.text)
-        await dp.feed_update(bot, update)
+    m = update.message
+    if m:
+        logger.info(
+            "From: %s %s (%s) | Chat: %s (%s) | Type: %s",
+            m.from_user.first_name,
+            (m.from_user.last_name or ""),
+            m.from_user.id,
+            m.chat.title or m.chat.full_name or "",
+            m.chat.id,
+            m.chat.type,
+        )
+        if m.caption:
+            logger.info("Caption: %s", m.caption)
+        if m.text:
+            logger.info("Text: %s", m.text)
+    await dp.feed_update(bot, update)
+
+
+# BOT_WEBHOOK_MODE=queue: update навбатга қўйилади, view дарҳол 200 қайтаради
+update_queue = UpdateQueue(
+    bot_runtime,
+    _process_update,
+    workers=settings.BOT_WEBHOOK_WORKERS,
+    max_pending=settings.BOT_WEBHOOK_QUEUE_SIZE,
+    retries=settings.BOT_WEBHOOK_RETRIES,
+    retry_delay=settings.BOT_WEBHOOK_RETRY_DELAY,
+    timeout=settings.BOT_UPDATE_TIMEOUT,
+)
+atexit.register(update_queue.drain)  # bot_runtime.close'дан олдин ишлайди
 
 
 def _pretty_json(raw: str) -> str:
@@ -113,6 +130,20 @@ def _pretty_json(raw: str) -> str:
         # JSON эмас ёки кесилган бўлса — ўзини қайтариб қўямиз
         return raw
 
+def _enqueue_update(body: str) -> JsonResponse:
+    # BOT_WEBHOOK_MODE=queue: текшириб навбатга қўямиз, ишланишини кутмаймиз
+    parsed = parse_update(body)
+    if parsed is None:
+        logger.warning("Telegram webhook: update эмас, ташланди: %s", body[:200])
+        return JsonResponse({"ok": True})
+    update_id, chat_id = parsed
+    if not update_queue.submit(body, update_id, chat_id):
+        # навбат тўла — Telegram update'ни кейинроқ қайта юборади
+        logger.warning("Telegram webhook: навбат тўла, update %s рад этилди", update_id)
+        return JsonResponse({"ok": False}, status=503)
+    return JsonResponse({"ok": True})
+
+
 @csrf_exempt
 def aiogram_webhook_view(request):
     if request.method != "POST":
@@ -127,8 +158,11 @@ def aiogram_webhook_view(request):
         # Диагностика учун қисқартириб логлаймиз (ихтиёрий)
         logger.debug("Webhook body (pretty):\n%s", _pretty_json(body)[:2000])
 
-        # async қисмни sync’дан чақириш
-        async_to_sync(_process_update)(body)
+        if settings.BOT_WEBHOOK_MODE == "queue":
+            return _enqueue_update(body)
+
+        # update worker'нинг доимий event loop'ида, битта Bot сессияси билан ишланади
+        bot_runtime.run(_process_update, body, timeout=settings.BOT_UPDATE_TIMEOUT)
 
         # Telegram’га ҳар доим 200
         return JsonResponse({"ok": True})
@@ -147,25 +181,10 @@ def audit_log(action: str,
               object_type: str | None = None,
               object_id: int | None = None,
               meta: dict | None = None):
-    try:
-        ip = request.META.get("HTTP_X_FORWARDED_FOR", "").split(",")[0].strip() or request.META.get("REMOTE_ADDR")
-        ua = request.META.get("HTTP_USER_AGENT")
-        path = request.path
-        method = request.method
-        print(f"action {action}")
-        with connection.cursor() as cur:
-            cur.execute(
-                """
-                INSERT INTO public.audit_log
-                    (ts, actor_id, action, path, method, status, ip, user_agent, object_type, object_id, meta)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s::jsonb)
-                """,
-                [timezone.now(), actor_id, action, path, method, status, ip, ua, object_type, object_id,
-                 json.dumps(meta or {})]
-            )
-    except Exception:
-        # лог ёзишдан хатолик сервисни тўхтатмасин
-        pass
+    # INSERT сўров ичида эмас — буферли sink фон оқимида пакет қилиб ёзади (accounts/audit.py)
+    logger.debug("audit_log: %s", action)
+    audit_record(action, request, actor_id=actor_id, status=status,
+                 object_type=object_type, object_id=object_id, meta=meta)
 
 
 # helpers (Ёрдамчи функциялар)
@@ -355,20 +374,15 @@ def telegram_webhook(request):
     text = (msg.get("text") or "").strip()
 
     def send(txt: str):
-        requests.post(
-            f"https://api.telegram.org/bot{settings.TELEGRAM_BOT_TOKEN}/sendMessage",
-            json={"chat_id": chat_id, "text": txt, "parse_mode": "HTML"},
-            timeout=10,
-        )
+        # навбатга қўйилади — сўров Telegram жавобини кутмайди
+        telegram_outbox.send(chat_id, txt)
 
     if not chat_id:
         return JsonResponse({"ok": True})
 
-    # --- lang'ni bazadan олиш (курсор очиб)
-    with connection.cursor() as cur:
-        cur.execute("SELECT lang FROM public.accounts_business WHERE id=%s LIMIT 1", [chat_id])
-        row = cur.fetchone()
-    lang = (row[0] if row and row[0] else "uz")
+    # --- lang ва boss_tel_num — бизнес профили кэшидан (кўпи билан битта SELECT)
+    profile = business_cache.get(chat_id)
+    lang = (profile.lang if profile and profile.lang else "uz")
 
     # /start — 4 тилда
     # if text.lower().startswith("/start"):
@@ -378,12 +392,8 @@ def telegram_webhook(request):
     # /reg — рўйхатдан ўтказиш
     if text.lower().startswith("/reg"):
         # 0) аввалдан бор-ёқлигини текшириш
-        with connection.cursor() as cur:
-            cur.execute("SELECT boss_tel_num FROM public.accounts_business WHERE id=%s LIMIT 1", [chat_id])
-            row = cur.fetchone()
-
-        if row:
-            phone = row[0]
+        if profile:
+            phone = profile.boss_tel_num
             msg = already_registered_text(lang, chat_id, phone)  # ✅ матнни оламиз
             send(msg)            
             print("DBG:: already branch, chat_id=", chat_id)
@@ -493,23 +503,27 @@ def _make_password(user_id: int) -> str:
 
     return f"{id2}{day}{m_last}{s_last}{wd}"
 
-def _send_tg_message(chat_id: int, text: str) -> tuple[bool, str]:
+def _send_tg_message(chat_id: int, text: str, on_failed=None) -> tuple[bool, str]:
     """
-    Telegram'га sendMessage юбориш (rate-limit’ни инобатга олган ҳолда).
+    Telegram'га sendMessage'ни навбатга қўяди (bots/outbox.py).
 
     Нима қилади:
-      - settings.TELEGRAM_BOT_TOKEN орқали /sendMessage қилади.
-      - 429 (Too Many Requests) бўлса, `retry_after` га қараб 1 марта кейинроқ қайта уринади.
-      - Истисно зарур ҳолларда истисно ташламайди — (False, сабаб) қайтаради.
+      - Хабар telegram_outbox навбатига қўйилади, сўров оқими кутмайди.
+      - 429/тармоқ хатоларида қайта уриниш ва rate-limit навбатнинг ўзида
+        (token bucket, backoff) — worker `sleep` қилмайди.
+      - Истисно ташламайди — (False, сабаб) қайтаради.
 
     Параметрлар:
       chat_id (int): Қабул қилувчи чат ID’и.
       text (str): Юбориладиган хабар (HTML parse_mode).
+      on_failed: хабар охир-оқибат юборилмаса (403, чат топилмади, қайта
+        уринишлар тугади) loop оқимида чақирилади — одатда audit_deferred(...).
 
     Қайтарилади:
       tuple[bool, str]:
-        - 1-элемент: муваффақият (True/False)
-        - 2-элемент: Telegram жавоби матни ёки сабаб ('NO_TOKEN', 'REQUEST_ERROR: …', ва ҳ.к.)
+        - 1-элемент: навбатга қабул қилинди (True/False) — етказилди дегани эмас
+        - 2-элемент: 'QUEUED:<id>' (ҳолати /bots/outbox/status?id=<id>) ёки сабаб
+          ('NO_TOKEN', 'QUEUE_FULL', 'QUEUE_ERROR: …')
 
     Эслатма:
       `disable_web_page_preview=True` — ҳавола превьюлари ўчирилган.
@@ -517,19 +531,50 @@ def _send_tg_message(chat_id: int, text: str) -> tuple[bool, str]:
     token = getattr(settings, "TELEGRAM_BOT_TOKEN", "") or ""
     if not token:
         return False, "NO_TOKEN"
-    url = f"https://api.telegram.org/bot{token}/sendMessage"
-    payload = {"chat_id": chat_id, "text": text, "parse_mode": "HTML", "disable_web_page_preview": True}
-    for attempt in range(2):
-        try:
-            r = requests.post(url, json=payload, timeout=10)
-            if r.status_code == 429:
-                retry = (r.json().get("parameters", {}) or {}).get("retry_after", 2)
-                time.sleep(int(retry)); continue
-            return (r.status_code == 200 and r.json().get("ok") is True), r.text
-        except requests.RequestException as e:
-            if attempt == 0: time.sleep(2); continue
-            return False, f"REQUEST_ERROR: {e}"
-    return False, "UNKNOWN_ERROR"
+    try:
+        msg_id = telegram_outbox.send(chat_id, text, on_failed=on_failed, disable_web_page_preview=True)
+    except Exception as e:
+        logger.exception("outbox: chat %s хабарини навбатга қўйиб бўлмади", chat_id)
+        return False, f"QUEUE_ERROR: {e}"
+    if msg_id is None:
+        return False, "QUEUE_FULL"
+    return True, f"QUEUED:{msg_id}"
+
+
+@require_GET
+def telegram_outbox_status(request):
+    """
+    Чиқувчи Telegram хабарлари ҳолати (шу worker процесси бўйича).
+      ?id=<id>                  — битта хабар
+      ?status=failed&limit=50   — охирги хабарлар (ҳолат бўйича)
+    METRICS_TOKEN билан ҳимояланган (/metrics каби).
+
+    Хабар бошқа worker'да навбатга қўйилган бўлса — 404 ва унинг pid'и;
+    юборилмаган хабарлар (on_failed берилганлари) audit_log'да ҳам бор.
+    """
+    denied = check_ops_token(request)
+    if denied is not None:
+        return denied
+
+    msg_id = request.GET.get("id")
+    if msg_id:
+        item = telegram_outbox.status(msg_id)
+        if item is None:
+            owner = telegram_outbox.owner_pid(msg_id)
+            if owner is not None and owner != os.getpid():
+                return JsonResponse({"detail": "Хабар бошқа worker процессида.", "worker_pid": owner,
+                                     "this_pid": os.getpid()}, status=404)
+            return JsonResponse({"detail": "Хабар топилмади (тарихдан чиққан)."}, status=404)
+        return JsonResponse(item)
+
+    status = request.GET.get("status") or None
+    if status not in (None, "queued", "sending", "sent", "failed"):
+        return JsonResponse({"detail": "status: queued|sending|sent|failed"}, status=400)
+    try:
+        limit = min(max(int(request.GET.get("limit", 50)), 1), 500)
+    except ValueError:
+        return JsonResponse({"detail": "limit бутун сон бўлиши керак."}, status=400)
+    return JsonResponse({"stats": telegram_outbox.stats(), "items": telegram_outbox.recent(status, limit)})
 
 @csrf_exempt
 def register_boss(request: HttpRequest, payload: str = ""):
@@ -616,13 +661,11 @@ def register_boss(request: HttpRequest, payload: str = ""):
         if lang not in {"uz", "uz_lat", "ru", "en"}:
             lang = "uz"
 
-        # 4) Олдиндан борми — текшириш (ўша қолсин)
-        with connection.cursor() as cur:
-            cur.execute("SELECT boss_tel_num FROM public.accounts_business WHERE id=%s LIMIT 1", [chat_id])
-            row = cur.fetchone()
+        # 4) Олдиндан борми — текшириш (бизнес профили кэшидан)
+        profile = business_cache.get(chat_id)
 
-        if row:
-            phone_existing = row[0] or ""
+        if profile:
+            phone_existing = profile.boss_tel_num or ""
             msg = already_registered_text(lang, chat_id, phone_existing)
             audit_log("reg_already", request, actor_id=chat_id, status=200, meta={"phone": phone_existing})
             return JsonResponse(
@@ -759,6 +802,7 @@ def register_boss(request: HttpRequest, payload: str = ""):
             password_raw = _make_password(user_id)
             password_hash = make_password(password_raw)
             cur.execute("UPDATE public.accounts_business SET password=%s WHERE id=%s", [password_hash, user_id])
+            business_cache.invalidate(user_id)
 
             # 5) agent JSONB biriktirish (ixtiyoriy)
             if promkod:
@@ -806,6 +850,7 @@ def register_boss(request: HttpRequest, payload: str = ""):
         }
         text_to_send = messages.get(lang, messages["uz"])
 
+        # tg_sent — эски калит: хабар навбатга қўйилганини билдиради (етказилганини эмас)
         sent_ok, _meta = _send_tg_message(tg_id, text_to_send)
 
         return JsonResponse(
@@ -884,19 +929,12 @@ def forgot_boss_password_start(request):
                 return JsonResponse({"detail": "id нотўғри форматда."}, status=400)
 
             # Eslatma: бу ерда id — business.id (Telegram chat_id эмас!)
-            cur.execute(
-                """
-                SELECT id, COALESCE(lang,'uz'), COALESCE(boss_tel_num,'')
-                FROM public.accounts_business WHERE id=%s LIMIT 1
-                """,
-                [chat_id]
-            )
-            row = cur.fetchone()
-            if not row:
+            profile = business_cache.get(chat_id)
+            if not profile:
                 audit_log("fp_start_fail", request, actor_id=chat_id, status=404,
                           meta={"reason": "user_not_found_by_id"})
                 return JsonResponse({"detail": "Фойдаланувчи топилмади."}, status=404)
-            chat_id, lang, boss_phone = row
+            chat_id, lang, boss_phone = profile.id, profile.lang or "uz", profile.boss_tel_num or ""
 
         else:
             phone = _normalize_phone(raw_phone) if "_normalize_phone" in globals() \
@@ -937,13 +975,17 @@ def forgot_boss_password_start(request):
               meta={"expires_in": VERIFY_CODE_TTL_SECONDS})
 
     # Телеграмга вақтинчалик кодни юбориш (телеграмга кетмаса ҳам 200 берaсиз — лекин аудитинизда белгилаб қўйинг)
+    # Хабар навбатга қўйилади: queued=True — етказилди дегани эмас. Telegram рад этса
+    # (403, чат топилмади ва ҳ.к.) fp_start_warn кейинроқ outbox'нинг ўзидан ёзилади.
+    warn = audit_deferred("fp_start_warn", request, actor_id=chat_id, status=200,
+                          meta={"reason": "telegram_send_failed"})
     send_text = _forgot_code_text(lang, code)
-    sent, meta = _send_tg_message(chat_id, send_text)
+    queued, meta = _send_tg_message(chat_id, send_text, on_failed=lambda item: warn(
+        tg_meta=f"FAILED:{item['id']}", tg_error=item["error"]))
 
-    # (ихтиёрий) агар телеграм юбориш омадсиз бўлса, алоҳида аудит ёзуви:
-    if not sent:
-        audit_log("fp_start_warn", request, actor_id=chat_id, status=200,
-                  meta={"reason": "telegram_send_failed", "tg_meta": meta})
+    # навбатга ҳам қўйилмаган бўлса — дарҳол
+    if not queued:
+        warn(tg_meta=meta)
 
     return JsonResponse(
         {
@@ -951,7 +993,8 @@ def forgot_boss_password_start(request):
             "id": chat_id,
             "boss_tel_num": boss_phone,
             "lang": lang,
-            "telegram": {"sent": sent},
+            # sent — эски калит (мижозлар ўқийди), маъноси queued билан бир: навбатга қўйилди
+            "telegram": {"sent": queued, "queued": queued},
             "expires_in": VERIFY_CODE_TTL_SECONDS,
             "postmen_msg": meta
         },
@@ -1091,23 +1134,28 @@ def forgot_boss_password_verify(request):
             "WHERE id=%s",
             [hashed, chat_id],
         )
+    business_cache.invalidate(chat_id)
 
     # Ботга вақтинчалик паролни юбориш
+    warn = audit_deferred("fp_verify_warn", request, actor_id=chat_id, status=200,
+                          meta={"reason": "telegram_send_failed"})
     msg = _forgot_password_text(lang, temp_password)
-    sent, meta = _send_tg_message(chat_id, msg)
+    queued, meta = _send_tg_message(chat_id, msg, on_failed=lambda item: warn(
+        tg_meta=f"FAILED:{item['id']}", tg_error=item["error"]))
 
     # ✅ Сиз сўраган аудит: verify_ok
     audit_log("fp_verify_ok", request, actor_id=chat_id, status=200,
-              meta={"telegram_sent": bool(sent)})
+              meta={"telegram_sent": bool(queued), "telegram_queued": bool(queued)})
 
-    # (ихтиёрий) агар телеграм юбориш омадсиз бўлса, истасак алоҳида warn лог қўйишимиз мумкин:
-    audit_log("fp_verify_warn", request, actor_id=chat_id, status=200,
-              meta={"reason": "telegram_send_failed", "tg_meta": meta})
+    # телеграм навбатига ҳам қўйилмаган бўлса — дарҳол; Telegram рад этса — outbox'дан (on_failed)
+    if not queued:
+        warn(tg_meta=meta)
 
     resp = {
         "ok": True,
         "id": chat_id,
-        "telegram": {"sent": sent},
+        # sent — эски калит (мижозлар ўқийди), маъноси queued билан бир: навбатга қўйилди
+        "telegram": {"sent": queued, "queued": queued},
     }
     if getattr(settings, "DEBUG", False):
         resp["__dev_password_preview"] = temp_password  # фақат DEVда
@@ -0,0 +1,312 @@
+import asyncio
+import json
+import os
+import random
+import threading
+from concurrent.futures import Future
+from io import StringIO
+from unittest import mock
+
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.methods import GetMe, SendMessage
+from django.core.management import call_command
+from django.db import connection
+from django.http import JsonResponse
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import ResolverMatch
+from django.views.decorators.csrf import csrf_exempt
+
+from accounts.audit import deferred as audit_deferred
+from suv_kerak.metrics import db_queries
+from suv_kerak.middleware import AccessLogMiddleware, MetricsMiddleware
+from .async_views import aiogram_webhook_view_async, offload_to_db_thread
+from .models import WebhookDeadLetter
+from .outbox import TelegramOutbox, TokenBucket
+from .runtime import BotRuntime, OutboundTracker, note_outbound, track_outbound
+from .webhook_queue import UpdateQueue, parse_update
+
+
+def _update(update_id: int, chat_id: int, text: str = "hi") -> str:
+    return json.dumps({"update_id": update_id, "message": {
+        "message_id": update_id, "date": 0, "text": text,
+        "chat": {"id": chat_id, "type": "private"},
+    }})
+
+
+class UpdateQueueTests(SimpleTestCase):
+    """BOT_WEBHOOK_MODE=queue: чат ичида тартиб, қайта уриниш, dead-letter."""
+
+    def setUp(self):
+        self.runtime = BotRuntime("1:a")
+
+    def tearDown(self):
+        self.runtime.close()
+
+    def test_parse_update(self):
+        self.assertEqual(parse_update(_update(5, -100)), (5, -100))
+        self.assertEqual(parse_update(json.dumps({"update_id": 6, "callback_query": {
+            "id": "x", "from": {"id": 7}, "message": {"chat": {"id": 8}}}})), (6, 8))
+        self.assertIsNone(parse_update("not json"))
+        self.assertIsNone(parse_update(json.dumps({"message": {}})))
+
+    def test_per_chat_order_and_bounded_pending(self):
+        seen = []
+
+        async def handler(bot, body):
+            await asyncio.sleep(random.random() / 500)
+            data = json.loads(body)
+            seen.append((data["message"]["chat"]["id"], data["update_id"]))
+
+        q = UpdateQueue(self.runtime, handler, workers=3, max_pending=1000)
+        for n in range(60):
+            self.assertTrue(q.submit(_update(n, n % 5), n, n % 5))
+        self.assertTrue(q.drain(5))
+
+        self.assertEqual(len(seen), 60)
+        for chat in range(5):
+            ids = [u for c, u in seen if c == chat]
+            self.assertEqual(ids, sorted(ids))
+
+        q.max_pending = 0
+        self.assertFalse(q.submit(_update(99, 1), 99, 1))
+        self.assertEqual(q.stats()["rejected"], 1)
+
+    def test_retries_then_dead_letter(self):
+        calls = []
+
+        async def handler(bot, body):
+            calls.append(body)
+            raise RuntimeError("telegram down")
+
+        q = UpdateQueue(self.runtime, handler, workers=1, retries=2, retry_delay=0.001)
+        with mock.patch("bots.webhook_queue.store_dead_letter") as store, self.assertLogs("bots") as logs:
+            q.submit(_update(1, 42), 1, 42)
+            self.assertTrue(q.drain(5))
+        self.assertEqual(len(calls), 3)
+        self.assertIn("dead-letter", logs.output[-1])
+        store.assert_called_once_with(1, 42, _update(1, 42), "RuntimeError: telegram down", 3, False)
+        self.assertEqual((q.stats()["retried"], q.stats()["dead"]), (2, 1))
+
+    def test_no_retry_after_reply_sent(self):
+        calls = []
+
+        async def handler(bot, body):
+            calls.append(body)
+            # жавоб сессия middleware'идан ўтди, кейин хато
+            await OutboundTracker()(mock.AsyncMock(), bot, SendMessage(chat_id=42, text="ok"))
+            raise RuntimeError("db down")
+
+        q = UpdateQueue(self.runtime, handler, workers=1, retries=2, retry_delay=0.001)
+        with mock.patch("bots.webhook_queue.store_dead_letter") as store, self.assertLogs("bots"):
+            q.submit(_update(1, 42), 1, 42)
+            self.assertTrue(q.drain(5))
+        self.assertEqual(len(calls), 1)
+        store.assert_called_once_with(1, 42, _update(1, 42), "RuntimeError: db down", 1, True)
+        self.assertEqual(q.stats()["retried"], 0)
+
+    def test_outbound_tracker_skips_reads(self):
+        async def calls():
+            with track_outbound() as sent:
+                await OutboundTracker()(mock.AsyncMock(), None, GetMe())
+                self.assertEqual(sent, set())
+                await OutboundTracker()(mock.AsyncMock(), None, SendMessage(chat_id=1, text="x"))
+                return sent
+
+        self.assertEqual(asyncio.run(calls()), {"SendMessage"})
+
+
+@override_settings(BOT_WEBHOOK_MODE="queue")
+class WebhookQueueModeViewTests(SimpleTestCase):
+    def test_enqueues_and_acks(self):
+        with mock.patch("bots.suv_kerak_bot.update_queue.submit", return_value=True) as submit:
+            resp = self.client.post("/aiogram-bot-webhook/", _update(3, 9), content_type="application/json")
+            self.assertEqual(resp.status_code, 200)
+            submit.assert_called_once_with(_update(3, 9), 3, 9)
+
+            submit.return_value = False
+            with self.assertLogs("bots", "WARNING"):
+                resp = self.client.post("/aiogram-bot-webhook/", _update(4, 9), content_type="application/json")
+            self.assertEqual(resp.status_code, 503)
+
+
+class ReplayDeadLettersTests(TestCase):
+    """replay_webhook_dead_letters: жавоби кетган update'лар такрорланмайди."""
+
+    def _replay(self, handler, *args):
+        with mock.patch("bots.management.commands.replay_webhook_dead_letters._process_update", handler):
+            call_command("replay_webhook_dead_letters", *args, stdout=StringIO(), stderr=StringIO())
+
+    def test_skips_and_marks_sent(self):
+        sent_dl = WebhookDeadLetter.objects.create(update_id=1, chat_id=5, body=_update(1, 5), replies_sent=True)
+        dl = WebhookDeadLetter.objects.create(update_id=2, chat_id=5, body=_update(2, 5))
+        seen = []
+
+        async def handler(bot, body):
+            seen.append(json.loads(body)["update_id"])
+            note_outbound("SendMessage")
+            raise RuntimeError("still down")
+
+        self._replay(handler)
+        self.assertEqual(seen, [2])
+        dl.refresh_from_db()
+        self.assertEqual((dl.attempts, dl.replies_sent), (1, True))
+
+        self._replay(handler)  # энди иккаласи ҳам replies_sent — ҳеч бири олинмайди
+        self.assertEqual(seen, [2])
+
+        self._replay(handler, "--include-sent")
+        self.assertEqual(seen, [2, 1, 2])
+        sent_dl.refresh_from_db()
+        self.assertIsNone(sent_dl.replayed_at)
+
+
+class _FakeSession:
+    async def close(self):
+        pass
+
+
+class _FakeBot:
+    """send_message'ни ёзиб боради; `fail` — навбатдаги чақирувларда кўтариладиган хатолар."""
+
+    def __init__(self, fail=()):
+        self.session = _FakeSession()
+        self.sent = []
+        self.fail = list(fail)
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if self.fail:
+            raise self.fail.pop(0)
+        self.sent.append((chat_id, text))
+
+
+class TelegramOutboxTests(SimpleTestCase):
+    """Чиқувчи хабарлар: сўров оқими кутмайди, 429'да чат тўхтатилади, тартиб сақланади."""
+
+    def setUp(self):
+        self.runtime = BotRuntime("1:a")
+        self.runtime.loop  # loop ва ҳақиқий Bot яратилади, кейин сохтаси билан алмаштирилади
+
+    def tearDown(self):
+        self.runtime.close()
+
+    def test_token_bucket(self):
+        b = TokenBucket(rate=10, capacity=2)
+        self.assertEqual([b.reserve() > 0 for _ in range(3)], [False, False, True])
+        b.block(5)
+        self.assertGreater(b.reserve(), 4)
+
+    def test_retry_after_keeps_chat_order(self):
+        method = SendMessage(chat_id=1, text="x")
+        self.runtime._bot = _FakeBot(fail=[TelegramRetryAfter(method, "Too Many Requests", 0)])
+        box = TelegramOutbox(self.runtime, global_rate=1000, chat_rate=1000)
+        with self.assertLogs("bots", "WARNING") as logs:
+            ids = [box.send(1, f"m{n}") for n in range(3)] + [box.send(2, "other")]
+            self.assertTrue(box.drain(5))
+        self.assertIn("429 retry_after=0", logs.output[0])
+
+        sent = self.runtime._bot.sent
+        self.assertEqual([t for c, t in sent if c == 1], ["m0", "m1", "m2"])
+        self.assertEqual(box.status(ids[0])["attempts"], 2)
+        self.assertEqual(box.stats(), {"pending": 0, "sent": 4, "failed": 0, "retried": 1, "rejected": 0})
+
+    def test_bad_request_fails_without_retry(self):
+        method = SendMessage(chat_id=1, text="x")
+        self.runtime._bot = _FakeBot(fail=[TelegramBadRequest(method, "chat not found")])
+        box = TelegramOutbox(self.runtime)
+        with self.assertLogs("bots", "ERROR"):
+            msg_id = box.send(7, "hi")
+            self.assertTrue(box.drain(5))
+        item = box.status(msg_id)
+        self.assertEqual((item["status"], item["attempts"]), ("failed", 1))
+        self.assertEqual(box.recent("failed"), [item])
+
+    def test_failed_outcome_reaches_audit(self):
+        method = SendMessage(chat_id=1, text="x")
+        self.runtime._bot = _FakeBot(fail=[TelegramBadRequest(method, "chat not found")])
+        box = TelegramOutbox(self.runtime)
+        request = RequestFactory().post("/bots/forgot/start", REMOTE_ADDR="10.0.0.1")
+        warn = audit_deferred("fp_start_warn", request, actor_id=7, status=200,
+                              meta={"reason": "telegram_send_failed"})
+        with mock.patch("accounts.audit.audit_sink") as sink, self.assertLogs("bots", "ERROR"):
+            msg_id = box.send(7, "hi", on_failed=lambda item: warn(tg_error=item["error"]))
+            self.assertTrue(box.drain(5))
+        event = sink.emit.call_args.args[0]
+        self.assertEqual(event[1:4], (7, "fp_start_warn", "/bots/forgot/start"))
+        self.assertEqual(json.loads(event[-1]), {"reason": "telegram_send_failed",
+                                                 "tg_error": box.status(msg_id)["error"]})
+        self.assertTrue(msg_id.startswith(f"{os.getpid()}-"))
+
+    @override_settings(METRICS_TOKEN="s3cret")
+    def test_status_endpoint(self):
+        with mock.patch("bots.suv_kerak_bot.telegram_outbox") as box:
+            box.stats.return_value = {"pending": 1}
+            box.recent.return_value = []
+            self.assertEqual(self.client.get("/bots/outbox/status").status_code, 401)
+            resp = self.client.get("/bots/outbox/status", {"status": "failed"},
+                                   HTTP_AUTHORIZATION="Bearer s3cret")
+            self.assertEqual(resp.json(), {"stats": {"pending": 1}, "items": []})
+            box.recent.assert_called_once_with("failed", 50)
+
+            box.status.return_value = None
+            box.owner_pid = TelegramOutbox.owner_pid
+            resp = self.client.get("/bots/outbox/status", {"id": f"{os.getpid() + 1}-abc"},
+                                   HTTP_AUTHORIZATION="Bearer s3cret")
+            self.assertEqual((resp.status_code, resp.json()["worker_pid"]), (404, os.getpid() + 1))
+
+
+class AsyncViewsTests(SimpleTestCase):
+    """SERVER_MODE=asgi: webhook runtime'ни кутади, БД view'лари алоҳида оқимда."""
+    databases = {"default"}  # offload_to_db_thread оқимидаги SELECT 1
+
+    async def test_webhook_awaits_runtime(self):
+        done = Future()
+        done.set_result(None)
+        request = AsyncRequestFactory().post("/aiogram-bot-webhook/", _update(1, 2), content_type="application/json")
+        with mock.patch("bots.async_views.bot_runtime.submit", return_value=done) as submit:
+            resp = await aiogram_webhook_view_async(request)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(submit.call_args.args[1], _update(1, 2))
+
+    async def test_offload_runs_in_db_thread(self):
+        @csrf_exempt
+        def view(request):
+            return JsonResponse({"thread": threading.current_thread().name})
+
+        wrapped = offload_to_db_thread(view)
+        self.assertTrue(asyncio.iscoroutinefunction(wrapped))
+        self.assertTrue(wrapped.csrf_exempt)
+        with mock.patch("bots.async_views.close_old_connections"):
+            resp = await wrapped(AsyncRequestFactory().post("/"))
+        self.assertTrue(json.loads(resp.content)["thread"].startswith("asgi-db"))
+
+    @override_settings(METRICS_ENABLED=True)
+    async def test_middlewares_stay_async_and_count_offloaded_sql(self):
+        @csrf_exempt
+        def view(request):
+            with connection.cursor() as cur:
+                cur.execute("SELECT 1")
+            return JsonResponse({})
+
+        wrapped = offload_to_db_thread(view)
+
+        async def get_response(request):
+            request.resolver_match = ResolverMatch(wrapped, (), {}, route="bots/test/")
+            return await wrapped(request)
+
+        chain = AccessLogMiddleware(MetricsMiddleware(get_response))
+        self.assertTrue(asyncio.iscoroutinefunction(chain))  # Django занжирни оқимга ўтказмайди
+
+        db_queries.reset()
+        with mock.patch("bots.async_views.close_old_connections"):
+            resp = await chain(AsyncRequestFactory().post("/bots/test/"))
+        self.assertEqual(resp.status_code, 200)
+        snap = db_queries.snapshot()["/bots/test/"]
+        self.assertEqual((snap["count"], snap["sum"]), (1, 1))
+
+    @override_settings(METRICS_ENABLED=True, DEBUG=True)  # DEBUG — Django мосланишни логга ёзади
+    def test_asgi_chain_is_not_adapted(self):
+        from django.core.handlers.asgi import ASGIHandler
+
+        # "Synchronous handler adapted for middleware ..." — занжирда sync middleware бор
+        with self.assertNoLogs("django.request", "DEBUG"):
+            ASGIHandler().load_middleware(is_async=True)
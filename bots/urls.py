@@ -1,16 +1,27 @@
 # bots/urls.py
+from django.conf import settings
 from django.urls import re_path
 from .suv_kerak_bot import (
     register_boss,
     forgot_boss_password_start,
     forgot_boss_password_verify,
     aiogram_webhook_view,
+    telegram_outbox_status,
 )
 
+# ASGI режимида (suv_kerak/asgi.py) I/O кутадиган view'ларнинг async вариантлари
+if settings.SERVER_MODE == "asgi":
+    from .async_views import (
+        register_boss_async as register_boss,
+        forgot_boss_password_start_async as forgot_boss_password_start,
+        forgot_boss_password_verify_async as forgot_boss_password_verify,
+    )
+
 app_name = "bots"
 
 urlpatterns = [
     re_path(r"^boss/register/?$", register_boss, name="register_boss"),
     re_path(r"^boss/forgot-password/start/?$",  forgot_boss_password_start,  name="forgot_pwd_start"),
     re_path(r"^boss/forgot-password/verify/?$", forgot_boss_password_verify, name="forgot_pwd_verify"),    
+    re_path(r"^outbox/status/?$", telegram_outbox_status, name="outbox_status"),
 ]
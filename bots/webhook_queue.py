@@ -0,0 +1,191 @@
+# bots/webhook_queue.py
+"""
+Webhook update'ларининг процесс ичидаги навбати (BOT_WEBHOOK_MODE=queue).
+
+View update'ни текшириб навбатга қўяди ва Telegram'га дарҳол 200 қайтаради;
+ишлаш (жумладан Telegram'га жавоблар) bot_runtime loop'идаги worker'ларда.
+  - worker'лар сони = бир вақтда ишланадиган update'лар чеги;
+  - битта чат доим битта worker'га тушади (chat_id % workers) — чат ичида
+    update'лар келган тартибда ишланади;
+  - хато бўлса BOT_WEBHOOK_RETRIES марта, ўсиб борувчи кутиш билан қайта
+    уринилади, кейин update WebhookDeadLetter жадвалига ёзилади;
+  - update бошидан қайта ишланади, шунинг учун фақат Telegram'га ҳали ҳеч нарса
+    юборилмаган (track_outbound) хатолар қайта уринилади. Жавоб (қисман) кетган
+    бўлса — дарҳол dead-letter'га, replies_sent белгиси билан.
+Ташқи брокер керак эмас; процесс тўхтаётганда (atexit) навбат охиригача ишланади.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+
+from django.db import close_old_connections
+
+from .runtime import track_outbound
+
+logger = logging.getLogger("bots")
+
+_UPDATE_KINDS = (
+    "message", "edited_message", "channel_post", "edited_channel_post",
+    "callback_query", "my_chat_member", "chat_member", "chat_join_request",
+)
+
+
+def parse_update(body: str) -> tuple[int, int | None] | None:
+    """
+    Update JSON'ини енгил текширади. Қайтаради: (update_id, chat_id | None),
+    ёки None — update эмас (JSON объект эмас ёки update_id йўқ).
+    """
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return None
+    if not isinstance(data, dict) or not isinstance(data.get("update_id"), int):
+        return None
+
+    chat_id = None
+    for kind in _UPDATE_KINDS:
+        obj = data.get(kind)
+        if isinstance(obj, dict):
+            chat = obj.get("chat") or (obj.get("message") or {}).get("chat") or obj.get("from") or {}
+            chat_id = chat.get("id") if isinstance(chat, dict) else None
+            break
+    return data["update_id"], chat_id
+
+
+async def run_update(bot, handler, body: str, timeout: float | None = None) -> tuple[Exception | None, set]:
+    """
+    handler(bot, body) ни track_outbound() ичида бажаради.
+    Қайтаради: (хато | None, Telegram'га юборилган методлар). Хато бўлиб методлар
+    бўш бўлмаса, update'ни қайта ишлаш жавобни такрорлайди.
+    """
+    with track_outbound() as sent:
+        try:
+            await asyncio.wait_for(handler(bot, body), timeout)
+        except Exception as e:
+            return e, sent
+    return None, sent
+
+
+def store_dead_letter(update_id, chat_id, body: str, error: str, attempts: int,
+                      replies_sent: bool = False) -> None:
+    from .models import WebhookDeadLetter
+
+    close_old_connections()
+    WebhookDeadLetter.objects.create(
+        update_id=update_id, chat_id=chat_id, body=body, error=error[:4000], attempts=attempts,
+        replies_sent=replies_sent,
+    )
+
+
+class UpdateQueue:
+    def __init__(self, runtime, handler, workers: int = 8, max_pending: int = 1000,
+                 retries: int = 3, retry_delay: float = 1.0, timeout: float | None = 30.0):
+        self.runtime = runtime
+        self.handler = handler          # async handler(bot, body)
+        self.workers = max(1, workers)
+        self.max_pending = max_pending
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.timeout = timeout
+        self.processed = 0
+        self.retried = 0
+        self.dead = 0
+        self.rejected = 0               # навбат тўлгани учун қабул қилинмаган
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._loop = None
+        self._shards = None
+
+    def _ensure_started(self):
+        loop = self.runtime.loop
+        if self._loop is loop:
+            return loop
+        with self._lock:
+            if self._loop is not loop:
+                # fork'дан кейин runtime янги loop очади — worker'лар ҳам янгидан
+                self._pending = 0
+                self._shards = asyncio.run_coroutine_threadsafe(self._start(), loop).result()
+                self._loop = loop
+        return loop
+
+    async def _start(self) -> list:
+        shards = [asyncio.Queue() for _ in range(self.workers)]
+        for q in shards:
+            asyncio.get_running_loop().create_task(self._worker(q))
+        return shards
+
+    def submit(self, body: str, update_id: int, chat_id: int | None = None) -> bool:
+        """Update'ни навбатга қўяди (кутмайди). Навбат тўла бўлса — False."""
+        loop = self._ensure_started()
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                return False
+            self._pending += 1
+        key = chat_id if chat_id is not None else update_id
+        loop.call_soon_threadsafe(self._shards[key % self.workers].put_nowait, (body, update_id, chat_id))
+        return True
+
+    async def _worker(self, q: asyncio.Queue) -> None:
+        while True:
+            body, update_id, chat_id = await q.get()
+            try:
+                await self._handle(body, update_id, chat_id)
+            except Exception:
+                logger.exception("webhook queue: update %s ни ишлашда кутилмаган хато", update_id)
+            finally:
+                q.task_done()
+                with self._lock:
+                    self._pending -= 1
+
+    async def _handle(self, body: str, update_id, chat_id) -> None:
+        attempt = 0
+        while True:
+            attempt += 1
+            e, sent = await run_update(self.runtime.bot, self.handler, body, self.timeout)
+            if e is None:
+                self.processed += 1
+                return
+            error = f"{type(e).__name__}: {e}"
+            if sent:
+                # жавоб кетиб бўлган — қайта уриниш уни такрорлайди
+                logger.warning("webhook queue: update %s юборилгандан кейин хато (%s), қайта уринилмайди: %s",
+                               update_id, ", ".join(sorted(sent)), error)
+                break
+            if attempt > self.retries:
+                break
+            self.retried += 1
+            logger.warning("webhook queue: update %s, %s-уриниш муваффақиятсиз (%s)", update_id, attempt, e)
+            await asyncio.sleep(self.retry_delay * 2 ** (attempt - 1))
+
+        self.dead += 1
+        logger.error("webhook queue: update %s %s уринишдан кейин dead-letter'га ёзилди: %s",
+                     update_id, attempt, error)
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                None, store_dead_letter, update_id, chat_id, body, error, attempt, bool(sent)
+            )
+        except Exception:
+            logger.exception("webhook queue: update %s ни dead-letter'га ёзиб бўлмади:\n%s", update_id, body)
+
+    def drain(self, timeout: float = 10.0) -> bool:
+        """Навбатдаги update'лар ишланишини кутади (atexit). Ҳаммаси ишланса — True."""
+        deadline = time.monotonic() + timeout
+        while self._loop is not None and self._pending > 0:
+            if time.monotonic() >= deadline:
+                logger.warning("webhook queue: тўхташда %s та update ишланмай қолди", self._pending)
+                return False
+            time.sleep(0.05)
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "pending": self._pending,
+            "processed": self.processed,
+            "retried": self.retried,
+            "dead": self.dead,
+            "rejected": self.rejected,
+        }
+
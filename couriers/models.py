@@ -77,11 +77,6 @@ class Kuryer(models.Model):
                     raise ValidationError(f"'{p}' диапазонлари ўзаро тўқнашди.")
 
     def resolve_service_price(self, qty: int, period: str = "month") -> int:
-        rules = [r for r in (self.service_price_rules or []) if (r.get("period") or "month") == period]
-        rules.sort(key=lambda r: int(r.get("min", 0)))
-        for r in rules:
-            mn = int(r.get("min", 0)); mx = r.get("max", None)
-            mx = int(mx) if mx is not None else None
-            if qty >= mn and (mx is None or qty <= mx):
-                return int(r.get("price", 0))
-        return 0
\ No newline at end of file
+        # қоидалар курер/давр бўйича бир марта компиляция қилинади (finance/pricing.py)
+        from finance.pricing import courier_price_table
+        return courier_price_table(self.kuryer_id, self.service_price_rules or [], period).unit_price(int(qty))
\ No newline at end of file
@@ -9,7 +9,12 @@ class CashMenedjerAdmin(admin.ModelAdmin):
                      "cash_operation", "income", "expense", "balance", "grated")
     list_filter   = ("cash_operation", "sana")
     search_fields = ("menedjer_name", "kuryer_name", "client_tel_num")
-    readonly_fields = ("cash_message",)  # автоматик тўлади
+    readonly_fields = ("cash_message", "balance")  # автоматик тўлади (balance — кассанинг бош қаторидан)
+
+    def delete_queryset(self, request, queryset):
+        # "Танланганларни ўчириш" ҳам ҳар ёзувнинг delete()'и орқали — бош қатор тўғри қолсин
+        for obj in queryset:
+            obj.delete()
 
 @admin.register(CashState)
 class CashStateAdmin(admin.ModelAdmin):
@@ -29,6 +34,11 @@ class CourierWaterBottleBalanceAdmin(admin.ModelAdmin):
     list_filter  = ("business", "operation", "status", "sana")
     search_fields = ("kuryer_name", "kuryer_id", "client_tel_num", "boss_name")
     readonly_fields = ("water_balance", "bottle_balance", "grated")
+
+    def delete_queryset(self, request, queryset):
+        # "Танланганларни ўчириш" ҳам ҳар ёзувнинг delete()'и орқали — бош қатор тўғри қолсин
+        for obj in queryset:
+            obj.delete()
     
 @admin.register(BusinessSystemAccount)
 class BusinessSystemAccountAdmin(admin.ModelAdmin):
@@ -45,6 +55,11 @@ class BusinessSystemAccountAdmin(admin.ModelAdmin):
     ordering = ("-grated",)
     readonly_fields = ("tizimdagi_balance", "grated")
 
+    def delete_queryset(self, request, queryset):
+        # "Танланганларни ўчириш" ҳам ҳар ёзувнинг delete()'и орқали — бош қатор тўғри қолсин
+        for obj in queryset:
+            obj.delete()
+
     fieldsets = (
         ("Вақт ва тадбиркор", {
             "fields": ("business", "sana", "vaqt")
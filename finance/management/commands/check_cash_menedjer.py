@@ -0,0 +1,71 @@
+# finance/management/commands/check_cash_menedjer.py
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import DecimalField, F, Sum, Value
+from django.db.models.functions import Coalesce
+
+from finance.models import CashMenedjer, CashMenedjerBalance
+
+CENT = Decimal("0.01")
+
+
+class Command(BaseCommand):
+    help = (
+        "cash_menedjer журналидан (income - expense) менежер кассалари қолдиғини қайта "
+        "ҳисоблайди ва cash_menedjer_balance бош қаторлари билан солиштиради. "
+        "--fix берилса, бош қатор журнал бўйича тузатилади (журнал ўзгармайди)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--business", type=int, help="Фақат шу business_id")
+        parser.add_argument("--fix", action="store_true", help="Бош қаторни журнал бўйича тузатиш")
+
+    def handle(self, *args, **options):
+        money = DecimalField(max_digits=14, decimal_places=2)
+        zero = Value(0, output_field=money)
+        rows = CashMenedjer.objects.filter(business__isnull=False)
+        heads = CashMenedjerBalance.objects.all()
+        if options["business"]:
+            rows = rows.filter(business_id=options["business"])
+            heads = heads.filter(business_id=options["business"])
+        heads = {(h.business_id, h.menedjer_id): h for h in heads}
+
+        computed = {
+            (r["business_id"], r["menedjer_id"]): Decimal(r["total"]).quantize(CENT)
+            for r in rows.values("business_id", "menedjer_id").order_by().annotate(
+                total=Coalesce(Sum(F("income") - F("expense"), output_field=money), zero),
+            )
+        }
+
+        drift = 0
+        for key in sorted(set(computed) | set(heads)):
+            balance = computed.get(key, 0)
+            head = heads.get(key)
+            if head is not None and head.balance == balance:
+                continue
+
+            drift += 1
+            current = head.balance if head is not None else "йўқ"
+            self.stdout.write(self.style.WARNING(
+                f"business_id={key[0]} menedjer_id={key[1]}: журнал бўйича {balance}, бош қатор {current}"
+            ))
+            if options["fix"]:
+                self._fix(key, balance)
+                self.stdout.write(f"  -> бош қатор тузатилди: {balance}")
+
+        if drift:
+            self.stdout.write(self.style.WARNING(f"Фарқ топилган кассалар: {drift} та."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Фарқ йўқ ({len(computed)} та касса текширилди)."))
+
+    @transaction.atomic
+    def _fix(self, key, balance):
+        business_id, menedjer_id = key
+        head = CashMenedjerBalance.lock_for(business_id, menedjer_id)
+        head.balance = balance
+        head.last_entry_id = (CashMenedjer.objects
+                              .filter(business_id=business_id, menedjer_id=menedjer_id)
+                              .order_by("-grated", "-id").values_list("id", flat=True).first())
+        head.save(update_fields=["balance", "last_entry_id", "updated_at"])
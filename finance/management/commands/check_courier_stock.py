@@ -0,0 +1,102 @@
+# finance/management/commands/check_courier_stock.py
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from finance.models import CourierStockBalance, CourierStockSnapshot, CourierWaterBottleBalance
+
+
+class Command(BaseCommand):
+    help = (
+        "kuryer_water_bottle_balance журналидаги \"ok\" ҳаракатлардан курьер қолдиқларини "
+        "қайта ҳисоблайди ва kuryer_stock_balance бош қаторлари ҳамда назорат нуқталари "
+        "(kuryer_stock_snapshot, sana ўқида) билан солиштиради. --fix берилса, бош қатор "
+        "журналдан қайта қурилади, нуқталар ўчирилади — кейинги тарих сўровлари уларни "
+        "қайта қўяди (журнал ўзгармайди; янги ҳаракатлар тушмаётган пайтда ишга туширинг)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--business", type=int, help="Фақат шу business_id")
+        parser.add_argument("--fix", action="store_true",
+                            help="Бош қатор ва назорат нуқталарини журналдан қайта қуриш")
+
+    def handle(self, *args, **options):
+        rows = CourierWaterBottleBalance.objects.filter(status="ok").order_by("business_id", "kuryer_id", "grated", "id")
+        heads = CourierStockBalance.objects.all()
+        snaps = CourierStockSnapshot.objects.order_by("sana")
+        if options["business"]:
+            rows = rows.filter(business_id=options["business"])
+            heads = heads.filter(business_id=options["business"])
+            snaps = snaps.filter(business_id=options["business"])
+        heads = {(h.business_id, h.kuryer_id): h for h in heads}
+        snapshots = {}
+        for snap in snaps:
+            snapshots.setdefault((snap.business_id, snap.kuryer_id), []).append(snap)
+
+        # (business_id, kuryer_id) -> [water, bottle, ["ok" ҳаракат id'лари]]
+        computed = {}
+        for r in rows.values("business_id", "kuryer_id", "id", "operation",
+                             "income", "expense").iterator(chunk_size=2000):
+            st = computed.setdefault((r["business_id"], r["kuryer_id"]), [0, 0, []])
+            st[0], st[1] = CourierWaterBottleBalance.apply_delta(st[0], st[1], r["operation"],
+                                                                 r["income"], r["expense"])
+            st[2].append(r["id"])
+
+        drift = 0
+        for key in sorted(set(computed) | set(heads) | set(snapshots)):
+            water, bottle, moves = computed.get(key, [0, 0, []])
+            head = heads.get(key)
+            last_id = moves[-1] if moves else None
+            stale = self._stale_snapshots(key, snapshots.get(key, []))
+            if head is not None and not stale and (head.water_balance, head.bottle_balance, head.movements,
+                                                   head.last_entry_id) == (water, bottle, len(moves), last_id):
+                continue
+
+            drift += 1
+            current = (f"{head.water_balance}/{head.bottle_balance}, {head.movements} ҳаракат"
+                       if head is not None else "йўқ")
+            self.stdout.write(self.style.WARNING(
+                f"business_id={key[0]} kuryer_id={key[1]}: журнал бўйича {water}/{bottle}, "
+                f"{len(moves)} ҳаракат; бош қатор {current}"
+                + (f"; эскирган нуқталар: {', '.join(str(d) for d in stale)}" if stale else "")
+            ))
+            if options["fix"]:
+                self._rebuild(key, water, bottle, moves)
+                self.stdout.write(f"  -> бош қатор қайта қурилди: {water}/{bottle}, назорат нуқталари ўчирилди")
+
+        if drift:
+            self.stdout.write(self.style.WARNING(f"Фарқ топилган курьерлар: {drift} та."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Фарқ йўқ ({len(computed)} та курьер текширилди)."))
+
+    @staticmethod
+    def _stale_snapshots(key, snaps):
+        """Журнал (sana, vaqt, id) ўқида қайта ўйналганда мос келмаган нуқталар санаси."""
+        if not snaps:
+            return []
+        business_id, kuryer_id = key
+        rows = (CourierWaterBottleBalance.objects
+                .filter(business_id=business_id, kuryer_id=kuryer_id, status="ok", sana__lt=snaps[-1].sana)
+                .order_by("sana", "vaqt", "id").values_list("sana", "operation", "income", "expense"))
+        stale, water, bottle, i = [], 0, 0, 0
+        for sana, op, inc, exp in rows.iterator(chunk_size=2000):
+            while i < len(snaps) and snaps[i].sana <= sana:
+                if (snaps[i].water_balance, snaps[i].bottle_balance) != (water, bottle):
+                    stale.append(snaps[i].sana)
+                i += 1
+            water, bottle = CourierWaterBottleBalance.apply_delta(water, bottle, op, inc, exp)
+        for snap in snaps[i:]:
+            if (snap.water_balance, snap.bottle_balance) != (water, bottle):
+                stale.append(snap.sana)
+        return stale
+
+    @transaction.atomic
+    def _rebuild(self, key, water, bottle, moves):
+        business_id, kuryer_id = key
+        head = CourierStockBalance.lock_for(business_id, kuryer_id)
+        head.water_balance, head.bottle_balance = water, bottle
+        head.movements = len(moves)
+        head.last_entry_id = moves[-1] if moves else None
+        head.snapshot_upto = None
+        head.save(update_fields=["water_balance", "bottle_balance", "movements", "last_entry_id",
+                                 "snapshot_upto", "updated_at"])
+        CourierStockSnapshot.objects.filter(business_id=business_id, kuryer_id=kuryer_id).delete()
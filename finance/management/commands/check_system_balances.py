@@ -0,0 +1,68 @@
+# finance/management/commands/check_system_balances.py
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from finance.models import BusinessSystemAccount, BusinessSystemBalance
+
+
+class Command(BaseCommand):
+    help = (
+        "business_system_account журналидан қолдиқларни қайта ҳисоблайди ва "
+        "ёзувлардаги tizimdagi_balance ҳамда business_system_balance бош қаторлари "
+        "билан солиштиради. --fix берилса, бош қаторлар тузатилади (журнал ўзгармайди; "
+        "--fix'ни янги ёзувлар тушмаётган пайтда ишга туширинг)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--business", type=int, help="Фақат шу business_id")
+        parser.add_argument("--fix", action="store_true",
+                            help="Бош қаторни журналдан ҳисобланган қолдиққа тенглаштириш")
+
+    def handle(self, *args, **options):
+        rows = BusinessSystemAccount.objects.order_by("business_id", "grated", "id")
+        heads = BusinessSystemBalance.objects.all()
+        if options["business"]:
+            rows = rows.filter(business_id=options["business"])
+            heads = heads.filter(business_id=options["business"])
+        heads = dict(heads.values_list("business_id", "balance"))
+
+        # business_id -> [ҳисобланган қолдиқ, охирги ёзув id, фарқли ёзувлар сони, биринчи фарқли id]
+        computed = {}
+        for r in rows.values("business_id", "id", "operation", "income", "expense",
+                             "tizimdagi_balance").iterator(chunk_size=2000):
+            st = computed.setdefault(r["business_id"], [Decimal("0"), None, 0, None])
+            st[0] = BusinessSystemAccount.apply_operation(st[0], r["operation"], r["income"], r["expense"])
+            st[1] = r["id"]
+            if r["tizimdagi_balance"] != st[0]:
+                st[2] += 1
+                if st[3] is None:
+                    st[3] = r["id"]
+
+        drift = 0
+        for business_id in sorted(set(computed) | set(heads)):
+            balance, last_id, bad_rows, first_bad = computed.get(business_id, [Decimal("0"), None, 0, None])
+            head = heads.get(business_id)
+            head_ok = head is not None and head == balance
+            if bad_rows == 0 and head_ok:
+                continue
+
+            drift += 1
+            msg = f"business_id={business_id}: журнал бўйича {balance}, бош қатор {head}"
+            if bad_rows:
+                msg += f"; {bad_rows} та ёзувда tizimdagi_balance фарқли (биринчиси id={first_bad})"
+            self.stdout.write(self.style.WARNING(msg))
+
+            if options["fix"] and not head_ok:
+                with transaction.atomic():
+                    head_obj = BusinessSystemBalance.lock_for_business(business_id)
+                    head_obj.balance = balance
+                    head_obj.last_entry_id = last_id
+                    head_obj.save(update_fields=["balance", "last_entry_id", "updated_at"])
+                self.stdout.write(f"  -> бош қатор тузатилди: {balance}")
+
+        if drift:
+            self.stdout.write(self.style.WARNING(f"Фарқ топилган бизнеслар: {drift} та."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Фарқ йўқ ({len(computed)} та бизнес текширилди)."))
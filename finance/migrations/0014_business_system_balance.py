@@ -0,0 +1,51 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def seed_heads(apps, schema_editor):
+    # Ҳар бизнес учун журналдаги охирги ёзув қолдиғи бош қаторга ёзилади
+    Account = apps.get_model("finance", "BusinessSystemAccount")
+    Balance = apps.get_model("finance", "BusinessSystemBalance")
+    heads = {}
+    for row in (Account.objects
+                .order_by("business_id", "grated", "id")
+                .values("business_id", "id", "tizimdagi_balance")
+                .iterator()):
+        heads[row["business_id"]] = row
+    Balance.objects.bulk_create(
+        [Balance(business_id=b, balance=r["tizimdagi_balance"], last_entry_id=r["id"])
+         for b, r in heads.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0017_geolist_center_columns'),
+        ('finance', '0013_transaction'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BusinessSystemBalance',
+            fields=[
+                ('business', models.OneToOneField(on_delete=django.db.models.deletion.PROTECT, primary_key=True, related_name='system_balance', serialize=False, to='accounts.business')),
+                ('balance', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('last_entry_id', models.BigIntegerField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Бизнес тизим ҳисоби қолдиғи',
+                'verbose_name_plural': 'Бизнес тизим ҳисоби қолдиқлари',
+                'db_table': 'business_system_balance',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='businesssystemaccount',
+            index=models.Index(fields=['business', 'grated'], name='idx_bsa_biz_grated'),
+        ),
+        migrations.RunPython(seed_heads, migrations.RunPython.noop),
+    ]
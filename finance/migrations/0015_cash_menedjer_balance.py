@@ -0,0 +1,62 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def seed_heads(apps, schema_editor):
+    # Ҳар (business, menedjer_id) учун охирги CashMenedjer ёзуви қолдиғи бош қаторга ёзилади
+    CashMenedjer = apps.get_model("finance", "CashMenedjer")
+    Balance = apps.get_model("finance", "CashMenedjerBalance")
+    heads = {}
+    for row in (CashMenedjer.objects
+                .filter(business_id__isnull=False)
+                .order_by("business_id", "menedjer_id", "grated", "id")
+                .values("business_id", "menedjer_id", "id", "balance")
+                .iterator()):
+        heads[(row["business_id"], row["menedjer_id"])] = row
+    Balance.objects.bulk_create(
+        [Balance(business_id=b, menedjer_id=m, balance=r["balance"], last_entry_id=r["id"])
+         for (b, m), r in heads.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0017_geolist_center_columns'),
+        ('finance', '0014_business_system_balance'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CashMenedjerBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('menedjer_id', models.BigIntegerField()),
+                ('balance', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('last_entry_id', models.BigIntegerField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Менежер кассаси қолдиғи',
+                'verbose_name_plural': 'Менежер кассаси қолдиқлари',
+                'db_table': 'cash_menedjer_balance',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='cashmenedjer',
+            index=models.Index(fields=['business', 'menedjer_id', 'grated'], name='idx_cash_menedjer_mgr_dt'),
+        ),
+        migrations.AddField(
+            model_name='cashmenedjerbalance',
+            name='business',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='accounts.business'),
+        ),
+        migrations.AddConstraint(
+            model_name='cashmenedjerbalance',
+            constraint=models.UniqueConstraint(fields=('business', 'menedjer_id'), name='uq_cash_menedjer_balance'),
+        ),
+        migrations.RunPython(seed_heads, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,106 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:21
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def seed_heads_and_snapshots(apps, schema_editor):
+    # Журнални бир марта ўқиб: ҳар курьерга бош қатор, ҳар N "ok" ҳаракатда назорат нуқтаси
+    Ledger = apps.get_model("finance", "CourierWaterBottleBalance")
+    Balance = apps.get_model("finance", "CourierStockBalance")
+    Snapshot = apps.get_model("finance", "CourierStockSnapshot")
+    every = int(getattr(settings, "COURIER_STOCK_SNAPSHOT_EVERY", 100) or 0)
+
+    heads, snapshots = {}, []
+    for row in (Ledger.objects
+                .filter(status="ok")
+                .order_by("business_id", "kuryer_id", "grated", "id")
+                .values("business_id", "kuryer_id", "id", "grated", "water_balance", "bottle_balance")
+                .iterator()):
+        key = (row["business_id"], row["kuryer_id"])
+        head = heads.setdefault(key, {"movements": 0})
+        head.update(row)
+        head["movements"] += 1
+        if every > 0 and head["movements"] % every == 0:
+            snapshots.append(Snapshot(
+                business_id=row["business_id"], kuryer_id=row["kuryer_id"],
+                entry_id=row["id"], entry_grated=row["grated"],
+                water_balance=row["water_balance"], bottle_balance=row["bottle_balance"],
+            ))
+
+    Balance.objects.bulk_create(
+        [Balance(business_id=b, kuryer_id=k, water_balance=h["water_balance"],
+                 bottle_balance=h["bottle_balance"], last_entry_id=h["id"], movements=h["movements"])
+         for (b, k), h in heads.items()],
+        batch_size=1000,
+    )
+    Snapshot.objects.bulk_create(snapshots, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0017_geolist_center_columns'),
+        ('finance', '0015_cash_menedjer_balance'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourierStockBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kuryer_id', models.BigIntegerField()),
+                ('water_balance', models.PositiveIntegerField(default=0)),
+                ('bottle_balance', models.PositiveIntegerField(default=0)),
+                ('last_entry_id', models.BigIntegerField(blank=True, null=True)),
+                ('movements', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Курер сув ва тара қолдиғи',
+                'verbose_name_plural': 'Курер сув ва тара қолдиқлари',
+                'db_table': 'kuryer_stock_balance',
+            },
+        ),
+        migrations.CreateModel(
+            name='CourierStockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kuryer_id', models.BigIntegerField()),
+                ('entry_id', models.BigIntegerField()),
+                ('entry_grated', models.DateTimeField()),
+                ('water_balance', models.PositiveIntegerField(default=0)),
+                ('bottle_balance', models.PositiveIntegerField(default=0)),
+                ('grated', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Курер қолдиғи назорат нуқтаси',
+                'verbose_name_plural': 'Курер қолдиғи назорат нуқталари',
+                'db_table': 'kuryer_stock_snapshot',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='courierwaterbottlebalance',
+            index=models.Index(fields=['business', 'kuryer_id', 'grated'], name='idx_kwbb_kur_grated'),
+        ),
+        migrations.AddField(
+            model_name='courierstockbalance',
+            name='business',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='accounts.business'),
+        ),
+        migrations.AddField(
+            model_name='courierstocksnapshot',
+            name='business',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='accounts.business'),
+        ),
+        migrations.AddConstraint(
+            model_name='courierstockbalance',
+            constraint=models.UniqueConstraint(fields=('business', 'kuryer_id'), name='uq_kuryer_stock_balance'),
+        ),
+        migrations.AddIndex(
+            model_name='courierstocksnapshot',
+            index=models.Index(fields=['business', 'kuryer_id', 'entry_grated'], name='idx_kss_kur_grated'),
+        ),
+        migrations.RunPython(seed_heads_and_snapshots, migrations.RunPython.noop),
+    ]
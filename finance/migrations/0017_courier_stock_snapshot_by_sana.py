@@ -0,0 +1,49 @@
+# Generated by Django 5.2.4 on 2026-10-18 14:05
+
+import datetime
+
+from django.db import migrations, models
+
+
+def drop_grated_snapshots(apps, schema_editor):
+    # Эски нуқталар киритилган вақт (grated) ўқида эди — тарих (sana) ўқига мос эмас.
+    # Янгилари тарих сўровларида қайта қўйилади.
+    apps.get_model("finance", "CourierStockSnapshot").objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0016_courier_stock_balance'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_grated_snapshots, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='courierstocksnapshot',
+            name='idx_kss_kur_grated',
+        ),
+        migrations.RemoveField(
+            model_name='courierstocksnapshot',
+            name='entry_grated',
+        ),
+        migrations.RemoveField(
+            model_name='courierstocksnapshot',
+            name='entry_id',
+        ),
+        migrations.AddField(
+            model_name='courierstocksnapshot',
+            name='sana',
+            field=models.DateField(default=datetime.date(2000, 1, 1)),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='courierstockbalance',
+            name='snapshot_upto',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='courierstocksnapshot',
+            constraint=models.UniqueConstraint(fields=('business', 'kuryer_id', 'sana'), name='uq_kuryer_stock_snapshot'),
+        ),
+    ]
@@ -1,7 +1,10 @@
-from django.db import models, transaction
+from datetime import date
+
+from django.db import models, transaction, IntegrityError
 from django.core.exceptions import ValidationError
 from accounts.models import Business  # тенант
 from django.utils import timezone
+from django.conf import settings
 
 class CashMenedjer(models.Model):
     business = models.ForeignKey(Business, on_delete=models.PROTECT, null=True, blank=True)
@@ -38,15 +41,151 @@ class CashMenedjer(models.Model):
         indexes = [
             models.Index(fields=["business", "menedjer_id"], name="idx_cash_menedjer_mgr"),
             models.Index(fields=["business", "kuryer_id"],   name="idx_cash_menedjer_kur"),
+            models.Index(fields=["business", "menedjer_id", "grated"], name="idx_cash_menedjer_mgr_dt"),
         ]
 
-    def save(self, *args, **kwargs):
+    def fill_cash_message(self):
         # Автоматик хабар (хоҳласангиз матнни ўзгартиришингиз мумкин)
+        # bulk_create save()'ни чақирмайди — шунинг учун алоҳида метод
         if (self.cash_operation or "").lower() == "income":
             self.cash_message = f"Курьер {self.kuryer_name} дан кирим бўлди"
         elif (self.cash_operation or "").lower() == "expense":
             self.cash_message = "Нақд пул топширилди"
+
+    @staticmethod
+    def entry_delta(income, expense):
+        """Ёзувнинг менежер кассасига таъсири."""
+        return (income or 0) - (expense or 0)
+
+    @transaction.atomic
+    def save(self, *args, **kwargs):
+        """
+        balance — шу ёзувдан кейинги касса қолдиғи: CashMenedjerBalance бош қатори
+        қулфланиб, ундан ҳисобланади ва бош қатор шу ёзувга сурилади (админдан
+        қўшилган ёзув ҳам). Мавжуд ёзувнинг суммаси ёки менежери ўзгарса, фарқи
+        бош қаторга қулф остида қўлланади. bulk_create save()'ни чақирмайди —
+        CashState.approve_many бош қаторни ўзи янгилайди.
+        """
+        self.fill_cash_message()
+        if not self._state.adding:
+            self._save_existing(*args, **kwargs)
+            return
+        if self.business_id is None:
+            super().save(*args, **kwargs)
+            return
+
+        head = CashMenedjerBalance.lock_for(self.business_id, self.menedjer_id)
+        self.balance = head.balance + self.entry_delta(self.income, self.expense)
+        super().save(*args, **kwargs)
+        head.balance = self.balance
+        head.last_entry_id = self.id
+        head.save(update_fields=["balance", "last_entry_id", "updated_at"])
+
+    def _save_existing(self, *args, **kwargs):
+        old = self._stored()
+        new = {"business_id": self.business_id, "menedjer_id": self.menedjer_id,
+               "income": self.income, "expense": self.expense}
+        if old is None or old == new:
+            super().save(*args, **kwargs)
+            return
+
+        # (business, menedjer) -> фарқ; бир менежер бўлса — битта фарқ
+        changes = self._impact(old, -1)
+        for key, delta in self._impact(new, 1).items():
+            changes[key] = changes.get(key, 0) + delta
+        heads = self._lock_heads(changes)
         super().save(*args, **kwargs)
+        for head, delta in heads:
+            head.shift(delta)
+
+    @transaction.atomic
+    def delete(self, *args, **kwargs):
+        old = self._stored()
+        heads = self._lock_heads(self._impact(old, -1)) if old is not None else []
+        result = super().delete(*args, **kwargs)
+        for head, delta in heads:
+            head.shift(delta)
+        return result
+
+    def _stored(self):
+        return (type(self).objects.filter(pk=self.pk)
+                .values("business_id", "menedjer_id", "income", "expense").first())
+
+    @classmethod
+    def _impact(cls, row, sign):
+        """{(business_id, menedjer_id): sign * таъсир}; бизнессиз ёзув бош қаторга кирмайди."""
+        if row["business_id"] is None:
+            return {}
+        return {(row["business_id"], row["menedjer_id"]): sign * cls.entry_delta(row["income"], row["expense"])}
+
+    @staticmethod
+    def _lock_heads(changes):
+        # бош қаторлар ёзувдан ОЛДИН қулфланади (қатор йўқ бўлса, журналдан эски ҳолатда яратилади)
+        return [(CashMenedjerBalance.lock_for(*key), delta) for key, delta in sorted(changes.items()) if delta]
+
+
+class CashMenedjerBalance(models.Model):
+    """
+    Менежер кассасининг жорий қолдиғи (business + menedjer_id бўйича битта қатор).
+    Ҳар CashMenedjer ёзуви (CashState тасдиғи, админ) шу қаторни қулфлаб янгилайди —
+    охирги ёзувни қидириш ва параллел тасдиқлар пойгаси йўқ. Журнал билан
+    солиштириш: check_cash_menedjer буйруғи.
+    """
+    business = models.ForeignKey(Business, on_delete=models.PROTECT)
+    menedjer_id = models.BigIntegerField()
+    balance = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    last_entry_id = models.BigIntegerField(blank=True, null=True)  # охирги CashMenedjer ёзуви
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "cash_menedjer_balance"
+        verbose_name = "Менежер кассаси қолдиғи"
+        verbose_name_plural = "Менежер кассаси қолдиқлари"
+        constraints = [
+            models.UniqueConstraint(fields=["business", "menedjer_id"], name="uq_cash_menedjer_balance"),
+        ]
+
+    def __str__(self):
+        return f"{self.business_id}/{self.menedjer_id} | Bal: {self.balance}"
+
+    @classmethod
+    def lock_for(cls, business_id, menedjer_id):
+        """
+        Бош қаторни SELECT ... FOR UPDATE билан қайтаради (транзакция ичида чақирилсин).
+        Қатор йўқ бўлса — охирги CashMenedjer ёзуви қолдиғидан яратилади.
+        """
+        head = (cls.objects.select_for_update()
+                .filter(business_id=business_id, menedjer_id=menedjer_id).first())
+        if head is not None:
+            return head
+
+        last = (
+            CashMenedjer.objects
+            .filter(business_id=business_id, menedjer_id=menedjer_id)
+            .order_by("-grated", "-id")
+            .values("id", "balance")
+            .first()
+        )
+        try:
+            with transaction.atomic():
+                return cls.objects.create(
+                    business_id=business_id,
+                    menedjer_id=menedjer_id,
+                    balance=last["balance"] if last else 0,
+                    last_entry_id=last["id"] if last else None,
+                )
+        except IntegrityError:
+            # параллел сўров аввалроқ яратди — энди уни қулфлаймиз
+            return (cls.objects.select_for_update()
+                    .get(business_id=business_id, menedjer_id=menedjer_id))
+
+    def shift(self, delta):
+        """Мавжуд CashMenedjer ёзуви ўзгарганда ёки ўчирилганда: қолдиқ delta'га сурилади."""
+        self.balance += delta
+        self.last_entry_id = (CashMenedjer.objects
+                              .filter(business_id=self.business_id, menedjer_id=self.menedjer_id)
+                              .order_by("-grated", "-id").values_list("id", flat=True).first())
+        self.save(update_fields=["balance", "last_entry_id", "updated_at"])
 
 
 class CashState(models.Model):
@@ -103,24 +242,9 @@ class CashState(models.Model):
             if self.expense <= 0 or self.income != 0:
                 raise ValidationError("Expense учун expense>0 ва income=0 бўлиши керак.")
 
-    @transaction.atomic
-    def approve(self, now_dt):
-        """Менежер тасдиқлаганда CashMenedjer’га ўтказиш ва балансни янгилаш."""
-        if self.status != "pending":
-            return self.cash_boss  # олдин ишланган
-
-        # олдинги баланс (энди CashMenedjer бўйича)
-        last = (
-            CashMenedjer.objects
-            .filter(business=self.business, menedjer_id=self.menedjer_id)
-            .order_by("-grated")
-            .first()
-        )
-        prev_balance = last.balance if last else 0
-        new_balance = prev_balance + (self.income or 0) - (self.expense or 0)
-
-        boss = CashMenedjer.objects.create(
-            business=self.business,
+    def _to_cash_menedjer(self, balance):
+        return CashMenedjer(
+            business_id=self.business_id,
             sana=self.sana,
             vaqt=self.vaqt,
             menedjer_id=self.menedjer_id,
@@ -129,10 +253,23 @@ class CashState(models.Model):
             kuryer_name=self.kuryer_name,
             income=self.income,
             expense=self.expense,
-            balance=new_balance,
+            balance=balance,
             cash_operation=self.cash_operation,
         )
 
+    @transaction.atomic
+    def approve(self, now_dt):
+        """Менежер тасдиқлаганда CashMenedjer’га ўтказиш ва балансни янгилаш."""
+        # ҳолатни қулф остида қайта ўқиймиз — бир ёзув икки марта тасдиқланмасин
+        locked = CashState.objects.select_for_update().only("status", "cash_boss").get(pk=self.pk)
+        if locked.status != "pending":
+            return locked.cash_boss  # олдин ишланган
+
+        # баланс менежер кассасининг бош қаторидан — CashMenedjer.save() қулф остида ҳисоблайди
+        boss = self._to_cash_menedjer(0)
+        boss.save()
+        new_balance = boss.balance
+
         self.cash_boss  = boss
         self.balance    = new_balance
         self.status     = "approved"
@@ -140,6 +277,52 @@ class CashState(models.Model):
         self.save(update_fields=["cash_boss", "balance", "status", "tasdiq_vaqti"])
         return boss
 
+    @classmethod
+    @transaction.atomic
+    def approve_many(cls, business_id, menedjer_id, now_dt, ids=None):
+        """
+        Бир менежернинг pending ҳолатларини битта транзакцияда тасдиқлайди:
+        бош қатор бир марта қулфланади, баланслар хотирада занжир қилинади,
+        CashMenedjer ёзувлари bulk_create, бош қатор битта UPDATE.
+        ids берилса — фақат шулар (бошқа менежерники ёки pending бўлмагани ўтказиб юборилади).
+        Қайтаради: тасдиқланган CashState рўйхати (grated, id тартибида).
+        """
+        head = CashMenedjerBalance.lock_for(business_id, menedjer_id)
+
+        qs = (cls.objects.select_for_update()
+              .filter(business_id=business_id, menedjer_id=menedjer_id, status="pending")
+              .order_by("grated", "id"))
+        if ids is not None:
+            qs = qs.filter(id__in=ids)
+        states = list(qs)
+        if not states:
+            return []
+
+        balance = head.balance
+        entries = []
+        for st in states:
+            balance = balance + (st.income or 0) - (st.expense or 0)
+            st.balance = balance
+            entry = st._to_cash_menedjer(balance)
+            entry.fill_cash_message()
+            entries.append(entry)
+        entries = CashMenedjer.objects.bulk_create(entries)
+
+        for st, entry in zip(states, entries):
+            st.cash_boss = entry
+            st.status = "approved"
+            st.tasdiq_vaqti = now_dt
+        cls.objects.bulk_update(states, ["cash_boss", "balance", "status", "tasdiq_vaqti"])
+
+        head.balance = balance
+        head.last_entry_id = entries[-1].id
+        head.save(update_fields=["balance", "last_entry_id", "updated_at"])
+
+        # bulk_create/bulk_update сигнал юбормайди — main_menu_stats кэши commit'дан кейин ташланади
+        from orders.stats import invalidate_main_menu_stats
+        invalidate_main_menu_stats(business_id)
+        return states
+
     def reject(self, now_dt):
         """Менежер рад этса — CashMenedjer’га ўтмайди."""
         if self.status == "pending":
@@ -262,6 +445,7 @@ class CourierWaterBottleBalance(models.Model):
             models.Index(fields=["business", "kuryer_id", "sana", "vaqt"], name="idx_kwbb_kur_dt"),
             models.Index(fields=["business", "menedjer_id"], name="idx_kwbb_menedjer"),  # old: boss_id
             models.Index(fields=["business", "operation"], name="idx_kwbb_op"),
+            models.Index(fields=["business", "kuryer_id", "grated"], name="idx_kwbb_kur_grated"),
         ]
 
     def __str__(self):
@@ -285,45 +469,271 @@ class CourierWaterBottleBalance(models.Model):
             if self.income == 0 and self.expense == 0:
                 raise ValidationError("adjustment: income ёки expense дан камида бири > 0 бўлиши керак.")
 
-    @transaction.atomic
-    def save(self, *args, **kwargs):
+    @staticmethod
+    def operation_delta(operation, income, expense):
         """
-        Автоматик қолдиқ ҳисоблаш:
+        Битта ҳаракатнинг қолдиққа таъсири:
         - in_from_boss:  +income
         - sell_to_client: -expense
         - return_empty:   0 (баланс ўзгармайди)
         - adjustment:     +income -expense
         """
-        is_new = self._state.adding
-
-        if is_new:
-            # олдинги ҳолатни оламиз (шу курьер + бизнес бўйича)
-            last = (
-                CourierWaterBottleBalance.objects
-                .select_for_update()
-                .filter(business=self.business, kuryer_id=self.kuryer_id, status="ok")
-                .order_by("-grated")
-                .first()
-            )
-            prev_water = last.water_balance if last else 0
-            prev_bottle = last.bottle_balance if last else 0
-
-            delta = 0
-            if self.operation == "in_from_boss":
-                delta = self.income
-            elif self.operation == "sell_to_client":
-                delta = -self.expense
-            elif self.operation == "return_empty":
-                delta = 0
-            elif self.operation == "adjustment":
-                delta = self.income - self.expense
-
-            # Ҳар иккала баланс бир хил қадам билан ўзгаради
-            self.water_balance = max(0, prev_water + delta)
-            self.bottle_balance = max(0, prev_bottle + delta)
+        if operation == "in_from_boss":
+            return income
+        if operation == "sell_to_client":
+            return -expense
+        if operation == "adjustment":
+            return income - expense
+        return 0
+
+    @classmethod
+    def apply_delta(cls, water, bottle, operation, income, expense):
+        # Ҳар иккала баланс бир хил қадам билан ўзгаради (0 дан паст тушмайди)
+        delta = cls.operation_delta(operation, income, expense)
+        return max(0, water + delta), max(0, bottle + delta)
 
+    @transaction.atomic
+    def save(self, *args, **kwargs):
+        """
+        Автоматик қолдиқ ҳисоблаш: олдинги ҳолат курьернинг CourierStockBalance
+        бош қаторидан олинади (қулф билан), "ok" ёзувдан кейин бош қатор янгиланади.
+        Мавжуд ёзув ўзгарса (масалан, админда draft/void <-> ok), унинг аввалги
+        ва янги таъсири фарқи бош қаторга қулф остида қўлланади.
+        """
+        if not self._state.adding:
+            self._save_existing(*args, **kwargs)
+            return
+
+        head = CourierStockBalance.lock_for(self.business_id, self.kuryer_id)
+        self.water_balance, self.bottle_balance = self.apply_delta(
+            head.water_balance, head.bottle_balance, self.operation, self.income, self.expense
+        )
+
+        super().save(*args, **kwargs)
+
+        if self.status == "ok":
+            head.advance(self)
+
+    def _save_existing(self, *args, **kwargs):
+        old = (type(self).objects.filter(pk=self.pk)
+               .values("business_id", "kuryer_id", "status", "operation", "income", "expense", "sana").first())
+        new = {"business_id": self.business_id, "kuryer_id": self.kuryer_id, "status": self.status,
+               "operation": self.operation, "income": self.income, "expense": self.expense,
+               "sana": _as_date(self.sana)}
+        if old is None or old == new or (old["status"] != "ok" and self.status != "ok"):
+            super().save(*args, **kwargs)
+            return
+
+        # (business, kuryer) -> [delta, movements, энг эрта sana]; бир курьер бўлса — битта фарқ
+        changes = {}
+        if old["status"] == "ok":
+            ch = changes.setdefault((old["business_id"], old["kuryer_id"]), [0, 0, old["sana"]])
+            ch[0] -= self.operation_delta(old["operation"], old["income"], old["expense"])
+            ch[1] -= 1
+        if self.status == "ok":
+            ch = changes.setdefault((self.business_id, self.kuryer_id), [0, 0, new["sana"]])
+            ch[0] += self.operation_delta(self.operation, self.income, self.expense)
+            ch[1] += 1
+            ch[2] = min(ch[2], new["sana"])
+
+        # бош қаторлар ёзувдан ОЛДИН қулфланади (қатор йўқ бўлса, журналдан эски ҳолатда яратилади)
+        heads = [(CourierStockBalance.lock_for(*key), delta, moves, since)
+                 for key, (delta, moves, since) in sorted(changes.items())]
         super().save(*args, **kwargs)
-        
+        for head, delta, moves, since in heads:
+            head.shift(delta, moves, since)
+
+    @transaction.atomic
+    def delete(self, *args, **kwargs):
+        """"ok" ҳаракат ўчирилса, унинг таъсири бош қатордан қулф остида айирилади."""
+        old = (type(self).objects.filter(pk=self.pk)
+               .values("business_id", "kuryer_id", "status", "operation", "income", "expense", "sana").first())
+        head = None
+        if old is not None and old["status"] == "ok":
+            head = CourierStockBalance.lock_for(old["business_id"], old["kuryer_id"])
+        result = super().delete(*args, **kwargs)
+        if head is not None:
+            head.shift(-self.operation_delta(old["operation"], old["income"], old["expense"]), -1, old["sana"])
+        return result
+
+
+def _as_date(value):
+    """DateField қиймати: save()'гача у ISO қатор бўлиб қолиши мумкин."""
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+class CourierStockBalance(models.Model):
+    """
+    Курьернинг жорий сув/тара қолдиғи (business + kuryer_id бўйича битта қатор).
+    Ҳар "ok" ҳаракатда қулф остида янгиланади. snapshot_upto — энг кечки
+    CourierStockSnapshot санаси: ундан олдинги санали ҳаракат ёзилгандагина
+    назорат нуқталари ўчирилади (бугунги ҳаракатлар учун қўшимча сўров йўқ).
+    """
+    business = models.ForeignKey(Business, on_delete=models.PROTECT)
+    kuryer_id = models.BigIntegerField()
+    water_balance = models.PositiveIntegerField(default=0)
+    bottle_balance = models.PositiveIntegerField(default=0)
+    last_entry_id = models.BigIntegerField(blank=True, null=True)  # охирги "ok" ҳаракат
+    movements = models.PositiveBigIntegerField(default=0)         # "ok" ҳаракатлар сони
+    snapshot_upto = models.DateField(blank=True, null=True)       # энг кечки назорат нуқтаси
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "kuryer_stock_balance"
+        verbose_name = "Курер сув ва тара қолдиғи"
+        verbose_name_plural = "Курер сув ва тара қолдиқлари"
+        constraints = [
+            models.UniqueConstraint(fields=["business", "kuryer_id"], name="uq_kuryer_stock_balance"),
+        ]
+
+    def __str__(self):
+        return f"{self.business_id}/{self.kuryer_id} | W:{self.water_balance} B:{self.bottle_balance}"
+
+    @classmethod
+    def lock_for(cls, business_id, kuryer_id):
+        """
+        Бош қаторни SELECT ... FOR UPDATE билан қайтаради (транзакция ичида чақирилсин).
+        Қатор йўқ бўлса — охирги "ok" ҳаракат қолдиғидан яратилади.
+        """
+        head = (cls.objects.select_for_update()
+                .filter(business_id=business_id, kuryer_id=kuryer_id).first())
+        if head is not None:
+            return head
+
+        ok_rows = CourierWaterBottleBalance.objects.filter(
+            business_id=business_id, kuryer_id=kuryer_id, status="ok"
+        )
+        last = (ok_rows.order_by("-grated", "-id")
+                .values("id", "water_balance", "bottle_balance").first())
+        try:
+            with transaction.atomic():
+                return cls.objects.create(
+                    business_id=business_id,
+                    kuryer_id=kuryer_id,
+                    water_balance=last["water_balance"] if last else 0,
+                    bottle_balance=last["bottle_balance"] if last else 0,
+                    last_entry_id=last["id"] if last else None,
+                    movements=ok_rows.count() if last else 0,
+                )
+        except IntegrityError:
+            # параллел сўров аввалроқ яратди — энди уни қулфлаймиз
+            return (cls.objects.select_for_update()
+                    .get(business_id=business_id, kuryer_id=kuryer_id))
+
+    def advance(self, entry):
+        """"ok" ҳаракатдан кейин бош қаторни янгилайди."""
+        self.advance_many([entry])
+
+    def advance_many(self, entries):
+        """
+        Кетма-кет "ok" ҳаракатлар (сақланган, тартибда) учун бош қаторни БИР МАРТА
+        янгилайди; ўтган санали ҳаракат бўлса, ундан кейинги назорат нуқталари ўчирилади.
+        """
+        if not entries:
+            return
+        last = entries[-1]
+        self.water_balance = last.water_balance
+        self.bottle_balance = last.bottle_balance
+        self.last_entry_id = last.id
+        self.movements += len(entries)
+        self.drop_snapshots(min(_as_date(e.sana) for e in entries))
+        self.save(update_fields=["water_balance", "bottle_balance", "last_entry_id",
+                                 "movements", "snapshot_upto", "updated_at"])
+
+    def shift(self, delta, movements, since):
+        """
+        Мавжуд ҳаракат ўзгарганда (ok бўлди/ok'дан чиқди/ўчирилди): қолдиқ delta'га,
+        movements — movements'га сурилади. since (ҳаракат санаси) дан кейинги
+        назорат нуқталари эскирди — ўчирилади.
+        """
+        self.water_balance = max(0, self.water_balance + delta)
+        self.bottle_balance = max(0, self.bottle_balance + delta)
+        self.movements = max(0, self.movements + movements)
+        self.last_entry_id = (CourierWaterBottleBalance.objects
+                              .filter(business_id=self.business_id, kuryer_id=self.kuryer_id, status="ok")
+                              .order_by("-grated", "-id").values_list("id", flat=True).first())
+        self.drop_snapshots(since)
+        self.save(update_fields=["water_balance", "bottle_balance", "movements", "last_entry_id",
+                                 "snapshot_upto", "updated_at"])
+
+    def drop_snapshots(self, since):
+        """
+        since санали ҳаракат ўзгарди: sana > since назорат нуқталари ўчирилади
+        (қулфланган бош қаторда; snapshot_upto ни чақирувчи сақлайди).
+        """
+        if self.snapshot_upto is None or self.snapshot_upto <= since:
+            return
+        snaps = CourierStockSnapshot.objects.filter(business_id=self.business_id, kuryer_id=self.kuryer_id)
+        snaps.filter(sana__gt=since).delete()
+        self.snapshot_upto = snaps.order_by("-sana").values_list("sana", flat=True).first()
+
+
+class CourierStockSnapshot(models.Model):
+    """
+    Курьер қолдиғининг назорат нуқтаси: sana'дан ОЛДИНГИ (sana < шу кун) барча
+    "ok" ҳаракатлар қолдиғи — тарих (sana, vaqt, id) ўқида шундан давом этади.
+    Нуқталарни тарих сўрови ўзи қўяди (узун журнални қайта ўйнаганда, қаранг
+    balance_before); ўтган санага ёзилган ҳаракат кейинги нуқталарни ўчиради.
+    """
+    business = models.ForeignKey(Business, on_delete=models.PROTECT)
+    kuryer_id = models.BigIntegerField()
+    sana = models.DateField()
+    water_balance = models.PositiveIntegerField(default=0)
+    bottle_balance = models.PositiveIntegerField(default=0)
+    grated = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "kuryer_stock_snapshot"
+        verbose_name = "Курер қолдиғи назорат нуқтаси"
+        verbose_name_plural = "Курер қолдиғи назорат нуқталари"
+        constraints = [
+            models.UniqueConstraint(fields=["business", "kuryer_id", "sana"], name="uq_kuryer_stock_snapshot"),
+        ]
+
+    @staticmethod
+    def _replay(business_id, kuryer_id, day):
+        """Энг яқин нуқта (sana <= day) + ундан day'гача "ok" ҳаракатлар: (water, bottle, ҳаракатлар сони)."""
+        snap = (CourierStockSnapshot.objects
+                .filter(business_id=business_id, kuryer_id=kuryer_id, sana__lte=day)
+                .order_by("-sana").values("sana", "water_balance", "bottle_balance").first())
+        water, bottle = (snap["water_balance"], snap["bottle_balance"]) if snap else (0, 0)
+
+        rows = CourierWaterBottleBalance.objects.filter(
+            business_id=business_id, kuryer_id=kuryer_id, status="ok", sana__lt=day
+        )
+        if snap:
+            rows = rows.filter(sana__gte=snap["sana"])
+        moves = 0
+        for op, inc, exp in (rows.order_by("sana", "vaqt", "id")
+                             .values_list("operation", "income", "expense").iterator(chunk_size=2000)):
+            water, bottle = CourierWaterBottleBalance.apply_delta(water, bottle, op, inc, exp)
+            moves += 1
+        return water, bottle, moves
+
+    @classmethod
+    def balance_before(cls, business_id, kuryer_id, day):
+        """
+        day санасигача (sana < day) "ok" ҳаракатлар қолдиғи. Нуқтадан кейин
+        COURIER_STOCK_SNAPSHOT_EVERY тадан кўп ҳаракат қайта ўйналса, day учун
+        янги нуқта қўйилади — бош қатор қулфи остида, ёзувлар пойгаси бўлмаслиги учун.
+        Қайтаради: (water_balance, bottle_balance).
+        """
+        day = _as_date(day)
+        water, bottle, moves = cls._replay(business_id, kuryer_id, day)
+        every = int(getattr(settings, "COURIER_STOCK_SNAPSHOT_EVERY", 100) or 0)
+        if every <= 0 or moves < every:
+            return water, bottle
+
+        with transaction.atomic():
+            head = CourierStockBalance.lock_for(business_id, kuryer_id)
+            water, bottle, _moves = cls._replay(business_id, kuryer_id, day)  # қулф остида қайта
+            cls.objects.update_or_create(business_id=business_id, kuryer_id=kuryer_id, sana=day,
+                                         defaults={"water_balance": water, "bottle_balance": bottle})
+            if head.snapshot_upto is None or head.snapshot_upto < day:
+                head.snapshot_upto = day
+                head.save(update_fields=["snapshot_upto", "updated_at"])
+        return water, bottle
+
 
 class BusinessSystemAccount(models.Model):
     """
@@ -374,6 +784,7 @@ class BusinessSystemAccount(models.Model):
             models.Index(fields=["business", "kuryer_id"],   name="idx_bsa_kur"),
             models.Index(fields=["business", "operation"],   name="idx_bsa_op"),
             models.Index(fields=["business", "status"],      name="idx_bsa_status"),
+            models.Index(fields=["business", "grated"],      name="idx_bsa_biz_grated"),
         ]
 
     def __str__(self):
@@ -389,26 +800,135 @@ class BusinessSystemAccount(models.Model):
                 raise ValidationError("Expense учун expense>0 ва income=0 бўлсин.")
         # promo/бошқаларга қоида қўймасак ҳам бўлади
 
+    @staticmethod
+    def apply_operation(prev, operation, income, expense):
+        """Битта ёзувдан кейинги баланс (save ва check_system_balances учун умумий)."""
+        op = (operation or "").lower()
+        if op == "income":
+            return prev + income
+        if op == "expense":
+            return prev - expense
+        return prev  # promo/бошқа турлар
+
+    @transaction.atomic
     def save(self, *args, **kwargs):
-        # бир бизнес бўйича охирги балансни топиб, янгилаймиз
+        """
+        Янги ёзувда баланс BusinessSystemBalance (бизнеснинг бош қатори) орқали
+        ҳисобланади: бош қатор қулфланади, ёзув қўшилади ва бош қатор шу
+        транзакцияда янгиланади — параллел ёзувлар навбат билан ўтади.
+        Мавжуд ёзувнинг суммаси/операцияси ёки бизнеси ўзгарса (админ), фарқи
+        бош қаторга қулф остида қўлланади.
+        """
+        if not self._state.adding:
+            self._save_existing(*args, **kwargs)
+            return
+
+        head = BusinessSystemBalance.lock_for_business(self.business_id)
+        self.tizimdagi_balance = self.apply_operation(
+            head.balance, self.operation, self.income, self.expense
+        )
+        super().save(*args, **kwargs)
+
+        head.balance = self.tizimdagi_balance
+        head.last_entry_id = self.id
+        head.save(update_fields=["balance", "last_entry_id", "updated_at"])
+
+    def _save_existing(self, *args, **kwargs):
+        old = self._stored()
+        new = {"business_id": self.business_id, "operation": self.operation,
+               "income": self.income, "expense": self.expense}
+        if old is None or old == new:
+            super().save(*args, **kwargs)
+            return
+
+        # business_id -> фарқ; бир бизнес бўлса — битта фарқ
+        changes = {old["business_id"]: -self._effect(old)}
+        changes[self.business_id] = changes.get(self.business_id, 0) + self._effect(new)
+        heads = self._lock_heads(changes)
+        super().save(*args, **kwargs)
+        for head, delta in heads:
+            head.shift(delta)
+
+    @transaction.atomic
+    def delete(self, *args, **kwargs):
+        old = self._stored()
+        heads = self._lock_heads({old["business_id"]: -self._effect(old)}) if old is not None else []
+        result = super().delete(*args, **kwargs)
+        for head, delta in heads:
+            head.shift(delta)
+        return result
+
+    def _stored(self):
+        return (type(self).objects.filter(pk=self.pk)
+                .values("business_id", "operation", "income", "expense").first())
+
+    @classmethod
+    def _effect(cls, row):
+        return cls.apply_operation(0, row["operation"], row["income"], row["expense"])
+
+    @staticmethod
+    def _lock_heads(changes):
+        # бош қаторлар ёзувдан ОЛДИН қулфланади (қатор йўқ бўлса, журналдан эски ҳолатда яратилади)
+        return [(BusinessSystemBalance.lock_for_business(business_id), delta)
+                for business_id, delta in sorted(changes.items()) if delta]
+
+
+class BusinessSystemBalance(models.Model):
+    """
+    Бизнес тизим ҳисобининг жорий қолдиғи (бош қатор, бизнесга битта).
+    business_system_account журналига ҳар ёзув қўшилганда шу қатор
+    қулфланади ва янгиланади — "охирги ёзув"ни қидириш шарт эмас.
+    """
+    business = models.OneToOneField(Business, on_delete=models.PROTECT,
+                                    primary_key=True, related_name="system_balance")
+    balance = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    last_entry_id = models.BigIntegerField(blank=True, null=True)  # охирги журнал ёзуви
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "business_system_balance"
+        verbose_name = "Бизнес тизим ҳисоби қолдиғи"
+        verbose_name_plural = "Бизнес тизим ҳисоби қолдиқлари"
+
+    def __str__(self):
+        return f"{self.business_id} | Bal: {self.balance}"
+
+    @classmethod
+    def lock_for_business(cls, business_id):
+        """
+        Бош қаторни SELECT ... FOR UPDATE билан қайтаради (транзакция ичида чақирилсин).
+        Қатор йўқ бўлса — журналдаги охирги ёзув қолдиғидан яратилади.
+        """
+        head = cls.objects.select_for_update().filter(business_id=business_id).first()
+        if head is not None:
+            return head
+
         last = (
             BusinessSystemAccount.objects
-            .filter(business=self.business)
-            .order_by("-grated")
+            .filter(business_id=business_id)
+            .order_by("-grated", "-id")
+            .values("id", "tizimdagi_balance")
             .first()
         )
-        prev = last.tizimdagi_balance if last else 0
+        try:
+            with transaction.atomic():
+                return cls.objects.create(
+                    business_id=business_id,
+                    balance=last["tizimdagi_balance"] if last else 0,
+                    last_entry_id=last["id"] if last else None,
+                )
+        except IntegrityError:
+            # параллел сўров аввалроқ яратди — энди уни қулфлаймиз
+            return cls.objects.select_for_update().get(business_id=business_id)
+
+    def shift(self, delta):
+        """Мавжуд журнал ёзуви ўзгарганда ёки ўчирилганда: қолдиқ delta'га сурилади."""
+        self.balance += delta
+        self.last_entry_id = (BusinessSystemAccount.objects.filter(business_id=self.business_id)
+                              .order_by("-grated", "-id").values_list("id", flat=True).first())
+        self.save(update_fields=["balance", "last_entry_id", "updated_at"])
 
-        op = (self.operation or "").lower()
-        if op == "income":
-            self.tizimdagi_balance = prev + self.income
-        elif op == "expense":
-            self.tizimdagi_balance = prev - self.expense
-        else:
-            self.tizimdagi_balance = prev  # promo/бошқа турлар
 
-        super().save(*args, **kwargs)
-        
 class Transaction(models.Model):
     class Status(models.TextChoices):
         PENDING   = "pending",   "pending"
@@ -464,4 +984,4 @@ class Transaction(models.Model):
         ]
 
     def __str__(self):
-        return f"{self.transaction_id} | {self.order_id} | {self.status} | {self.amount}"
\ No newline at end of file
+        return f"{self.transaction_id} | {self.order_id} | {self.status} | {self.amount}"
\ No newline at end of file
@@ -0,0 +1,218 @@
+# finance/pricing.py
+"""
+Диапазонли нарх қоидаларининг (service_price_rules) умумий модули.
+
+Аввал ҳар буюртмада JSON қоидалар қайта сортланиб, ҳар қатор int() ва
+try/except билан чизиқли кўриб чиқиларди (бизнес: start/end, курер: min/max).
+Энди қоидалар бир марта "компиляция" қилинади: ўзаро кесишмайдиган
+сегментлар [lo, hi] -> нарх (биринчи мос қоида қоидаси сақланади) ва
+bisect билан O(log n) қидирув. Компиляция натижаси эгаси (бизнес/курер)
+бўйича кэшланади ва қоидалар ўзгарса янгиланади.
+
+Бўлинган (tiered) ҳисоб: жадвал сегментлари (бўшлиқлар ва 0 нархлар fallback
+билан тўлдирилиб) бўйича префикс йиғиндилар сақланади — C(x) = [биринчи
+чегарадан x гача] сувлар нархи. [x, x+n) оралиқдаги n та сув суммаси
+C(x+n) - C(x): иккита bisect, яъни буюртма ҳажмидан қатъи назар O(log n).
+"""
+import copy
+import threading
+from bisect import bisect_right
+
+_INF = float("inf")
+
+
+class PriceTable:
+    """Компиляция қилинган қоидалар: сегментлар бошлари/охирлари ва нархлари."""
+    __slots__ = ("starts", "ends", "prices", "fallback", "_bounds", "_eff", "_cum")
+
+    def __init__(self, starts: list, ends: list, prices: list, fallback: int = 0):
+        self.starts = starts
+        self.ends = ends
+        self.prices = prices
+        self.fallback = fallback  # мос сегмент йўқ ёки нархи 0 бўлса
+        self._build_prefix()
+
+    def _build_prefix(self) -> None:
+        # _bounds[i]'дан кейингиси (ёки чексиз)гача ҳар сув нархи _eff[i];
+        # _cum[i] — _bounds[0]'дан _bounds[i]'гача бўлган сувлар нархи
+        bounds, eff = [], []
+        for lo, hi, price in zip(self.starts, self.ends, self.prices):
+            price = price or self.fallback
+            if eff and bounds[-1] == lo:
+                eff[-1] = price  # олдинги сегмент охиридан кейинги бўшлиқ бўлмади
+            elif not eff or eff[-1] != price:
+                bounds.append(lo)
+                eff.append(price)
+            if hi != _INF:
+                bounds.append(hi + 1)
+                eff.append(self.fallback)
+        cum = [0]
+        for i in range(1, len(bounds)):
+            cum.append(cum[-1] + (bounds[i] - bounds[i - 1]) * eff[i - 1])
+        self._bounds, self._eff, self._cum = bounds, eff, cum
+
+    def unit_price(self, x: int) -> int:
+        i = bisect_right(self.starts, x) - 1
+        price = self.prices[i] if i >= 0 and x <= self.ends[i] else 0
+        return price or self.fallback
+
+    def _prefix(self, x: int) -> int:
+        i = bisect_right(self._bounds, x) - 1
+        if i < 0:  # биринчи чегарадан олдин — fallback (манфий йўналишда)
+            return (x - self._bounds[0]) * self.fallback if self._bounds else x * self.fallback
+        return self._cum[i] + (x - self._bounds[i]) * self._eff[i]
+
+    def amount(self, start: int, n: int) -> int:
+        """
+        Ҳисоблагич start бўлганда n та сув суммаси, ҳар сув ўз диапазони нархида
+        (start, start+1, ..., start+n-1 ҳисоблагичлари бўйича).
+        """
+        return self._prefix(start + n) - self._prefix(start)
+
+    def amounts(self, start: int, quantities) -> list[int]:
+        """Кетма-кет буюртмалар суммалари (unit_prices каби, лекин бўлинган ҳисоб)."""
+        out = []
+        x = start
+        for n in quantities:
+            out.append(self.amount(x, n))
+            x += n
+        return out
+
+    def unit_prices(self, start: int, quantities) -> list[int]:
+        """
+        Кетма-кет буюртмалар нархлари: ҳар бири ўзидан олдингилар сотилгандан
+        кейинги ҳисоблагич (start + олдинги миқдорлар) бўйича.
+        """
+        out = []
+        x = start
+        for n in quantities:
+            out.append(self.unit_price(x))
+            x += n
+        return out
+
+
+EMPTY = PriceTable([], [], [], 0)
+
+
+def _segments(ranges: list) -> PriceTable:
+    """
+    ranges: [(start, end|inf, price), ...] — устунлик тартибида (биринчи мос келгани
+    ютади). Кесишмайдиган, start бўйича тартибланган сегментларга айлантиради.
+    """
+    if not ranges:
+        return EMPTY
+    points = sorted({p for lo, hi, _ in ranges for p in (lo, hi + 1 if hi != _INF else _INF)})
+    starts, ends, prices = [], [], []
+    for lo, nxt in zip(points, points[1:]):
+        price = next((p for a, b, p in ranges if a <= lo and lo <= b), None)
+        if price is None:
+            continue
+        hi = nxt - 1 if nxt != _INF else _INF
+        if prices and prices[-1] == price and ends[-1] + 1 == lo:
+            ends[-1] = hi  # қўшни бир хил нархли бўлаклар бирлашади
+        else:
+            starts.append(lo)
+            ends.append(hi)
+            prices.append(price)
+    return PriceTable(starts, ends, prices)
+
+
+def compile_business_rules(rules) -> PriceTable:
+    """
+    Business.service_price_rules: [{"start", "end"(null — чексиз), "price"}, ...].
+    Аввалги _calc_amount_for_order қоидалари сақланади:
+      - start бўйича тартиб, биринчи мос келган қоида;
+      - start'лардан бири бутун сон бўлмаса — қоидалар йўқ ҳисобланади;
+      - бошқа майдонлари бузуқ қоида ўтказиб юборилади;
+      - нарх топилмаса (ёки 0) ва охирги қоида end=null бўлса — унинг нархи.
+    """
+    if not isinstance(rules, list) or not rules:
+        return EMPTY
+    try:
+        rules = sorted(rules, key=lambda r: int(r.get("start", 0)))
+    except Exception:
+        return EMPTY
+
+    ranges = []
+    for r in rules:
+        try:
+            start = int(r.get("start", 0))
+            end_raw = r.get("end", None)
+            end = _INF if end_raw is None else int(end_raw)
+            price = int(r.get("price", 0))
+        except Exception:
+            continue
+        if end >= start:
+            ranges.append((start, end, price))
+
+    table = _segments(ranges)
+    last = rules[-1]
+    if last.get("end") is None:
+        try:
+            fallback = int(last.get("price", 0))
+        except Exception:
+            fallback = 0
+        if fallback:
+            table = PriceTable(table.starts, table.ends, table.prices, fallback)
+    return table
+
+
+def compile_courier_rules(rules, period: str = "month") -> PriceTable:
+    """
+    Kuryer.service_price_rules: [{"period", "min", "max"(null — чексиз), "price"}, ...].
+    Фақат шу давр қоидалари, min бўйича тартиб, биринчи мос келгани; топилмаса — 0.
+    """
+    if not isinstance(rules, list):
+        return EMPTY
+    ranges = []
+    for r in rules:
+        try:
+            if (r.get("period") or "month") != period:
+                continue
+            mn = int(r.get("min", 0))
+            mx = r.get("max", None)
+            mx = _INF if mx is None else int(mx)
+            price = int(r.get("price", 0))
+        except Exception:
+            continue
+        if mx >= mn:
+            ranges.append((mn, mx, price))
+    ranges.sort(key=lambda t: t[0])
+    return _segments(ranges)
+
+
+class PriceTableCache:
+    """
+    Эгаси бўйича компиляция кэши; қоидалар ўзгарса қайта компиляция.
+    Солиштириш оддий == (dict/list'лар C даражасида) — ҳар чақирувда
+    JSON'га сериализация қилишдан анча арзон.
+    """
+
+    def __init__(self, compile_fn, max_size: int = 10000):
+        self.compile_fn = compile_fn
+        self.max_size = max_size
+        self._items = {}  # key -> (rules нусхаси, PriceTable)
+        self._lock = threading.Lock()
+
+    def get(self, key, rules, *args) -> PriceTable:
+        item = self._items.get(key)
+        if item is not None and item[0] == rules:
+            return item[1]
+        table = self.compile_fn(rules, *args)
+        with self._lock:
+            if len(self._items) >= self.max_size:
+                self._items.clear()
+            self._items[key] = (copy.deepcopy(rules), table)  # чақирувчи рўйхатни ўзгартирса ҳам
+        return table
+
+
+_business_tables = PriceTableCache(compile_business_rules)
+_courier_tables = PriceTableCache(compile_courier_rules)
+
+
+def business_price_table(business_id: int, rules) -> PriceTable:
+    return _business_tables.get(business_id, rules)
+
+
+def courier_price_table(kuryer_id: int, rules, period: str = "month") -> PriceTable:
+    return _courier_tables.get((kuryer_id, period), rules, period)
@@ -1,3 +1,420 @@
-from django.test import TestCase
+import json
+import random
+from datetime import date
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from accounts.business_cache import business_cache
+from .pricing import PriceTableCache, compile_business_rules, compile_courier_rules
+from .models import (BusinessSystemAccount, BusinessSystemBalance,
+                     CashMenedjer, CashMenedjerBalance, CashState,
+                     CourierWaterBottleBalance, CourierStockBalance, CourierStockSnapshot)
+
+
+def _insert_business(business_id: int) -> None:
+    # accounts_business — managed=False, тест базасидаги жадвалда фақат керакли устунлар бор
+    with connection.cursor() as cur:
+        cur.execute(
+            "INSERT INTO accounts_business (id, name, created_at, sana, lang, viloyat, order_num_scheme, order_num_seq) "
+            "VALUES (%s, %s, '2025-01-01 00:00:00', '2025-01-01', 'uz', '', 'global', 0)",
+            [business_id, f"biz-{business_id}"],
+        )
+    business_cache.invalidate(business_id)  # олдинги тестдан қолган профил
+
+
+class SystemBalanceHeadTests(TestCase):
+
+    def setUp(self):
+        _insert_business(1)
+
+    def _entry(self, operation, income=0, expense=0):
+        return BusinessSystemAccount.objects.create(
+            business_id=1, sana="2025-05-01", vaqt="10:00",
+            operation=operation, income=income, expense=expense,
+        )
+
+    def test_head_follows_ledger(self):
+        self._entry("income", income=100000)
+        self._entry("expense", expense=30000)
+        last = self._entry("promo")
+        self.assertEqual(last.tizimdagi_balance, Decimal("70000"))
+        head = BusinessSystemBalance.objects.get(business_id=1)
+        self.assertEqual((head.balance, head.last_entry_id), (Decimal("70000"), last.id))
+
+    def test_edit_and_delete_move_head(self):
+        first = self._entry("income", income=100000)
+        spent = self._entry("expense", expense=30000)
+
+        spent.expense = Decimal("10000")  # админда тузатиш
+        spent.save()
+        head = BusinessSystemBalance.objects.get(business_id=1)
+        self.assertEqual(head.balance, Decimal("90000"))
+        spent.operation, spent.income, spent.expense = "income", Decimal("5000"), Decimal("0")
+        spent.save()
+        head.refresh_from_db()
+        self.assertEqual(head.balance, Decimal("105000"))
+
+        spent.delete()
+        head.refresh_from_db()
+        self.assertEqual((head.balance, head.last_entry_id), (Decimal("100000"), first.id))
+        self.assertEqual(self._entry("expense", expense=1000).tizimdagi_balance, Decimal("99000"))
+
+    def test_check_command_reports_and_fixes_drift(self):
+        self._entry("income", income=100000)
+        BusinessSystemBalance.objects.filter(business_id=1).update(balance=5)
+
+        out = StringIO()
+        call_command("check_system_balances", "--fix", stdout=out)
+        self.assertIn("business_id=1", out.getvalue())
+        self.assertEqual(BusinessSystemBalance.objects.get(business_id=1).balance, Decimal("100000"))
+
+        out = StringIO()
+        call_command("check_system_balances", stdout=out)
+        self.assertIn("Фарқ йўқ", out.getvalue())
+
+
+class CashStateApproveTests(TestCase):
+
+    def setUp(self):
+        _insert_business(1)
+
+    def _state(self, income=0, expense=0, menedjer_id=7001):
+        return CashState.objects.create(
+            business_id=1, sana="2025-05-01", vaqt="10:00",
+            menedjer_id=menedjer_id, menedjer_name="Шерали", kuryer_id=9001, kuryer_name="Жамшид",
+            income=income, expense=expense, cash_operation="income" if income else "expense",
+        )
+
+    def test_approve_is_chained_and_idempotent(self):
+        a = self._state(income=50000)
+        entry = a.approve(timezone.now())
+        self.assertEqual(entry.balance, Decimal("50000"))
+        self.assertEqual(a.approve(timezone.now()), entry)  # иккинчи марта ёзилмайди
+        b = self._state(expense=20000)
+        self.assertEqual(b.approve(timezone.now()).balance, Decimal("30000"))
+        self.assertEqual(CashMenedjer.objects.count(), 2)
+        self.assertEqual(CashMenedjerBalance.objects.get(business_id=1, menedjer_id=7001).balance,
+                         Decimal("30000"))
+
+    def test_bulk_approve_endpoint(self):
+        self._state(income=10000).approve(timezone.now())
+        ids = [self._state(income=5000).id, self._state(expense=3000).id, self._state(income=1000).id]
+        other = self._state(income=999, menedjer_id=7002).id
+
+        resp = self.client.post(
+            "/finance/cash/state/approve-bulk",
+            json.dumps({"business_id": 1, "menedjer_id": 7001, "ids": ids + [other]}),
+            content_type="application/json",
+        )
+        self.assertEqual(resp.status_code, 200, resp.content)
+        body = resp.json()
+        self.assertEqual([a["balance"] for a in body["approved"]], ["15000.00", "12000.00", "13000.00"])
+        self.assertEqual(body["skipped"], [other])
+        self.assertEqual(CashMenedjerBalance.objects.get(business_id=1, menedjer_id=7001).balance,
+                         Decimal("13000"))
+        entry = CashMenedjer.objects.get(id=body["approved"][0]["cash_menedjer_id"])
+        self.assertEqual(entry.cash_message, "Курьер Жамшид дан кирим бўлди")
+        self.assertFalse(CashState.objects.filter(id__in=ids, status="pending").exists())
+
+    def test_direct_entries_move_head_and_check_command(self):
+        self._state(income=10000).approve(timezone.now())
+        head = lambda: CashMenedjerBalance.objects.get(business_id=1, menedjer_id=7001)  # noqa: E731
+
+        # админдан қўшилган ёзув ҳам бош қаторни суради, balance — ундан
+        entry = CashMenedjer.objects.create(
+            business_id=1, sana="2025-05-02", vaqt="09:00", menedjer_id=7001, menedjer_name="Шерали",
+            kuryer_id=9001, kuryer_name="Жамшид", income=0, expense=4000, cash_operation="expense",
+        )
+        self.assertEqual((entry.balance, head().balance, head().last_entry_id),
+                         (Decimal("6000"), Decimal("6000"), entry.id))
+
+        entry.expense = Decimal("1000")
+        entry.save()
+        self.assertEqual(head().balance, Decimal("9000"))
+        entry.delete()
+        self.assertEqual(head().balance, Decimal("10000"))
+        self.assertEqual(self._state(income=500).approve(timezone.now()).balance, Decimal("10500"))
+
+        out = StringIO()
+        call_command("check_cash_menedjer", stdout=out)
+        self.assertIn("Фарқ йўқ", out.getvalue())
+        CashMenedjerBalance.objects.filter(business_id=1, menedjer_id=7001).update(balance=1)
+        out = StringIO()
+        call_command("check_cash_menedjer", "--fix", stdout=out)
+        self.assertIn("журнал бўйича 10500.00, бош қатор 1.00", out.getvalue())
+        self.assertEqual(head().balance, Decimal("10500"))
+
+
+@override_settings(COURIER_STOCK_SNAPSHOT_EVERY=2)
+class CourierStockHeadTests(TestCase):
+
+    def setUp(self):
+        _insert_business(1)
+
+    def _move(self, operation, income=0, expense=0, status="ok", sana="2025-05-01"):
+        return CourierWaterBottleBalance.objects.create(
+            business_id=1, sana=sana, vaqt="10:00", menedjer_id=7001, menedjer_name="Шерали",
+            kuryer_id=9001, kuryer_name="Жамшид", operation=operation,
+            income=income, expense=expense, status=status,
+        )
+
+    def test_head_snapshots_and_balance_endpoint(self):
+        self._move("in_from_boss", income=10)
+        self._move("sell_to_client", expense=3)
+        self._move("adjustment", income=1, status="draft")  # бош қаторга таъсир қилмайди
+        last = self._move("sell_to_client", expense=20)       # 0 дан паст тушмайди
+        self.assertEqual(last.water_balance, 0)
+
+        head = CourierStockBalance.objects.get(business_id=1, kuryer_id=9001)
+        self.assertEqual((head.water_balance, head.movements, head.last_entry_id), (0, 3, last.id))
+        self.assertFalse(CourierStockSnapshot.objects.exists())  # ёзиш йўли нуқта қўймайди
+
+        # бизнес профили + бош қатор; кейинги сўровда профил кэшдан
+        with self.assertNumQueries(2):
+            resp = self.client.get("/finance/courier/stock/balance", {"business_id": 1, "kuryer_id": 9001})
+        self.assertEqual(resp.json()["balances"], {"water_balance": 0, "bottle_balance": 0})
+        with self.assertNumQueries(1):
+            self.client.get("/finance/courier/stock/balance", {"business_id": 1, "kuryer_id": 9001})
+
+    def test_snapshots_on_sana_axis(self):
+        self._move("in_from_boss", income=10)
+        self._move("sell_to_client", expense=3)
+        self._move("in_from_boss", income=5, sana="2025-05-03")
+
+        # 2 та ҳаракат қайта ўйналди (EVERY=2) — 2025-05-02 учун нуқта қўйилади
+        self.assertEqual(CourierStockSnapshot.balance_before(1, 9001, "2025-05-02"), (7, 7))
+        snap = CourierStockSnapshot.objects.get()
+        self.assertEqual((snap.sana, snap.water_balance), (date(2025, 5, 2), 7))
+        head = CourierStockBalance.objects.get(business_id=1, kuryer_id=9001)
+        self.assertEqual(head.snapshot_upto, date(2025, 5, 2))
+        with self.assertNumQueries(2):  # нуқта + ундан кейинги ҳаракатлар
+            self.assertEqual(CourierStockSnapshot.balance_before(1, 9001, "2025-05-04"), (12, 12))
+
+        # бугунги (нуқтадан кейинги) ҳаракат нуқтага тегмайди, ўтган санали — ўчиради
+        self._move("sell_to_client", expense=1, sana="2025-05-03")
+        self.assertTrue(CourierStockSnapshot.objects.exists())
+        self._move("in_from_boss", income=4, sana="2025-04-30")
+        self.assertFalse(CourierStockSnapshot.objects.exists())
+        head.refresh_from_db()
+        self.assertIsNone(head.snapshot_upto)
+        self.assertEqual(CourierStockSnapshot.balance_before(1, 9001, "2025-05-02"), (11, 11))
+
+    def test_status_change_moves_head_and_check_command(self):
+        first = self._move("in_from_boss", income=10)
+        self._move("adjustment", income=1)
+        sell = self._move("sell_to_client", expense=3, status="draft")
+
+        sell.status = "ok"  # админда draft -> ok
+        sell.save()
+        head = CourierStockBalance.objects.get(business_id=1, kuryer_id=9001)
+        self.assertEqual((head.water_balance, head.movements, head.last_entry_id), (8, 3, sell.id))
+
+        self.assertEqual(CourierStockSnapshot.balance_before(1, 9001, "2025-05-02"), (8, 8))
+        first.status = "void"
+        first.save()
+        head.refresh_from_db()
+        self.assertEqual((head.water_balance, head.movements), (0, 2))
+        self.assertFalse(CourierStockSnapshot.objects.exists())  # эскирган нуқта ўчирилди
+
+        # админда ўчириш: "ok" ҳаракат таъсири айирилади, draft'ники йўқ
+        extra = self._move("in_from_boss", income=6)
+        self._move("adjustment", income=2, status="draft").delete()
+        extra.delete()
+        head.refresh_from_db()
+        self.assertEqual((head.water_balance, head.movements, head.last_entry_id), (0, 2, sell.id))
+
+        out = StringIO()
+        call_command("check_courier_stock", stdout=out)
+        self.assertIn("Фарқ йўқ", out.getvalue())
+
+        CourierStockBalance.objects.filter(pk=head.pk).update(water_balance=99)
+        CourierStockSnapshot.objects.create(business_id=1, kuryer_id=9001, sana="2025-05-02",
+                                            water_balance=5, bottle_balance=5)
+        out = StringIO()
+        call_command("check_courier_stock", "--fix", stdout=out)
+        self.assertIn("журнал бўйича 0/0, 2 ҳаракат; бош қатор 99/0", out.getvalue())
+        self.assertIn("эскирган нуқталар: 2025-05-02", out.getvalue())
+        head.refresh_from_db()
+        self.assertEqual(head.water_balance, 0)
+        self.assertFalse(CourierStockSnapshot.objects.exists())
+
+    def test_batch_move_chains_per_courier(self):
+        self._move("in_from_boss", income=5)  # олдинги қолдиқ: 5
+        moves = [
+            {"kuryer_id": 9001, "kuryer_name": "Жамшид", "operation": "in_from_boss", "income": 10},
+            {"kuryer_id": 9002, "kuryer_name": "Азиз", "operation": "in_from_boss", "income": 4},
+            {"kuryer_id": 9001, "kuryer_name": "Жамшид", "operation": "sell_to_client", "expense": 6},
+            {"kuryer_id": 9001, "kuryer_name": "Жамшид", "operation": "return_empty"},
+        ]
+        payload = {"business_id": 1, "menedjer_id": 7001, "menedjer_name": "Шерали",
+                   "sana": "2025-05-01", "vaqt": "18:00:00", "moves": moves}
+        resp = self.client.post("/finance/courier/stock/move-batch", json.dumps(payload),
+                                content_type="application/json")
+        self.assertEqual(resp.status_code, 201, resp.content)
+        self.assertEqual(
+            [(b["kuryer_id"], b["water_balance"], b["moves"]) for b in resp.json()["balances"]],
+            [(9001, 9, 3), (9002, 4, 1)],
+        )
+        rows = CourierWaterBottleBalance.objects.filter(kuryer_id=9001).order_by("id")
+        self.assertEqual([r.water_balance for r in rows], [5, 15, 9, 9])
+        self.assertEqual(CourierStockBalance.objects.get(business_id=1, kuryer_id=9001).movements, 4)
+
+    def test_batch_move_rejects_whole_batch_on_error(self):
+        moves = [
+            {"kuryer_id": 9001, "kuryer_name": "Жамшид", "operation": "in_from_boss", "income": 10},
+            {"kuryer_id": 9001, "kuryer_name": "Жамшид", "operation": "sell_to_client", "income": 1},
+        ]
+        payload = {"business_id": 1, "menedjer_id": 7001, "menedjer_name": "Шерали",
+                   "sana": "2025-05-01", "vaqt": "18:00:00", "moves": moves}
+        resp = self.client.post("/finance/courier/stock/move-batch", json.dumps(payload),
+                                content_type="application/json")
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual([e["index"] for e in resp.json()["errors"]], [1])
+        self.assertFalse(CourierWaterBottleBalance.objects.exists())
+
+    def test_history_pages_groups_and_csv(self):
+        for vaqt, op, inc, exp in [("09:00", "in_from_boss", 10, 0), ("12:00", "sell_to_client", 0, 2),
+                                   ("15:00", "sell_to_client", 0, 3)]:
+            CourierWaterBottleBalance.objects.create(
+                business_id=1, sana="2025-05-01", vaqt=vaqt, menedjer_id=7001, menedjer_name="Шерали",
+                kuryer_id=9001, kuryer_name="Жамшид", operation=op, income=inc, expense=exp,
+            )
+        # кейин киритилган, лекин ўтган санали ҳаракатлар: оралиқ бошидаги қолдиққа киради
+        for sana, inc, status in [("2025-04-30", 4, "ok"), ("2025-04-29", 50, "draft")]:
+            CourierWaterBottleBalance.objects.create(
+                business_id=1, sana=sana, vaqt="08:00", menedjer_id=7001, menedjer_name="Шерали",
+                kuryer_id=9001, kuryer_name="Жамшид", operation="in_from_boss", income=inc, status=status,
+            )
+        url = "/finance/courier/stock/history"
+        base = {"business_id": 1, "kuryer_id": 9001, "from": "2025-05-01", "to": "2025-05-01"}
+
+        seen, cursor = [], None
+        while True:
+            params = {**base, "limit": 2, **({"cursor": cursor} if cursor else {})}
+            body = self.client.get(url, params).json()
+            seen += [(r["vaqt"], r["water_balance"]) for r in body["items"]]
+            cursor = body["next_cursor"]
+            if not cursor:
+                break
+        self.assertEqual(seen, [("09:00:00", 10), ("12:00:00", 8), ("15:00:00", 5)])
+
+        self.assertEqual(self.client.get(url, {**base, "group": "week"}).json()["items"][0]["period"], "2025-04-28")
+        body = self.client.get(url, {**base, "group": "day"}).json()
+        self.assertEqual(
+            [(r["period"], r["operation"], r["income"], r["expense"], r["moves"]) for r in body["items"]],
+            [("2025-05-01", "in_from_boss", 10, 0, 1), ("2025-05-01", "sell_to_client", 0, 5, 2)],
+        )
+        self.assertEqual(body["opening_balance"], {"water_balance": 4, "bottle_balance": 4})
+
+        # 4 та ҳаракат қайта ўйналди (EVERY=2) — кейинги сўровлар 2025-05-02 нуқтасидан бошлайди
+        later = {**base, "from": "2025-05-02", "to": "2025-05-02", "group": "day"}
+        self.assertEqual(self.client.get(url, later).json()["opening_balance"],
+                         {"water_balance": 9, "bottle_balance": 9})
+        snap = CourierStockSnapshot.objects.get()
+        self.assertEqual((snap.sana, snap.water_balance), (date(2025, 5, 2), 9))
+
+        resp = self.client.get(url, {**base, "format": "csv"})
+        lines = b"".join(resp.streaming_content).decode("utf-8-sig").splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(lines[0].startswith("id,sana,vaqt"))
+
+
+def _old_business_price(rules, counter_value):
+    # аввалги _calc_amount_for_order'даги чизиқли кўриб чиқиш (эталон)
+    try:
+        rules = sorted(rules or [], key=lambda r: int(r.get("start", 0)))
+    except Exception:
+        rules = []
+    unit_price = 0
+    for r in rules:
+        try:
+            start = int(r.get("start", 0))
+            end_raw = r.get("end", None)
+            end = None if end_raw is None else int(end_raw)
+            price = int(r.get("price", 0))
+        except Exception:
+            continue
+        if counter_value >= start and (end is None or counter_value <= end):
+            unit_price = price
+            break
+    if unit_price == 0 and rules:
+        last = rules[-1]
+        if last.get("end") is None:
+            try:
+                unit_price = int(last.get("price", 0))
+            except Exception:
+                unit_price = 0
+    return unit_price
+
+
+class PriceTableTests(SimpleTestCase):
+
+    def _random_rules(self, rnd):
+        rules = []
+        for _ in range(rnd.randint(0, 6)):
+            start = rnd.randint(0, 60)
+            r = {"start": start, "end": rnd.choice([None, start + rnd.randint(-3, 30)]),
+                 "price": rnd.choice([0, 500, 1000, 1500, 2000])}
+            if rnd.random() < 0.1:
+                r["price"] = "x"  # бузуқ қоида
+            rules.append(r)
+        return rules
+
+    def test_business_rules_match_linear_scan(self):
+        rnd = random.Random(7)
+        for _ in range(500):
+            rules = self._random_rules(rnd)
+            table = compile_business_rules(rules)
+            for x in range(0, 100):
+                self.assertEqual(table.unit_price(x), _old_business_price(rules, x), (rules, x))
+
+    def test_amount_equals_per_bottle_sum(self):
+        rnd = random.Random(11)
+        for _ in range(300):
+            rules = self._random_rules(rnd)
+            table = compile_business_rules(rules)
+            for x in range(0, 90, 7):
+                for n in (1, 3, 25):
+                    expected = sum(table.unit_price(c) for c in range(x, x + n))
+                    self.assertEqual(table.amount(x, n), expected, (rules, x, n))
+        table = compile_business_rules([{"start": 0, "end": 9, "price": 1000}, {"start": 10, "end": None, "price": 800}])
+        self.assertEqual(table.amounts(8, [1, 3, 2]), [1000, 1000 + 2 * 800, 2 * 800])
+
+    def test_unit_prices_follow_counter(self):
+        table = compile_business_rules([
+            {"start": 0, "end": 9, "price": 1000},
+            {"start": 10, "end": None, "price": 800},
+        ])
+        # 8 дан бошлаб 1, 1, 5, 2: ҳисоблагич 8, 9, 10, 15
+        self.assertEqual(table.unit_prices(8, [1, 1, 5, 2]), [1000, 1000, 800, 800])
+
+    def test_courier_rules_filter_period(self):
+        rules = [
+            {"period": "month", "min": 0, "max": 99, "price": 3000},
+            {"period": "month", "min": 100, "max": None, "price": 2500},
+            {"period": "year", "min": 0, "max": None, "price": 2000},
+            {"min": 50, "max": 60, "price": 1},  # period йўқ — month; 0..99 устун
+        ]
+        month = compile_courier_rules(rules)
+        self.assertEqual([month.unit_price(x) for x in (0, 55, 99, 100, 10**6)], [3000, 3000, 3000, 2500, 2500])
+        self.assertEqual(compile_courier_rules(rules, "year").unit_price(7), 2000)
+        self.assertEqual(compile_courier_rules([{"min": 5, "max": 6, "price": 9}]).unit_price(4), 0)
+
+    def test_cache_recompiles_when_rules_change(self):
+        calls = []
+
+        def compile_fn(rules):
+            calls.append(rules)
+            return compile_business_rules(rules)
+
+        cache = PriceTableCache(compile_fn)
+        rules = [{"start": 0, "end": None, "price": 1000}]
+        self.assertIs(cache.get(1, rules), cache.get(1, [dict(rules[0])]))
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(cache.get(1, [{"start": 0, "end": None, "price": 900}]).unit_price(3), 900)
+        self.assertEqual(len(calls), 2)
@@ -1,7 +1,11 @@
 from django.urls import path
-from .views import courier_stock_move, courier_stock_balance
+from .views import (courier_stock_move, courier_stock_move_batch, courier_stock_balance,
+                    courier_stock_history, cash_state_approve_bulk)
 
 urlpatterns = [
     path("courier/stock/move", courier_stock_move),
+    path("courier/stock/move-batch", courier_stock_move_batch),
     path("courier/stock/balance", courier_stock_balance),
+    path("courier/stock/history", courier_stock_history),
+    path("cash/state/approve-bulk", cash_state_approve_bulk),
 ]
@@ -1,23 +1,30 @@
 from django.shortcuts import render
+import csv
 import json
-from django.http import JsonResponse
+from datetime import date, datetime
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.timezone import now
 from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncWeek
+from django.utils import timezone
 
-from accounts.models import Business
-from .models import CourierWaterBottleBalance
+from accounts.business_cache import business_cache
+from suv_kerak.cursors import decode_cursor, encode_cursor
+from .models import CourierWaterBottleBalance, CourierStockBalance, CourierStockSnapshot, CashState
 
 
-def _latest_balance(business, kuryer_id):
-    last = (CourierWaterBottleBalance.objects
-            .filter(business=business, kuryer_id=kuryer_id, status="ok")
-            .order_by("-grated").first())
-    return {
-        "water_balance": last.water_balance if last else 0,
-        "bottle_balance": last.bottle_balance if last else 0,
-    }
+def _latest_balance(business_id, kuryer_id):
+    # Курьернинг жорий қолдиғи — бош қатордан (O(1)); ҳаракат бўлмаган бўлса 0
+    head = (CourierStockBalance.objects
+            .filter(business_id=business_id, kuryer_id=kuryer_id)
+            .values("water_balance", "bottle_balance").first())
+    if head is None:
+        return {"water_balance": 0, "bottle_balance": 0}
+    return head
 
 
 @csrf_exempt
@@ -55,13 +62,11 @@ def courier_stock_move(request):
     if missing:
         return JsonResponse({"detail": f"Мажбурий майдон(лар) йўқ: {', '.join(missing)}"}, status=400)
 
-    try:
-        business = Business.objects.get(id=body["business_id"])
-    except Business.DoesNotExist:
+    if not business_cache.exists(body["business_id"]):
         return JsonResponse({"detail": "Business топилмади."}, status=404)
 
     rec = CourierWaterBottleBalance(
-        business=business,
+        business_id=int(body["business_id"]),
         sana=body["sana"],
         vaqt=body["vaqt"],
 
@@ -100,6 +105,142 @@ def courier_stock_move(request):
     }, status=201)
 
 
+STOCK_MOVE_BATCH_MAX = 500
+
+
+def _build_stock_move(business_id, defaults, row):
+    """
+    Пакетдаги битта ҳаракатдан CourierWaterBottleBalance (сақланмаган) ясайди
+    ва Python'да текширади (clean_fields + clean — БДга бормайди).
+    Қайтаради: (rec, None) ёки (None, хато).
+    """
+    if not isinstance(row, dict):
+        return None, "Ҳаракат объект (dict) бўлиши керак."
+    data = {**defaults, **row}
+    # эски номлар (boss_id/boss_name) ҳам қабул қилинади
+    data.setdefault("menedjer_id", data.get("boss_id"))
+    data.setdefault("menedjer_name", data.get("boss_name"))
+
+    required = ["sana", "vaqt", "menedjer_id", "menedjer_name", "kuryer_id", "kuryer_name", "operation"]
+    missing = [k for k in required if not data.get(k)]
+    if missing:
+        return None, f"Мажбурий майдон(лар) йўқ: {', '.join(missing)}"
+
+    try:
+        rec = CourierWaterBottleBalance(
+            business_id=business_id,
+            sana=data["sana"],
+            vaqt=data["vaqt"],
+            menedjer_id=data["menedjer_id"],
+            menedjer_name=data["menedjer_name"],
+            client_tg_id=data.get("client_tg_id"),
+            client_tel_num=data.get("client_tel_num"),
+            buyurtma_num=data.get("buyurtma_num"),
+            kuryer_id=int(data["kuryer_id"]),
+            kuryer_name=data["kuryer_name"],
+            operation=data["operation"],
+            income=int(data.get("income") or 0),
+            expense=int(data.get("expense") or 0),
+            status="ok",
+        )
+        rec.clean_fields(exclude=["business", "water_balance", "bottle_balance"])
+        rec.clean()
+    except (TypeError, ValueError):
+        return None, "kuryer_id/income/expense integer бўлиши керак."
+    except ValidationError as ve:
+        return None, ve.message_dict if hasattr(ve, "message_dict") else ve.messages
+    return rec, None
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def courier_stock_move_batch(request):
+    """
+    Смена якунида бир нечта ҳаракатни битта сўровда ёзиш:
+    {
+      "business_id": 1,
+      "menedjer_id": 7001, "menedjer_name": "Шерали ака",   // ҳамма қаторлар учун умумий (ихтиёрий)
+      "sana": "2025-09-01",                                 // умумий (ихтиёрий)
+      "moves": [
+        {"kuryer_id": 9001, "kuryer_name": "Жамшид ака", "vaqt": "18:00:00",
+         "operation": "in_from_boss", "income": 10},
+        {"kuryer_id": 9001, "kuryer_name": "Жамшид ака", "vaqt": "18:01:00",
+         "operation": "sell_to_client", "expense": 3, "client_tel_num": "99890xxxxxxx"},
+        ...
+      ]
+    }
+    Ҳамма қаторлар аввал текширилади; биттаси нотўғри бўлса — ҳеч нарса ёзилмайди.
+    Ҳар курьер учун бош қатор бир марта қулфланади, баланслар хотирада занжир
+    қилинади, ёзувлар bulk_create билан қўшилади.
+    """
+    try:
+        body = json.loads(request.body or "{}")
+    except json.JSONDecodeError:
+        return JsonResponse({"detail": "JSON нотўғри."}, status=400)
+
+    try:
+        business_id = int(body.get("business_id"))
+    except (TypeError, ValueError):
+        return JsonResponse({"detail": "business_id талаб қилинади (integer)."}, status=400)
+
+    moves = body.get("moves")
+    if not isinstance(moves, list) or not moves:
+        return JsonResponse({"detail": "moves рўйхати талаб қилинади."}, status=400)
+    if len(moves) > STOCK_MOVE_BATCH_MAX:
+        return JsonResponse({"detail": f"Бир пакетда кўпи билан {STOCK_MOVE_BATCH_MAX} та ҳаракат."}, status=400)
+
+    defaults = {k: body[k] for k in ("sana", "vaqt", "menedjer_id", "menedjer_name",
+                                     "boss_id", "boss_name") if body.get(k)}
+    records, errors = [], []
+    for i, row in enumerate(moves):
+        rec, err = _build_stock_move(business_id, defaults, row)
+        if err:
+            errors.append({"index": i, "detail": err})
+        else:
+            records.append(rec)
+    if errors:
+        return JsonResponse({"detail": "Ҳаракатларда хато бор — ҳеч нарса ёзилмади.", "errors": errors}, status=400)
+
+    if not business_cache.exists(business_id):
+        return JsonResponse({"detail": "Business топилмади."}, status=404)
+
+    # курьер бўйича гуруҳлаймиз (пакет ичидаги тартиб сақланади)
+    by_kuryer = {}
+    for rec in records:
+        by_kuryer.setdefault(rec.kuryer_id, []).append(rec)
+
+    balances = []
+    with transaction.atomic():
+        # қулфлар доим kuryer_id тартибида — параллел пакетлар deadlock бўлмайди
+        heads = {k: CourierStockBalance.lock_for(business_id, k) for k in sorted(by_kuryer)}
+        for kuryer_id, recs in by_kuryer.items():
+            head = heads[kuryer_id]
+            water, bottle = head.water_balance, head.bottle_balance
+            for rec in recs:
+                water, bottle = CourierWaterBottleBalance.apply_delta(
+                    water, bottle, rec.operation, rec.income, rec.expense
+                )
+                rec.water_balance, rec.bottle_balance = water, bottle
+
+        created = CourierWaterBottleBalance.objects.bulk_create(records)
+
+        for kuryer_id in sorted(by_kuryer):
+            head = heads[kuryer_id]
+            head.advance_many(by_kuryer[kuryer_id])
+            balances.append({
+                "kuryer_id": kuryer_id,
+                "water_balance": head.water_balance,
+                "bottle_balance": head.bottle_balance,
+                "moves": len(by_kuryer[kuryer_id]),
+            })
+
+    return JsonResponse({
+        "detail": f"{len(created)} та ҳаракат сақланди.",
+        "ids": [rec.id for rec in created],
+        "balances": balances,
+    }, status=201)
+
+
 @require_http_methods(["GET"])
 def courier_stock_balance(request):
     """
@@ -110,10 +251,217 @@ def courier_stock_balance(request):
     if not business_id or not kuryer_id:
         return JsonResponse({"detail": "business_id ва kuryer_id талаб қилинади."}, status=400)
     try:
-        business = Business.objects.get(id=business_id)
-    except Business.DoesNotExist:
+        business_id, kuryer_id = int(business_id), int(kuryer_id)
+    except ValueError:
+        return JsonResponse({"detail": "business_id ва kuryer_id integer бўлиши керак."}, status=400)
+    if not business_cache.exists(business_id):
         return JsonResponse({"detail": "Business топилмади."}, status=404)
 
-    bal = _latest_balance(business, kuryer_id)
+    bal = _latest_balance(business_id, kuryer_id)
     return JsonResponse({"balances": bal})
 
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def cash_state_approve_bulk(request):
+    """
+    Менежернинг pending касса ҳолатларини битта транзакцияда тасдиқлаш:
+    {
+      "business_id": 1,
+      "menedjer_id": 7001,
+      "ids": [11, 12, 15]   // ихтиёрий; берилмаса — шу менежернинг барча pending ҳолатлари
+    }
+    """
+    try:
+        body = json.loads(request.body or "{}")
+    except json.JSONDecodeError:
+        return JsonResponse({"detail": "JSON нотўғри."}, status=400)
+
+    try:
+        business_id = int(body.get("business_id"))
+        menedjer_id = int(body.get("menedjer_id"))
+    except (TypeError, ValueError):
+        return JsonResponse({"detail": "business_id ва menedjer_id талаб қилинади (integer)."}, status=400)
+
+    ids = body.get("ids")
+    if ids is not None:
+        if not isinstance(ids, list):
+            return JsonResponse({"detail": "ids рўйхат бўлиши керак."}, status=400)
+        try:
+            ids = [int(i) for i in ids]
+        except (TypeError, ValueError):
+            return JsonResponse({"detail": "ids фақат integer'лардан иборат бўлсин."}, status=400)
+
+    if not business_cache.exists(business_id):
+        return JsonResponse({"detail": "Business топилмади."}, status=404)
+
+    approved = CashState.approve_many(business_id, menedjer_id, now(), ids=ids)
+    approved_ids = {st.id for st in approved}
+
+    resp = {
+        "detail": f"{len(approved)} та ҳолат тасдиқланди.",
+        "approved": [
+            {"id": st.id, "cash_menedjer_id": st.cash_boss_id, "balance": str(st.balance)}
+            for st in approved
+        ],
+        "balance": str(approved[-1].balance) if approved else None,
+    }
+    if ids is not None:
+        # топилмаган, бошқа менежерники ёки pending бўлмаганлар
+        resp["skipped"] = [i for i in ids if i not in approved_ids]
+    return JsonResponse(resp, status=200)
+
+
+# ------------------------------
+# Курьер сув/тара тарихи: сана оралиғи, кун/ҳафта бўйича жамлаш, cursor, CSV
+# ------------------------------
+STOCK_HISTORY_PAGE = 100
+STOCK_HISTORY_PAGE_MAX = 1000
+
+STOCK_HISTORY_COLUMNS = (
+    "id", "sana", "vaqt", "kuryer_id", "kuryer_name", "menedjer_name", "operation",
+    "income", "expense", "water_balance", "bottle_balance", "status",
+    "client_tel_num", "buyurtma_num",
+)
+
+
+class _Echo:
+    """csv.writer учун "файл": ёзилган қаторни қайтаради (StreamingHttpResponse'га)."""
+    def write(self, value):
+        return value
+
+
+def _stream_csv(filename, header, rows):
+    writer = csv.writer(_Echo())
+
+    def gen():
+        yield "\ufeff"  # Excel кирилл ҳарфларни тўғри очиши учун BOM
+        yield writer.writerow(header)
+        for r in rows:
+            yield writer.writerow(r)
+
+    resp = StreamingHttpResponse(gen(), content_type="text/csv; charset=utf-8")
+    resp["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return resp
+
+
+@require_http_methods(["GET"])
+def courier_stock_history(request):
+    """
+    Параметрлар (query):
+      business_id  — мажбурий
+      kuryer_id    — ихтиёрий (берилмаса — бизнеснинг барча курьерлари)
+      from, to     — сана оралиғи (YYYY-MM-DD, икки чеки ҳам киради)
+      status       — ok (асл) | draft | void | all
+      group        — day | week: операция бўйича income/expense жамлари (сервер томонида)
+      limit, cursor — саҳифалаш (keyset: sana, vaqt, id — ўсиш тартибида)
+      format=csv   — бутун оралиқни CSV қилиб оқимда беради (limit/cursor эътиборсиз)
+    """
+    p = request.GET
+    try:
+        business_id = int(p.get("business_id"))
+        kuryer_id = int(p["kuryer_id"]) if p.get("kuryer_id") else None
+    except (TypeError, ValueError):
+        return JsonResponse({"detail": "business_id (ва kuryer_id) integer бўлиши керак."}, status=400)
+
+    try:
+        d_from = date.fromisoformat(p["from"]) if p.get("from") else None
+        d_to = date.fromisoformat(p["to"]) if p.get("to") else None
+    except ValueError:
+        return JsonResponse({"detail": "from/to YYYY-MM-DD форматда бўлсин."}, status=400)
+    if d_from and d_to and d_from > d_to:
+        return JsonResponse({"detail": "from to'дан катта бўлмасин."}, status=400)
+
+    group = (p.get("group") or "").lower() or None
+    if group not in (None, "day", "week"):
+        return JsonResponse({"detail": "group: day ёки week."}, status=400)
+    as_csv = (p.get("format") or "").lower() == "csv"
+
+    status = (p.get("status") or "ok").lower()
+    if status not in {"ok", "draft", "void", "all"}:
+        return JsonResponse({"detail": "status: ok | draft | void | all."}, status=400)
+
+    if not business_cache.exists(business_id):
+        return JsonResponse({"detail": "Business топилмади."}, status=404)
+
+    qs = CourierWaterBottleBalance.objects.filter(business_id=business_id)
+    if kuryer_id is not None:
+        qs = qs.filter(kuryer_id=kuryer_id)
+    if status != "all":
+        qs = qs.filter(status=status)
+    if d_from:
+        qs = qs.filter(sana__gte=d_from)
+    if d_to:
+        qs = qs.filter(sana__lte=d_to)
+
+    # 1) Жамлаш: (давр, курьер, операция) бўйича — БДда GROUP BY
+    if group:
+        bucket = TruncWeek("sana") if group == "week" else F("sana")
+        agg = list(
+            qs.annotate(period=bucket)
+            .values("period", "kuryer_id", "operation")
+            .annotate(income=Sum("income"), expense=Sum("expense"), moves=Count("id"))
+            .order_by("period", "kuryer_id", "operation")
+        )
+        for r in agg:
+            period = r["period"]
+            r["period"] = (period.date() if isinstance(period, datetime) else period).isoformat()
+
+        if as_csv:
+            return _stream_csv(
+                f"stock_{business_id}_{group}.csv",
+                ["period", "kuryer_id", "operation", "income", "expense", "moves"],
+                ([r["period"], r["kuryer_id"], r["operation"], r["income"], r["expense"], r["moves"]]
+                 for r in agg),
+            )
+
+        resp = {"business_id": business_id, "kuryer_id": kuryer_id, "group": group, "items": agg}
+        if kuryer_id is not None and d_from:
+            # оралиқ бошидаги қолдиқ — рўйхат билан бир ўқда (sana < from, "ok"):
+            # энг яқин назорат нуқтасидан, бутун журналдан эмас
+            water, bottle = CourierStockSnapshot.balance_before(business_id, kuryer_id, d_from)
+            resp["opening_balance"] = {"water_balance": water, "bottle_balance": bottle}
+        return JsonResponse(resp)
+
+    qs = qs.order_by("sana", "vaqt", "id").values(*STOCK_HISTORY_COLUMNS)
+
+    # 2) CSV: бутун оралиқ, iterator() — хотирага бутун queryset юкланмайди
+    if as_csv:
+        return _stream_csv(
+            f"stock_{business_id}.csv",
+            list(STOCK_HISTORY_COLUMNS),
+            ([r[c] for c in STOCK_HISTORY_COLUMNS] for r in qs.iterator(chunk_size=2000)),
+        )
+
+    # 3) JSON саҳифа (keyset)
+    try:
+        limit = int(p.get("limit") or STOCK_HISTORY_PAGE)
+    except ValueError:
+        return JsonResponse({"detail": "limit integer бўлиши керак."}, status=400)
+    limit = max(1, min(limit, STOCK_HISTORY_PAGE_MAX))
+
+    if p.get("cursor"):
+        try:
+            c_sana, c_vaqt, c_id = decode_cursor(p["cursor"])
+        except ValueError:
+            return JsonResponse({"detail": "cursor нотўғри."}, status=400)
+        qs = qs.filter(
+            Q(sana__gt=c_sana)
+            | Q(sana=c_sana, vaqt__gt=c_vaqt)
+            | Q(sana=c_sana, vaqt=c_vaqt, id__gt=c_id)
+        )
+
+    rows = list(qs[:limit + 1])
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    rows = rows[:limit]
+    for r in rows:
+        r["sana"] = r["sana"].isoformat()
+        r["vaqt"] = r["vaqt"].strftime("%H:%M:%S")
+
+    return JsonResponse({
+        "business_id": business_id,
+        "kuryer_id": kuryer_id,
+        "count": len(rows),
+        "items": rows,
+        "next_cursor": next_cursor,
+    })
@@ -4,4 +4,16 @@ from django.apps import AppConfig
 class OrdersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'orders'
-    verbose_name = "Буюртмалар"
\ No newline at end of file
+    verbose_name = "Буюртмалар"
+
+    def ready(self):
+        # буюртма ёки тизим ҳисоби ўзгарса — main_menu_stats кэшини ташлаймиз
+        # (bulk_create/bulk_update/update() сигнал юбормайди — улар orders/stats.py'ни ўзи чақиради)
+        from django.db.models.signals import post_save, post_delete
+        from .signals import invalidate_stats_on_change
+
+        for sender in ("orders.Buyurtma", "finance.BusinessSystemAccount"):
+            post_save.connect(invalidate_stats_on_change, sender=sender,
+                              dispatch_uid=f"main_menu_stats_save:{sender}")
+            post_delete.connect(invalidate_stats_on_change, sender=sender,
+                                dispatch_uid=f"main_menu_stats_delete:{sender}")
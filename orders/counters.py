@@ -0,0 +1,126 @@
+# orders/counters.py
+"""
+order_num учун йил/ой/кун кесимидаги жами сув ҳисоблагичлари.
+
+Аввал ҳар буюртмада глобал advisory lock олиниб, buyurtmalar бўйича
+COUNT(*) + учта SUM(suv_soni) ҳисобланарди. Энди жорий йил/ой/кун
+жамилари buyurtma_order_counter жадвалида сақланади ва битта
+INSERT ... ON CONFLICT DO UPDATE ... RETURNING билан оширилади —
+тарих қанча катта бўлмасин, ҳар буюртмага O(1).
+
+Рақамлаш глобал (order_num бутун жадвал бўйича unique), шунинг учун
+ҳисоблагични бизнес бўйича бўлиб бўлмайди — йил қатори барча бизнесларга
+битта. Унинг қулфи буюртма транзакциясигача чўзилмаслиги учун рақам
+reserve_order_counters() орқали алоҳида қисқа транзакцияда ажратилади.
+
+Базавий (эски) ҳисобдан фарқлар:
+  - бўш базада биринчи буюртма "01-01-01" эмас, ўз suv_soni'си билан
+    рақамланади (suv_soni=2 -> "02-02-02") — жамига жорий буюртма ҳам киради;
+  - ажратилган рақам қайтарилмайди: буюртма INSERT'и бекор бўлса, рақамда
+    бўшлиқ қолади ва жамилар buyurtmalar'дан ортиқ бўлади. backfill_order_counters
+    жамиларни buyurtmalar бўйича қайта тиклайди.
+"""
+from datetime import date
+
+from django.db import connection, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncMonth, TruncYear
+from django.utils import timezone
+
+PERIODS = ("year", "month", "day")
+
+
+def period_starts(day: date) -> dict[str, date]:
+    """Берилган кун учун йил, ой ва кун бошлари."""
+    return {
+        "year": day.replace(month=1, day=1),
+        "month": day.replace(day=1),
+        "day": day,
+    }
+
+
+def bump_order_counters(day: date, suv_soni: int) -> tuple[int, int, int]:
+    """
+    Йил/ой/кун ҳисоблагичларини suv_soni га оширади ва янги жамиларни қайтаради.
+    Қатор бўлмаса — яратилади (upsert). Чақирувчи транзакциясига қўшилади:
+    қаторлар қулфи шу транзакция охиригача сақланади.
+
+    Қайтаради: (y_total, m_total, d_total)
+    """
+    from .models import OrderNumCounter
+
+    suv_soni = int(suv_soni or 0)
+    starts = period_starts(day)
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    table = connection.ops.quote_name(OrderNumCounter._meta.db_table)
+
+    params = []
+    for p in PERIODS:
+        params += [p, connection.ops.adapt_datefield_value(starts[p]), suv_soni, now]
+
+    # Қаторлар доим year → month → day тартибида қулфланади (deadlock бўлмайди)
+    sql = f"""
+        INSERT INTO {table} (period, period_start, total, updated_at)
+        VALUES (%s, %s, %s, %s), (%s, %s, %s, %s), (%s, %s, %s, %s)
+        ON CONFLICT (period, period_start)
+        DO UPDATE SET total = {table}.total + EXCLUDED.total,
+                      updated_at = EXCLUDED.updated_at
+        RETURNING period, total
+    """
+    with connection.cursor() as cur:
+        cur.execute(sql, params)
+        totals = {p: int(t) for p, t in cur.fetchall()}
+    return totals["year"], totals["month"], totals["day"]
+
+
+def reserve_order_counters(day: date, suv_soni: int) -> tuple[int, int, int]:
+    """
+    bump_order_counters() — ўзининг қисқа транзакциясида, дарҳол commit қилинади.
+    Йил қатори фақат шу битта upsert давомида қулфланади, бошқа бизнесларнинг
+    буюртмалари бу буюртманинг транзакциясини кутмайди.
+
+    Очиқ транзакция ичида чақириб бўлмайди (durable — RuntimeError).
+    """
+    with transaction.atomic(durable=True):
+        return bump_order_counters(day, suv_soni)
+
+
+def rebuild_order_counters(buyurtma_model, counter_model) -> int:
+    """
+    Ҳисоблагичларни buyurtmalar'даги мавжуд қатордан қайта тўлдиради (idempotent).
+    buyurtmalar'да мос буюртмаси қолмаган даврлар (ўчирилган буюртмалар, бекор
+    бўлган буюртмалардан қолган рақам бўшлиқлари) ўчирилади.
+    Моделлар параметр орқали берилади — миграция тарихий моделлари билан ҳам ишлайди.
+    Қайтаради: (ёзилган (upsert) қаторлар сони, ўчирилган қаторлар сони).
+    """
+    buckets = (
+        ("year", TruncYear("sana")),
+        ("month", TruncMonth("sana")),
+        ("day", F("sana")),
+    )
+    rows, produced = [], {}
+    for period, bucket in buckets:
+        qs = (buyurtma_model.objects
+              .annotate(p=bucket)
+              .values("p")
+              .annotate(total=Sum("suv_soni"))
+              .order_by())
+        rows += [
+            counter_model(period=period, period_start=r["p"], total=int(r["total"] or 0))
+            for r in qs
+        ]
+        produced[period] = [r.period_start for r in rows if r.period == period]
+
+    counter_model.objects.bulk_create(
+        rows,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=["period", "period_start"],
+        update_fields=["total", "updated_at"],
+    )
+
+    stale = counter_model.objects.all()
+    for period, starts in produced.items():
+        stale = stale.exclude(period=period, period_start__in=starts)
+    deleted, _ = stale.delete()
+    return len(rows), deleted
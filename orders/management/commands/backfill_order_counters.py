@@ -0,0 +1,21 @@
+# orders/management/commands/backfill_order_counters.py
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from orders.counters import rebuild_order_counters
+from orders.models import Buyurtma, OrderNumCounter
+
+
+class Command(BaseCommand):
+    help = (
+        "buyurtma_order_counter (йил/ой/кун жами сув) ҳисоблагичларини "
+        "buyurtmalar жадвалидан қайта ҳисоблаб ёзади; буюртмаси йўқ даврлар "
+        "ўчирилади. Қайта ишга тушириш хавфсиз."
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            written, deleted = rebuild_order_counters(Buyurtma, OrderNumCounter)
+        self.stdout.write(self.style.SUCCESS(
+            f"Ҳисоблагичлар янгиланди: {written} та қатор, ўчирилди: {deleted} та."
+        ))
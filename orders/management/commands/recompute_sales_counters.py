@@ -0,0 +1,48 @@
+# orders/management/commands/recompute_sales_counters.py
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from orders.sales_counters import recompute_sales_counters
+
+
+class Command(BaseCommand):
+    help = (
+        "accounts_business ва kuryer ой/йил бошидан сотилган сув ҳисоблагичларини "
+        "buyurtmalar'дан қайта ҳисоблайди (бизнес — барча буюртмалари, курер — "
+        "delivered буюртмалари). Ҳар давр битта GROUP BY, тузатишлар — "
+        "UPDATE ... FROM (VALUES ...). --dry-run фақат фарқларни кўрсатади."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--date", help="Шу кун бўйича (YYYY-MM-DD), бермаса — бугун (TIME_ZONE)")
+        parser.add_argument("--dry-run", action="store_true", help="Ёзмасдан фақат фарқларни чиқариш")
+        parser.add_argument("--show", type=int, default=50, help="Ҳар жадвал учун кўрсатиладиган фарқлар сони")
+
+    def handle(self, *args, **options):
+        day = timezone.localdate()
+        if options["date"]:
+            try:
+                day = parse_date(options["date"])
+            except ValueError:
+                day = None
+            if day is None:
+                raise CommandError("--date формати: YYYY-MM-DD")
+
+        result = recompute_sales_counters(day, dry_run=options["dry_run"])
+        for name, res in result.items():
+            for pk, (oy, yil), (new_oy, new_yil) in res["diff"][:options["show"]]:
+                self.stdout.write(f"{name} id={pk}: oy {oy} -> {new_oy}, yil {yil} -> {new_yil}")
+            if len(res["diff"]) > options["show"]:
+                self.stdout.write(f"  ... яна {len(res['diff']) - options['show']} та")
+
+            msg = f"{name}: {res['checked']} та текширилди, фарқли {len(res['diff'])} та"
+            if options["dry_run"]:
+                self.stdout.write(self.style.WARNING(msg + " (--dry-run, ёзилмади)."))
+                continue
+            msg += f", тузатилди {res['updated']} та"
+            if res["skipped"]:
+                # ўқилгандан кейин янги буюртма тушган қаторлар — қайта ишга туширинг
+                self.stdout.write(self.style.WARNING(msg + f", ўзгаргани учун ўтказилди {res['skipped']} та."))
+            else:
+                self.stdout.write(self.style.SUCCESS(msg + "."))
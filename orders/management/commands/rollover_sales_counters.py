@@ -0,0 +1,32 @@
+# orders/management/commands/rollover_sales_counters.py
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from orders.sales_counters import rollover_all
+
+
+class Command(BaseCommand):
+    help = (
+        "accounts_business ой/йил бошидан сотилган сув ҳисоблагичларини жорий "
+        "ойга/йилга ўтказади (эскирганлари нолланади). Ҳар давр битта UPDATE; "
+        "қайта ишга тушириш хавфсиз — масалан, ҳар куни 00:05 да cron'дан."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--date", help="Шу кун бўйича (YYYY-MM-DD), бермаса — бугун (TIME_ZONE)")
+
+    def handle(self, *args, **options):
+        day = timezone.localdate()
+        if options["date"]:
+            try:
+                day = parse_date(options["date"])
+            except ValueError:
+                day = None
+            if day is None:
+                raise CommandError("--date формати: YYYY-MM-DD")
+
+        counts = rollover_all(day)
+        self.stdout.write(self.style.SUCCESS(
+            f"{day}: ой ҳисоблагичлари {counts['month']} та, йил ҳисоблагичлари {counts['year']} та бизнесда янгиланди."
+        ))
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:09
+
+from django.db import migrations, models
+
+from orders.counters import rebuild_order_counters
+
+
+def backfill_counters(apps, schema_editor):
+    # Мавжуд буюртмалардан йил/ой/кун жамиларини бир марта тўлдирамиз
+    rebuild_order_counters(apps.get_model("orders", "Buyurtma"), apps.get_model("orders", "OrderNumCounter"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0011_alter_buyurtma_buyurtma_statusi'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderNumCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('year', 'year'), ('month', 'month'), ('day', 'day')], max_length=5)),
+                ('period_start', models.DateField()),
+                ('total', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Буюртма рақами ҳисоблагичи',
+                'verbose_name_plural': 'Буюртма рақами ҳисоблагичлари',
+                'db_table': 'buyurtma_order_counter',
+                'constraints': [models.UniqueConstraint(fields=('period', 'period_start'), name='uq_order_counter_period')],
+            },
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.4 on 2026-10-18 14:02
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0012_order_num_counter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='buyurtma',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='buyurtma',
+            index=models.Index(fields=['business', 'updated_at'], name='idx_buyurtma_biz_updated'),
+        ),
+    ]
@@ -3,6 +3,18 @@ from django.db import models
 from accounts.models import Business
 from couriers.models import Kuryer
 from django.core.validators import MinValueValidator, MaxValueValidator
+from .stats import invalidate_main_menu_stats
+
+
+class BuyurtmaQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        # .update() post_save юбормайди — main_menu_stats кэши шу ерда ташланади
+        business_ids = set(self.order_by().values_list("business_id", flat=True).distinct())
+        rows = super().update(**kwargs)
+        if rows:
+            invalidate_main_menu_stats(*business_ids)
+        return rows
+
 
 class Buyurtma(models.Model):
     business = models.ForeignKey(Business, on_delete=models.PROTECT)
@@ -50,6 +62,8 @@ class Buyurtma(models.Model):
     order_num = models.CharField(max_length=32, unique=True, db_index=True, blank=True, null=True)
 
     grated = models.DateTimeField(auto_now_add=True)
+    # охирги ўзгариш вақти — иловалар `since` билан фақат ўзгарганларни сўрайди
+    updated_at = models.DateTimeField(auto_now=True)
 
     lat = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True,
                               validators=[MinValueValidator(-90), MaxValueValidator(90)])
@@ -60,6 +74,9 @@ class Buyurtma(models.Model):
     LOCATION_SOURCES = (("tg", "telegram"), ("geocode", "geocode"), ("manual", "manual"))
     location_source = models.CharField(max_length=16, choices=LOCATION_SOURCES, default="manual")
     amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)  # 💧 Сув суммаси
+
+    objects = BuyurtmaQuerySet.as_manager()
+
     class Meta:
         db_table = "buyurtmalar"
         verbose_name = "Буюртма"
@@ -68,8 +85,32 @@ class Buyurtma(models.Model):
             models.Index(fields=["business", "sana"], name="idx_buyurtma_biz_sana"),
             models.Index(fields=["business", "buyurtma_statusi"], name="idx_buyurtma_biz_status"),
             models.Index(fields=["business", "client_tel_num"], name="idx_buyurtma_biz_client_tel"),
+            models.Index(fields=["business", "updated_at"], name="idx_buyurtma_biz_updated"),
         ]
 
     def save(self, *args, **kwargs):
         self.manzil_izoh = (self.manzil_izoh or "").strip() or None
         super().save(*args, **kwargs)
+
+
+class OrderNumCounter(models.Model):
+    """
+    order_num учун йил/ой/кун кесимидаги ЖАМИ СУВ (бутилка) ҳисоблагичи.
+    Ҳар буюртмада бир қатор янгиланади — buyurtmalar жадвалини қайта санамаймиз.
+    """
+    PERIODS = (("year", "year"), ("month", "month"), ("day", "day"))
+    period = models.CharField(max_length=5, choices=PERIODS)
+    period_start = models.DateField()          # йил/ой/кун боши
+    total = models.BigIntegerField(default=0)  # шу даврда сотилган жами сув
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "buyurtma_order_counter"
+        verbose_name = "Буюртма рақами ҳисоблагичи"
+        verbose_name_plural = "Буюртма рақами ҳисоблагичлари"
+        constraints = [
+            models.UniqueConstraint(fields=["period", "period_start"], name="uq_order_counter_period"),
+        ]
+
+    def __str__(self):
+        return f"{self.period} {self.period_start}: {self.total}"
@@ -0,0 +1,168 @@
+# orders/sales_counters.py
+"""
+accounts_business.oy_bosh_sotil_suv_soni / yil_bosh_sotil_suv_soni — ой ва йил
+бошидан сотилган сув сони (нарх диапазони шулардан танланади).
+
+Ҳисоблагичлар фақат _inc_month_year_counters() билан ошарди, ой/йил
+алмашганда ҳеч ким ноллашмасди. Энди ҳар ҳисоблагич ёнида у қайси давр учун
+эканлиги сақланади (hisob_oy_boshi / hisob_yil_boshi):
+  - rollover_all(): rollover_sales_counters буйруғи — барча бизнеслар учун
+    ҳар давр битта UPDATE (қайта ишга тушириш хавфсиз);
+  - roll_counters_if_due(): буюртма қулфлаган қатор учун "дангаса" текширув —
+    буйруқ ишламай қолган бўлса ҳам биринчи буюртмада ҳисоблагич нолланади,
+    қўшимча сўровсиз (ёзув ҳисоблагичлар UPDATE'ига қўшилади).
+
+Давр белгиси NULL (устун энди қўшилган) бўлса, мавжуд қиймат жорий давр учун
+қабул қилинади ва фақат белги қўйилади — аниқ қиймат recompute_sales_counters()
+(recompute_sales_counters буйруғи) билан buyurtmalar'дан тикланади.
+"""
+from datetime import date
+
+from django.db import connection, transaction
+from django.db.models import Case, F, Q, Sum, Value, When
+
+from accounts.models import Business
+from .counters import period_starts
+
+# давр -> (ҳисоблагич устуни, давр белгиси устуни)
+SALES_COUNTERS = {
+    "month": ("oy_bosh_sotil_suv_soni", "hisob_oy_boshi"),
+    "year": ("yil_bosh_sotil_suv_soni", "hisob_yil_boshi"),
+}
+
+
+def roll_counters_if_due(biz: Business, day: date) -> dict:
+    """
+    biz (қулфланган қатор) ҳисоблагичлари day'нинг ой/йилига тегишли бўлмаса,
+    хотирада нолланади ва белги янгиланади. Қайтаради: БДга ёзиладиган
+    майдонлар ({} — ҳаммаси жорий); уларни _inc_month_year_counters(rollover=...)
+    ёзади.
+    """
+    starts = period_starts(day)
+    fields = {}
+    for period, (counter, stamp) in SALES_COUNTERS.items():
+        current = getattr(biz, stamp)
+        if current is not None and current >= starts[period]:
+            continue
+        if current is not None:
+            setattr(biz, counter, 0)
+            fields[counter] = 0
+        setattr(biz, stamp, starts[period])
+        fields[stamp] = starts[period]
+    return fields
+
+
+def rollover_all(day: date) -> dict[str, int]:
+    """
+    Барча бизнеслар ҳисоблагичларини day'нинг ой/йилига ўтказади: эскирганлари
+    нолланади, белгисизларига белги қўйилади. Ҳар давр — битта UPDATE.
+    Қайтаради: {давр: янгиланган қаторлар сони}.
+    """
+    starts = period_starts(day)
+    out = {}
+    for period, (counter, stamp) in SALES_COUNTERS.items():
+        start = starts[period]
+        out[period] = (
+            Business.objects
+            .filter(Q(**{f"{stamp}__isnull": True}) | Q(**{f"{stamp}__lt": start}))
+            .update(**{
+                counter: Case(When(**{f"{stamp}__isnull": True}, then=F(counter)), default=Value(0)),
+                stamp: start,
+            })
+        )
+    return out
+
+
+# --- buyurtmalar'дан қайта ҳисоблаш (recompute_sales_counters буйруғи) ---
+
+def _period_totals(qs, key: str, starts: dict, day: date) -> dict[str, dict]:
+    """Ҳар давр учун битта GROUP BY: {давр: {key: жами suv_soni}}."""
+    out = {}
+    for period in SALES_COUNTERS:
+        rows = (qs.filter(sana__gte=starts[period], sana__lte=day)
+                .values_list(key).annotate(total=Sum("suv_soni")).order_by())
+        out[period] = {k: int(t or 0) for k, t in rows}
+    return out
+
+
+def _bulk_update(model, rows: list[tuple], extra: dict, chunk_size: int) -> int:
+    """
+    rows: [(pk, oy, yil, old_oy, old_yil), ...] — битта UPDATE ... FROM (VALUES ...)
+    (ҳар chunk_size қаторга). Қатор ўқилгандан кейин ўзгарган бўлса (янги буюртма),
+    у ўтказиб юборилади — old_* қийматлар WHERE'да солиштирилади.
+    Қайтаради: янгиланган қаторлар сони.
+    """
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    oy, yil = (qn(c) for c, _s in SALES_COUNTERS.values())
+    set_extra = "".join(f", {qn(col)} = %s" for col in extra)
+    extra_params = [connection.ops.adapt_datefield_value(v) for v in extra.values()]
+
+    updated = 0
+    with connection.cursor() as cur:
+        for i in range(0, len(rows), chunk_size):
+            chunk = rows[i:i + chunk_size]
+            values = ", ".join(["(%s, %s, %s, %s, %s)"] * len(chunk))
+            # VALUES устунлари Postgres'да ҳам, SQLite'да ҳам column1..column5
+            sql = (
+                f"UPDATE {table} SET {oy} = v.column2, {yil} = v.column3{set_extra} "
+                f"FROM (VALUES {values}) AS v "
+                f"WHERE {table}.{qn('id')} = v.column1 "
+                f"AND COALESCE({table}.{oy}, -1) = v.column4 AND COALESCE({table}.{yil}, -1) = v.column5"
+            )
+            cur.execute(sql, extra_params + [x for row in chunk for x in row])
+            updated += cur.rowcount
+    return updated
+
+
+def recompute_sales_counters(day: date, dry_run: bool = False, chunk_size: int = 5000) -> dict:
+    """
+    Business (барча буюртмалари) ва Kuryer (delivered буюртмалари) ой/йил
+    ҳисоблагичларини buyurtmalar'дан қайта ҳисоблайди. Жорий қийматлар
+    агрегатлардан ОЛДИН ўқилади: орада тушган буюртма ҳисоблагични ўзгартиради
+    ва бу қатор UPDATE'да ўтказиб юборилади (кейинги ишга туширишда тузатилади).
+
+    Қайтаради: {"business"|"kuryer": {"checked", "diff": [(pk, (oy, yil), (янги_oy, янги_yil))],
+    "updated", "skipped"}}.
+    """
+    from couriers.models import Kuryer
+    from .models import Buyurtma
+
+    starts = period_starts(day)
+    oy, yil = (c for c, _s in SALES_COUNTERS.values())
+    oy_stamp, yil_stamp = (s for _c, s in SALES_COUNTERS.values())
+    current_stamps = (starts["month"], starts["year"])
+
+    business_rows = list(Business.objects.values_list("id", oy, yil, oy_stamp, yil_stamp))
+    kuryer_rows = list(Kuryer.objects.values_list("id", oy, yil))
+    business_totals = _period_totals(Buyurtma.objects.all(), "business_id", starts, day)
+    kuryer_totals = _period_totals(
+        Buyurtma.objects.filter(buyurtma_statusi="delivered", kuryer__isnull=False), "kuryer_id", starts, day,
+    )
+
+    result = {}
+    for name, model, rows, totals in (
+        ("business", Business, business_rows, business_totals),
+        ("kuryer", Kuryer, kuryer_rows, kuryer_totals),
+    ):
+        diff, updates = [], []
+        for pk, cur_oy, cur_yil, *stamps in rows:
+            new = (totals["month"].get(pk, 0), totals["year"].get(pk, 0))
+            old = (cur_oy, cur_yil)
+            if old == new and (not stamps or tuple(stamps) == current_stamps):
+                continue
+            diff.append((pk, old, new))
+            updates.append((pk, *new, *(-1 if v is None else v for v in old)))
+
+        updated = 0
+        if updates and not dry_run:
+            extra = {oy_stamp: starts["month"], yil_stamp: starts["year"]} if model is Business else {}
+            with transaction.atomic():
+                updated = _bulk_update(model, updates, extra, chunk_size)
+        result[name] = {
+            "checked": len(rows),
+            "diff": diff,
+            "updated": updated,
+            "skipped": 0 if dry_run else len(updates) - updated,
+        }
+    return result
@@ -0,0 +1,7 @@
+# orders/signals.py
+from .stats import invalidate_main_menu_stats
+
+
+def invalidate_stats_on_change(sender, instance, **kwargs):
+    # Buyurtma ва BusinessSystemAccount иккаласида ҳам business_id бор; ўчириш commit'дан кейин
+    invalidate_main_menu_stats(instance.business_id)
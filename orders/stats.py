@@ -0,0 +1,66 @@
+# orders/stats.py
+"""
+Боссни асосий менюси статистикаси (main_menu_stats).
+
+Илова бу эндпоинтни тез-тез сўрайди, шунинг учун:
+  - баланс (business_system_balance бош қаторидан) ва бугунги икки COUNT
+    битта SQL'да олинади;
+  - натижа кэшда (business_id + сана) MAIN_MENU_STATS_TTL сония сақланади;
+  - буюртма ёки тизим ҳисоби ўзгарганда кэш ўчирилади: save/delete'да
+    (signals), bulk_create/bulk_update йўлларида ва Buyurtma QuerySet.update()'да
+    — ҳар доим транзакция commit бўлгандан КЕЙИН (ундан олдин ўчирилса,
+    параллел сўров эски қийматни кэшга қайта ёзиб қўйиши мумкин).
+Кэш процесс ичида (LocMemCache) бўлса, бошқа worker'лар TTL ўтгач янгиланади.
+"""
+from datetime import date
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+
+def stats_cache_key(business_id: int, day: date) -> str:
+    return f"main_menu_stats:{int(business_id)}:{day.isoformat()}"
+
+
+def load_main_menu_stats(business_id: int, day: date) -> dict:
+    """Баланс + бугунги бажарилган/бажарилмаган буюртмалар — битта сўров."""
+    with connection.cursor() as cur:
+        cur.execute("""
+            SELECT
+                COALESCE(
+                    (SELECT balance FROM business_system_balance WHERE business_id = %s),
+                    (SELECT tizimdagi_balance
+                       FROM business_system_account
+                      WHERE business_id = %s
+                      ORDER BY id DESC
+                      LIMIT 1)
+                ),
+                COALESCE(SUM(CASE WHEN buyurtma_statusi = 'delivered' THEN 1 ELSE 0 END), 0),
+                COALESCE(SUM(CASE WHEN buyurtma_statusi IN ('on_way','accepted') THEN 1 ELSE 0 END), 0)
+            FROM buyurtmalar
+            WHERE sana = %s
+              AND business_id = %s
+        """, [business_id, business_id, day, business_id])
+        balans, bajarilgan, bajarilmagan = cur.fetchone()
+    return {
+        "tizim_hisobi_balans": float(balans) if balans is not None else 0.0,
+        "bugungi_bajarilgan_buyurtmalar_soni": int(bajarilgan),
+        "bugungi_bajarilmagan_buyurtmalar_soni": int(bajarilmagan),
+    }
+
+
+def get_main_menu_stats(business_id: int, day: date) -> dict:
+    key = stats_cache_key(business_id, day)
+    stats = cache.get(key)
+    if stats is None:
+        stats = load_main_menu_stats(business_id, day)
+        cache.set(key, stats, settings.MAIN_MENU_STATS_TTL)
+    return stats
+
+
+def invalidate_main_menu_stats(*business_ids: int, day: date | None = None) -> None:
+    """Бизнес(лар) кэши транзакция commit бўлгач ўчирилади (транзакциядан ташқарида — дарҳол)."""
+    keys = [stats_cache_key(b, day or date.today()) for b in business_ids if b]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
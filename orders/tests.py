@@ -1,3 +1,484 @@
-from django.test import TestCase
+import json
+from datetime import date, time
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.utils import timezone
+
+from accounts.business_cache import business_cache
+from accounts.geo_index import geo_index
+from accounts.models import Business, GeoList
+from couriers.models import Kuryer
+from finance.models import Transaction
+from suv_kerak.cursors import decode_cursor, encode_cursor
+from suv_kerak.metrics import db_queries, request_latency
+from .models import Buyurtma, OrderNumCounter
+from .stats import stats_cache_key
+
+VILOYAT = "Қашқадарё вилояти"
+
+
+def _insert_business(business_id: int, **cols) -> None:
+    # accounts_business — managed=False, тест базасидаги жадвалда фақат керакли устунлар бор
+    values = {
+        "id": business_id,
+        "name": f"biz-{business_id}",
+        "created_at": "2025-01-01 00:00:00",
+        "sana": "2025-01-01",
+        "lang": "uz",
+        "viloyat": VILOYAT,
+        "order_num_scheme": "global",
+        "order_num_seq": 0,
+    }
+    values.update(cols)
+    sql = "INSERT INTO accounts_business ({}) VALUES ({})".format(
+        ", ".join(values), ", ".join(["%s"] * len(values))
+    )
+    with connection.cursor() as cur:
+        cur.execute(sql, list(values.values()))
+    business_cache.invalidate(business_id)  # олдинги тестдан қолган профил
+
+
+class CreateBuyurtmaQueriesTests(TestCase):
+    """create_buyurtma: бизнес қатори бир марта ўқилади, ҳаммаси битта транзакцияда."""
+
+    def setUp(self):
+        GeoList.objects.create(
+            viloyat=VILOYAT, shaxar_yoki_tuman_nomi="Қарши", shaxar_yoki_tuman="шаҳар",
+            center_lat=38.86, center_lng=65.79, radius_km=20,
+        )
+        geo_index.load()  # иссиқ индекс — ҳудуд текшируви БДга бормайди
+
+    def tearDown(self):
+        geo_index.invalidate()
+
+    def _post(self, business_id, **extra):
+        payload = {
+            "business_id": business_id,
+            "client_tel_num": "+998901234567",
+            "suv_soni": 2,
+            "lat": 38.87,
+            "lng": 65.80,
+        }
+        payload.update(extra)
+        return self.client.post("/orders/create/", json.dumps(payload), content_type="application/json")
+
+    def test_global_scheme_query_budget(self):
+        _insert_business(1)
+        business_cache.get(1)  # иссиқ профил
+        # counter upsert — алоҳида транзакцияда (тестда SAVEPOINT/RELEASE), кейин
+        # SAVEPOINT, SELECT ... FOR UPDATE, INSERT, UPDATE, RELEASE
+        with self.assertNumQueries(8):
+            resp = self._post(1)
+        self.assertEqual(resp.status_code, 201, resp.content)
+        # бўш базада ҳам биринчи буюртма ўз suv_soni'си билан (эски ҳисобда "01-01-01" эди)
+        self.assertEqual(Buyurtma.objects.get().order_num, "02-02-02")
+
+    def test_business_scheme_query_budget(self):
+        _insert_business(2, order_num_scheme="business")
+        business_cache.get(2)
+        # SAVEPOINT, SELECT ... FOR UPDATE, INSERT, UPDATE (counters + seq), RELEASE
+        with self.assertNumQueries(5):
+            resp = self._post(2)
+        self.assertEqual(resp.status_code, 201, resp.content)
+        self._post(2)
+        self.assertEqual(
+            list(Buyurtma.objects.order_by("id").values_list("order_num", flat=True)),
+            ["B2-000001", "B2-000002"],
+        )
+
+    def test_out_of_area_writes_nothing(self):
+        _insert_business(3)
+        resp = self._post(3, lat=41.31, lng=69.28)
+        self.assertEqual(resp.status_code, 400)
+        self.assertFalse(Buyurtma.objects.exists())
+        self.assertFalse(OrderNumCounter.objects.exists())  # рад этилган буюртма рақам олмайди
+
+    def test_scheme_switched_after_profile_cached(self):
+        _insert_business(4, order_num_scheme="business")
+        business_cache.get(4)
+        with connection.cursor() as cur:
+            cur.execute("UPDATE accounts_business SET order_num_scheme = 'global' WHERE id = 4")
+        # кэш эскирган — рақам қулфланган қатор схемаси бўйича шу транзакцияда ажратилади
+        resp = self._post(4)
+        self.assertEqual(resp.status_code, 201, resp.content)
+        self.assertEqual(resp.json()["order_num"], "02-02-02")
+
+    def test_unknown_business(self):
+        with self.assertNumQueries(1):  # профил SELECT — транзакция очилмайди
+            resp = self._post(999)
+        self.assertEqual(resp.status_code, 404)
+
+
+class CreateBuyurtmaBatchTests(TestCase):
+    """create_buyurtma_batch: рақам ва нархлар кетма-кет create_buyurtma билан бир хил."""
+
+    def setUp(self):
+        GeoList.objects.create(
+            viloyat=VILOYAT, shaxar_yoki_tuman_nomi="Қарши", shaxar_yoki_tuman="шаҳар",
+            center_lat=38.86, center_lng=65.79, radius_km=20,
+        )
+        geo_index.load()
+
+    def tearDown(self):
+        geo_index.invalidate()
+
+    def _post(self, business_id, orders):
+        return self.client.post(
+            "/orders/create-batch/",
+            json.dumps({"business_id": business_id, "orders": orders}),
+            content_type="application/json",
+        )
+
+    @staticmethod
+    def _order(suv_soni, lat=38.87, lng=65.80):
+        return {"client_tel_num": "+998901234567", "suv_soni": suv_soni, "lat": lat, "lng": lng}
+
+    def test_global_numbers_and_tiered_prices(self):
+        rules = [{"start": 0, "end": 4, "price": 10000}, {"start": 5, "end": None, "price": 8000}]
+        _insert_business(1, narxlar_diap_davri="monthly", oy_bosh_sotil_suv_soni=0,
+                         yil_bosh_sotil_suv_soni=0, service_price_rules=json.dumps(rules))
+        orders = [
+            self._order(2),
+            {"suv_soni": 1},                      # телефон йўқ
+            self._order(3),
+            self._order(1, lat=41.31, lng=69.28),  # ҳудуддан ташқари
+            self._order(1),
+        ]
+        business_cache.get(1)
+        # counter upsert (алоҳида: SAVEPOINT/RELEASE), SAVEPOINT, SELECT ... FOR UPDATE,
+        # bulk INSERT, UPDATE, RELEASE
+        with self.assertNumQueries(8):
+            resp = self._post(1, orders)
+        self.assertEqual(resp.status_code, 201, resp.content)
+        body = resp.json()
+        self.assertEqual((body["created"], body["failed"]), (3, 2))
+        ok = [it for it in body["items"] if it["ok"]]
+        self.assertEqual([it["index"] for it in ok], [0, 2, 4])
+        self.assertEqual([it["order_num"] for it in ok], ["02-02-02", "05-05-05", "06-06-06"])
+        self.assertEqual([it["suv_narxi"] for it in ok], [10000, 10000, 8000])
+
+        with connection.cursor() as cur:
+            cur.execute("SELECT oy_bosh_sotil_suv_soni FROM accounts_business WHERE id = 1")
+            self.assertEqual(cur.fetchone()[0], 6)
+
+    def test_batch_invalidates_main_menu_stats(self):
+        cache.clear()
+        _insert_business(1)
+        self.client.get("/orders/main-menu-stats/", {"boss_id": 1})
+        key = stats_cache_key(1, date.today())
+        self.assertIsNotNone(cache.get(key))
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self._post(1, [self._order(1), self._order(2)])  # bulk_create — сигналсиз
+            self.assertIsNotNone(cache.get(key))                      # commit'гача тегмайди
+        self.assertEqual(resp.status_code, 201, resp.content)
+        self.assertIsNone(cache.get(key))
+
+    @override_settings(ORDER_PRICING_MODE="tiered")
+    def test_tiered_mode_splits_across_bands(self):
+        rules = [{"start": 0, "end": 4, "price": 10000}, {"start": 5, "end": None, "price": 8000}]
+        _insert_business(1, narxlar_diap_davri="monthly", oy_bosh_sotil_suv_soni=0,
+                         yil_bosh_sotil_suv_soni=0, service_price_rules=json.dumps(rules))
+        resp = self._post(1, [self._order(4), self._order(3)])
+        self.assertEqual(resp.status_code, 201, resp.content)
+        # 2-буюртма: 4-ҳисоблагич 10000, 5 ва 6 — 8000 (flat режимда 3 × 10000)
+        self.assertEqual([it["tulov_summasi"] for it in resp.json()["items"]], ["40000", "26000"])
+
+        resp = self.client.post("/orders/create/", json.dumps({
+            "business_id": 1, "client_tel_num": "+998901234567", "suv_soni": 2, "lat": 38.87, "lng": 65.80,
+        }), content_type="application/json")
+        self.assertEqual(resp.status_code, 201, resp.content)
+        self.assertEqual(Buyurtma.objects.get(id=resp.json()["buyurtma_id"]).amount, 16000)
+
+    def test_business_scheme_continues_sequence(self):
+        _insert_business(2, order_num_scheme="business", order_num_seq=7)
+        resp = self._post(2, [self._order(1), self._order(2)])
+        self.assertEqual(resp.status_code, 201, resp.content)
+        self.assertEqual(
+            list(Buyurtma.objects.order_by("id").values_list("order_num", flat=True)),
+            ["B2-000008", "B2-000009"],
+        )
+        with connection.cursor() as cur:
+            cur.execute("SELECT order_num_seq FROM accounts_business WHERE id = 2")
+            self.assertEqual(cur.fetchone()[0], 9)
+
+
+class OrderCounterRebuildTests(TestCase):
+    """backfill_order_counters: жамилар buyurtmalar'дан, буюртмасиз даврлар ўчирилади."""
+
+    def test_rebuild_drops_stale_periods(self):
+        _insert_business(1)
+        Buyurtma.objects.create(business_id=1, sana=date(2025, 5, 2), vaqt=time(10, 0),
+                                client_tel_num="+998901234567", suv_soni=3, buyurtma_statusi="pending",
+                                lat=38.87, lng=65.80)
+        OrderNumCounter.objects.create(period="day", period_start=date(2025, 5, 2), total=9)
+        OrderNumCounter.objects.create(period="day", period_start=date(2025, 5, 1), total=4)  # бўшлиқ
+        OrderNumCounter.objects.create(period="year", period_start=date(2024, 1, 1), total=7)
+
+        out = StringIO()
+        call_command("backfill_order_counters", stdout=out)
+        self.assertIn("ўчирилди: 2", out.getvalue())
+        self.assertEqual(
+            sorted(OrderNumCounter.objects.values_list("period", "period_start", "total")),
+            [("day", date(2025, 5, 2), 3), ("month", date(2025, 5, 1), 3), ("year", date(2025, 1, 1), 3)],
+        )
+
+
+class SalesCounterRolloverTests(TestCase):
+    """Ой/йил ҳисоблагичлари: rollover_sales_counters буйруғи ва буюртмадаги дангаса текширув."""
+
+    @staticmethod
+    def _counters(business_id):
+        with connection.cursor() as cur:
+            cur.execute("SELECT oy_bosh_sotil_suv_soni, yil_bosh_sotil_suv_soni, hisob_oy_boshi, hisob_yil_boshi "
+                        "FROM accounts_business WHERE id = %s", [business_id])
+            oy, yil, oy_boshi, yil_boshi = cur.fetchone()
+        return oy, yil, str(oy_boshi), str(yil_boshi)
+
+    def test_command_resets_stale_and_is_idempotent(self):
+        _insert_business(1, oy_bosh_sotil_suv_soni=40, yil_bosh_sotil_suv_soni=90,
+                         hisob_oy_boshi="2025-04-01", hisob_yil_boshi="2025-01-01")
+        _insert_business(2, oy_bosh_sotil_suv_soni=7, yil_bosh_sotil_suv_soni=8)  # белгисиз
+        _insert_business(3, oy_bosh_sotil_suv_soni=5, yil_bosh_sotil_suv_soni=6,
+                         hisob_oy_boshi="2025-05-01", hisob_yil_boshi="2025-01-01")
+
+        call_command("rollover_sales_counters", "--date", "2025-05-03", stdout=StringIO())
+        self.assertEqual(self._counters(1), (0, 90, "2025-05-01", "2025-01-01"))
+        self.assertEqual(self._counters(2), (7, 8, "2025-05-01", "2025-01-01"))
+        self.assertEqual(self._counters(3), (5, 6, "2025-05-01", "2025-01-01"))
+
+        out = StringIO()
+        call_command("rollover_sales_counters", "--date", "2025-05-03", stdout=out)
+        self.assertIn("0 та, йил ҳисоблагичлари 0 та", out.getvalue())
+
+        call_command("rollover_sales_counters", "--date", "2026-01-01", stdout=StringIO())
+        self.assertEqual(self._counters(2), (0, 0, "2026-01-01", "2026-01-01"))
+
+    def test_order_rolls_over_stale_counter(self):
+        GeoList.objects.create(
+            viloyat=VILOYAT, shaxar_yoki_tuman_nomi="Қарши", shaxar_yoki_tuman="шаҳар",
+            center_lat=38.86, center_lng=65.79, radius_km=20,
+        )
+        geo_index.load()
+        self.addCleanup(geo_index.invalidate)
+        rules = [{"start": 0, "end": 99, "price": 10000}, {"start": 100, "end": None, "price": 8000}]
+        _insert_business(1, narxlar_diap_davri="monthly", oy_bosh_sotil_suv_soni=150, yil_bosh_sotil_suv_soni=150,
+                         hisob_oy_boshi="2000-01-01", hisob_yil_boshi="2000-01-01",
+                         service_price_rules=json.dumps(rules))
+
+        payload = {"business_id": 1, "client_tel_num": "+998901234567", "suv_soni": 3, "lat": 38.87, "lng": 65.80}
+        business_cache.get(1)
+        # қўшимча сўров йўқ: нолланиш ҳисоблагичлар UPDATE'ига қўшилади
+        with self.assertNumQueries(8):
+            resp = self.client.post("/orders/create/", json.dumps(payload), content_type="application/json")
+        self.assertEqual(resp.status_code, 201, resp.content)
+        self.assertEqual(resp.json()["suv_narxi"], 10000)
+
+        today = timezone.localdate()
+        self.assertEqual(self._counters(1), (3, 3, str(today.replace(day=1)), str(today.replace(month=1, day=1))))
+        self.client.post("/orders/create/", json.dumps(payload), content_type="application/json")
+        self.assertEqual(self._counters(1)[:2], (6, 6))
+
+
+class SalesCounterRecomputeTests(TestCase):
+    """recompute_sales_counters: buyurtmalar'дан ой/йил ҳисоблагичлари, --dry-run."""
+
+    def setUp(self):
+        _insert_business(1, oy_bosh_sotil_suv_soni=99, yil_bosh_sotil_suv_soni=99,
+                         hisob_oy_boshi="2025-05-01", hisob_yil_boshi="2025-01-01")
+        _insert_business(2, oy_bosh_sotil_suv_soni=3, yil_bosh_sotil_suv_soni=3,
+                         hisob_oy_boshi="2025-05-01", hisob_yil_boshi="2025-01-01")
+        _insert_business(3)  # буюртмасиз, ҳисоблагич NULL
+        self.kuryer = Kuryer.objects.create(sana="2025-01-01", kuryer_id=5001, kuryer_name="k",
+                                            tel_num="+998900000001", business_id=1, oy_bosh_sotil_suv_soni=1)
+        for business_id, sana, suv_soni, status in [
+            (1, "2024-12-31", 50, "delivered"),  # ўтган йил
+            (1, "2025-03-10", 4, "delivered"),
+            (1, "2025-05-02", 2, "delivered"),
+            (1, "2025-05-03", 5, "pending"),
+            (1, "2025-05-04", 7, "delivered"),  # --date'дан кейин
+            (2, "2025-05-01", 3, "pending"),
+        ]:
+            Buyurtma.objects.create(
+                business_id=business_id, sana=sana, vaqt="10:00", client_tel_num="+998901234567",
+                suv_soni=suv_soni, manzil="-", buyurtma_statusi=status,
+                kuryer=self.kuryer if status == "delivered" else None,
+            )
+
+    def _counters(self, business_id):
+        with connection.cursor() as cur:
+            cur.execute("SELECT oy_bosh_sotil_suv_soni, yil_bosh_sotil_suv_soni, hisob_oy_boshi "
+                        "FROM accounts_business WHERE id = %s", [business_id])
+            oy, yil, oy_boshi = cur.fetchone()
+        return oy, yil, str(oy_boshi)
+
+    def test_dry_run_then_fix(self):
+        out = StringIO()
+        call_command("recompute_sales_counters", "--date", "2025-05-03", "--dry-run", stdout=out)
+        self.assertIn("business id=1: oy 99 -> 7, yil 99 -> 11", out.getvalue())
+        self.assertIn("business id=3: oy None -> 0, yil None -> 0", out.getvalue())
+        self.assertIn("kuryer id=%s: oy 1 -> 2, yil 0 -> 6" % self.kuryer.id, out.getvalue())
+        self.assertNotIn("business id=2", out.getvalue())
+        self.assertEqual(self._counters(1), (99, 99, "2025-05-01"))
+
+        # 2 та ўқиш, 4 та GROUP BY (2 давр × 2 жадвал), ҳар жадвалга битта UPDATE + savepoint жуфти
+        with self.assertNumQueries(12):
+            call_command("recompute_sales_counters", "--date", "2025-05-03", stdout=StringIO())
+        self.assertEqual(self._counters(1), (7, 11, "2025-05-01"))
+        self.assertEqual(self._counters(2), (3, 3, "2025-05-01"))
+        self.assertEqual(self._counters(3), (0, 0, "2025-05-01"))
+        self.kuryer.refresh_from_db()
+        self.assertEqual((self.kuryer.oy_bosh_sotil_suv_soni, self.kuryer.yil_bosh_sotil_suv_soni), (2, 6))
+
+        out = StringIO()
+        call_command("recompute_sales_counters", "--date", "2025-05-03", stdout=out)
+        self.assertIn("business: 3 та текширилди, фарқли 0 та", out.getvalue())
+
+    def test_row_changed_after_read_is_skipped(self):
+        from orders import sales_counters
+
+        real = sales_counters._period_totals
+
+        def totals_then_new_order(*args, **kwargs):
+            # агрегатлар ўқилаётганда бизнес 1 га янги буюртма тушди
+            Business.objects.filter(id=1).update(oy_bosh_sotil_suv_soni=100)
+            return real(*args, **kwargs)
+
+        with mock.patch.object(sales_counters, "_period_totals", totals_then_new_order):
+            result = sales_counters.recompute_sales_counters(date(2025, 5, 3))
+        self.assertEqual(result["business"]["skipped"], 1)
+        self.assertEqual(self._counters(1)[:2], (100, 99))
+
+
+class ListPendingOrdersQueriesTests(TestCase):
+    """list_pending_orders: тўловлар ҳар буюртма учун эмас, битта сўров билан олинади."""
+
+    def test_payments_fetched_in_one_query(self):
+        _insert_business(1)
+        for n in range(5):
+            Buyurtma.objects.create(
+                business_id=1, sana="2025-05-01", vaqt=f"10:0{n}", client_tel_num="+998901234567",
+                suv_soni=1, buyurtma_statusi="pending", order_num=f"01-01-0{n}",
+                pay_status="completed_online" if n % 2 == 0 else "none",
+            )
+            Transaction.objects.create(transaction_id=f"t{n}", order_id=f"01-01-0{n}", amount=1000)
+
+        # буюртмалар + тўловлар
+        with self.assertNumQueries(2):
+            resp = self.client.get("/orders/pending-orders/", {"business_id": 1})
+        self.assertEqual(resp.status_code, 200)
+        items = resp.json()["items"]
+        self.assertEqual([it["buyurtma_id_raqami"] for it in items],
+                         ["01-01-04", "01-01-03", "01-01-02", "01-01-01", "01-01-00"])
+        self.assertEqual([len(it["online_payments"]) for it in items], [1, 0, 1, 0, 1])
+
+    def test_cursor_pages_fields_and_since(self):
+        _insert_business(1)
+        for n in range(5):
+            Buyurtma.objects.create(
+                business_id=1, sana="2025-05-01", vaqt="10:00", client_tel_num="+998901234567",
+                suv_soni=n + 1, buyurtma_statusi="pending", order_num=f"01-01-0{n}",
+            )
+
+        seen, cursor = [], None
+        while True:
+            params = {"business_id": 1, "limit": 2, "fields": "buyurtma_id_raqami,suv_soni"}
+            if cursor:
+                params["cursor"] = cursor
+            body = self.client.get("/orders/pending-orders/", params).json()
+            self.assertEqual(body["suv_soni_jami"], 15)
+            self.assertTrue(all(set(it) == {"buyurtma_id_raqami", "suv_soni"} for it in body["items"]))
+            seen += [it["buyurtma_id_raqami"] for it in body["items"]]
+            cursor = body["next_cursor"]
+            if not cursor:
+                break
+        # бир хил sana/vaqt — id бўйича тартиб, такрор ва тушиб қолиш йўқ
+        self.assertEqual(seen, ["01-01-04", "01-01-03", "01-01-02", "01-01-01", "01-01-00"])
+
+        # курсор suv_kerak/cursors.py'да (finance тарихи билан умумий): микросекундли vaqt ҳам
+        row = {"sana": date(2025, 5, 1), "vaqt": time(10, 0, 0, 500), "id": 7}
+        self.assertEqual(decode_cursor(encode_cursor(row)), (row["sana"], row["vaqt"], 7))
+        bad = self.client.get("/orders/pending-orders/", {"business_id": 1, "limit": 2, "cursor": "xx"})
+        self.assertEqual(bad.status_code, 400)
+
+        since = self.client.get("/orders/pending-orders/", {"business_id": 1, "since": "2000-01-01T00:00:00Z"})
+        server_time = since.json()["server_time"]
+        o = Buyurtma.objects.get(order_num="01-01-01")
+        o.buyurtma_statusi = "assigned"
+        o.save()
+        body = self.client.get("/orders/pending-orders/", {"business_id": 1, "since": server_time}).json()
+        self.assertEqual(body["items"], [])
+        self.assertEqual(body["removed"], ["01-01-01"])
+        self.assertEqual(body["suv_soni_jami"], 13)
+
+
+class MainMenuStatsCacheTests(TestCase):
+    """main_menu_stats: битта сўров, кэш, буюртма ўзгарганда кэш ўчади."""
+
+    def setUp(self):
+        cache.clear()
+        _insert_business(1)
+        self.order = Buyurtma.objects.create(
+            business_id=1, sana=date.today(), vaqt="10:00", client_tel_num="+998901234567",
+            suv_soni=1, buyurtma_statusi="on_way", order_num="01-01-01",
+        )
+
+    def _stats(self):
+        return self.client.get("/orders/main-menu-stats/", {"boss_id": 1}).json()
+
+    def test_single_query_then_cached(self):
+        with self.assertNumQueries(1):
+            body = self._stats()
+        self.assertEqual(body["bugungi_bajarilmagan_buyurtmalar_soni"], 1)
+        self.assertEqual(body["tizim_hisobi_balans"], 0.0)
+        with self.assertNumQueries(0):
+            self._stats()
+
+    def test_invalidated_on_order_change(self):
+        self._stats()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order.buyurtma_statusi = "delivered"
+            self.order.save()
+            # commit'гача кэш ўчирилмайди — параллел сўров эски қийматни қайта ёзиб қўймасин
+            self.assertEqual(self._stats()["bugungi_bajarilgan_buyurtmalar_soni"], 0)
+        body = self._stats()
+        self.assertEqual(body["bugungi_bajarilgan_buyurtmalar_soni"], 1)
+        self.assertEqual(body["bugungi_bajarilmagan_buyurtmalar_soni"], 0)
+
+    def test_invalidated_on_queryset_update(self):
+        self._stats()
+        with self.captureOnCommitCallbacks(execute=True):
+            Buyurtma.objects.filter(id=self.order.id).update(buyurtma_statusi="delivered")
+        self.assertEqual(self._stats()["bugungi_bajarilgan_buyurtmalar_soni"], 1)
+
+
+@override_settings(METRICS_ENABLED=True, METRICS_TOKEN="s3cret")
+class MetricsEndpointTests(TestCase):
+    """/metrics: токен билан ҳимояланган, route бўйича SQL сони ва вақт."""
+
+    def setUp(self):
+        request_latency.reset()
+        db_queries.reset()
+        self.client = Client()  # middleware занжири override_settings билан қайта қурилади
+
+    def test_token_required(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 401)
+        self.assertEqual(self.client.get("/metrics", {"token": "nope"}).status_code, 401)
+        with override_settings(METRICS_TOKEN=""):
+            self.assertEqual(Client().get("/metrics").status_code, 404)
+
+    def test_route_query_counts(self):
+        _insert_business(1)
+        self.client.get("/orders/pending-orders/", {"business_id": 1})
+        snap = db_queries.snapshot()["/orders/pending-orders/?"]
+        self.assertEqual((snap["count"], snap["sum"]), (1, 1))
+
+        resp = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer s3cret")
+        self.assertEqual(resp.status_code, 200)
+        body = resp.content.decode()
+        self.assertIn('suvkerak_db_queries_count{route="/orders/pending-orders/?"} 1', body)
+        self.assertIn('suvkerak_request_duration_ms_quantile{route="/orders/pending-orders/?",quantile="0.99"}', body)
@@ -1,9 +1,10 @@
 # orders/urls.py
 from django.urls import path, re_path
-from .views import main_menu_stats, create_buyurtma, list_pending_orders
+from .views import main_menu_stats, create_buyurtma, create_buyurtma_batch, list_pending_orders
 
 urlpatterns = [
     path("main-menu-stats/", main_menu_stats, name="main_menu_stats"),
     path("create/", create_buyurtma, name="create_buyurtma"),
+    path("create-batch/", create_buyurtma_batch, name="create_buyurtma_batch"),
     re_path(r"^pending-orders/?$", list_pending_orders, name="list_pending_orders"),
 ]
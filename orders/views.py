@@ -1,20 +1,28 @@
 # orders/views.py
+from django.conf import settings
 from django.shortcuts import render
 from django.http import JsonResponse, HttpResponseNotAllowed
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_GET, require_POST, require_http_methods
 from django.db import transaction, connection, IntegrityError, transaction
-from django.db.models import F, Sum
+from django.db.models import F, Q, Sum
 from django.db.models.functions import Coalesce
 from datetime import date
 import json
 from datetime import datetime
-from django.utils.dateparse import parse_date
+from django.utils.dateparse import parse_date, parse_datetime
 from django.utils import timezone
 from zoneinfo import ZoneInfo
 from accounts.models import Business
+from accounts.business_cache import business_cache
+from accounts.geo_index import geo_index, GeoIndexCold
 from finance.models import Transaction
 from .models import Buyurtma
+from .counters import bump_order_counters, reserve_order_counters
+from .sales_counters import roll_counters_if_due
+from .stats import get_main_menu_stats, invalidate_main_menu_stats
+from suv_kerak.cursors import decode_cursor, encode_cursor
+from finance.pricing import EMPTY as EMPTY_PRICE_TABLE, PriceTable, business_price_table
 from decimal import Decimal, InvalidOperation
 import os, requests, re
 import logging
@@ -32,44 +40,13 @@ def main_menu_stats(request):
 
     today = date.today()
 
-    with connection.cursor() as cur:
-        # 1) Тизим ҳисоби (user_boss → boss_id)
-        cur.execute("""
-            SELECT tizimdagi_balance
-            FROM public.business_system_account
-            WHERE business_id = %s
-            ORDER BY id DESC
-            LIMIT 1
-        """, [boss_id])
-        row = cur.fetchone()
-        tizim_balans = float(row[0]) if row else 0.0
-        
-        # 2) Бугунги бажарилган буюртмалар (delivered)
-        cur.execute("""
-            SELECT COUNT(*)
-            FROM public.buyurtmalar
-            WHERE sana = %s
-              AND business_id = %s
-              AND buyurtma_statusi = 'delivered'
-        """, [today, boss_id])
-        bugungi_bajarilgan_soni = cur.fetchone()[0]
-
-        # 3) Бугунги бажарилмаган буюртмалар (on_way, accepted)
-        cur.execute("""
-            SELECT COUNT(*)
-            FROM public.buyurtmalar
-            WHERE sana = %s
-              AND business_id = %s
-              AND buyurtma_statusi IN ('on_way','accepted')
-        """, [today, boss_id])
-        bugungi_bajarilmagan_soni = cur.fetchone()[0]
+    # Баланс ва бугунги буюртмалар — битта сўров, қисқа TTL'ли кэш (orders/stats.py)
+    stats = get_main_menu_stats(boss_id, today)
 
     return JsonResponse({
         "boss_id": boss_id,
         "business_id": boss_id,
-        "tizim_hisobi_balans": tizim_balans,
-        "bugungi_bajarilgan_buyurtmalar_soni": bugungi_bajarilgan_soni,
-        "bugungi_bajarilmagan_buyurtmalar_soni": bugungi_bajarilmagan_soni,
+        **stats,
     })
     
 try:
@@ -145,60 +122,97 @@ def _format_segment(n: int, min_width: int = 2) -> str:
     return result
 
 
-def _next_order_num(suv_soni: int) -> str:
+def _business_order_num(business_id: int, seq: int) -> str:
+    """business схемаси: бизнес префикси + кетма-кет рақам ("B12-000045")."""
+    return f"B{int(business_id)}-{_format_segment(seq, 6)}"
+
+
+def _global_order_nums(totals: tuple[int, int, int], counts: list[int]) -> list[str]:
     """
-    Йил/ой/кун кесимидаги ЖАМИ СУВ (бутилка) сонини ҳисоблайди.
-    Олдинги buyurtmalar'dаги suv_soni суммасини олади ва
-    жорий suv_soni'ни қўшиб сегментларни беради.
-    База мутлақо бўш бўлса — "01-01-01".
+    global схемаси: ҳисоблагичлар жами S = sum(counts) га оширилгандан кейинги
+    (y, m, d) жамилардан ҳар буюртма рақами — total - S + (i гача бўлган жами).
     """
-    suv_soni = int(suv_soni or 0)
-    if suv_soni <= 0:
-        suv_soni = 1  # хавфсизлик учун
+    y_count, m_count, d_count = totals
+    total = sum(counts)
+    nums, running = [], 0
+    for c in counts:
+        running += c
+        shift = total - running
+        # Формат: камида 2 разряд (масалан 03-03-03)
+        nums.append(
+            f"{_format_segment(y_count - shift, 2)}-"
+            f"{_format_segment(m_count - shift, 2)}-"
+            f"{_format_segment(d_count - shift, 2)}"
+        )
+    return nums
+
+
+def _order_counts(counts: list[int]) -> list[int]:
+    return [max(int(c or 0), 1) for c in counts]  # хавфсизлик учун камида 1
+
+
+def _reserve_order_nums(order_num_scheme: str, counts: list[int], today: date) -> list[str] | None:
+    """
+    global схемаси учун рақамларни буюртма транзакциясидан ОЛДИН, алоҳида қисқа
+    транзакцияда ажратади (reserve_order_counters). Йил қатори барча бизнесларга
+    битта — унинг қулфи буюртма транзакциясигача чўзилмайди.
+    Ажратилган рақам қайтарилмайди: буюртма кейин бекор бўлса, рақамда бўшлиқ қолади.
+
+    business схемасида None — рақам қулфланган бизнес қаторидан берилади.
+    """
+    if order_num_scheme == "business":
+        return None
+    counts = _order_counts(counts)
+    return _global_order_nums(reserve_order_counters(today, sum(counts)), counts)
+
+
+def _next_order_num(biz: Business, suv_soni: int, today: date,
+                    reserved: list[str] | None = None) -> tuple[str, int | None]:
+    """
+    Битта буюртма учун рақам (_allocate_order_nums() каби).
+    Қайтаради: (order_num, order_num_seq).
+    """
+    nums, seq = _allocate_order_nums(biz, [suv_soni], today, reserved=reserved)
+    return nums[0], seq
+
+
+def _allocate_order_nums(biz: Business, counts: list[int], today: date,
+                         reserved: list[str] | None = None) -> tuple[list[str], int | None]:
+    """
+    Бир нечта буюртма учун рақамларни БИР ҚАДАМДА беради (batch учун).
+    biz — _lock_business_for_order() қулфлаган қатор (order_num_scheme шундан).
+
+      - global:   Йил/ой/кун кесимидаги ЖАМИ СУВ (бутилка) сони buyurtma_order_counter
+                  ҳисоблагичларидан ("05-03-02"); рақамлар _reserve_order_nums()
+                  билан олдиндан ажратилган (reserved). Профил кэши эскирган бўлиб
+                  схема ҳозиргина global'га ўзгарган бўлса (reserved йўқ) — шу
+                  транзакциянинг ўзида ажратилади.
+      - business: order_num_seq + 1 ... order_num_seq + len(counts) ("B12-000045").
+                  Навбат фақат шу бизнес ичида; префикс туфайли рақамлар тўқнашмайди.
+
+    Қайтаради: (order_nums, охирги seq | None) — seq фақат business схемасида, уни
+    _inc_month_year_counters() ҳисоблагичлар билан бирга ёзади.
+    """
+    if biz.order_num_scheme == "business":
+        if reserved is not None:
+            logger.info("order_num: business %s схемаси business'га ўзгарган, "
+                        "ажратилган global рақамлар ишлатилмади: %s", biz.id, reserved)
+        base = int(biz.order_num_seq or 0)
+        seqs = range(base + 1, base + len(counts) + 1)
+        return [_business_order_num(biz.id, seq) for seq in seqs], base + len(counts)
+
+    if reserved is not None:
+        return reserved, None
+    counts = _order_counts(counts)
+    return _global_order_nums(bump_order_counters(today, sum(counts)), counts), None
 
-    now_uz = timezone.localtime(timezone.now())
-    today   = now_uz.date()
-    y_start = today.replace(month=1, day=1)
-    m_start = today.replace(day=1)
-
-    with transaction.atomic():
-        # Бир вақтда фақат битта воркер санаши учун advisory lock
-        with connection.cursor() as cur:
-            cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", ["buyurtma_order_num"])
-
-        # База мутлақо бўшми?
-        total_all = Buyurtma.objects.only("id").count()
-        if total_all == 0:
-            return "01-01-01"
-
-        # 🔢 Олдинги бутилка жами (order эмас, aynan suv_soni суммаси)
-        y_sum = Buyurtma.objects.filter(sana__gte=y_start, sana__lte=today)\
-                 .aggregate(total=Coalesce(Sum("suv_soni"), 0))["total"]
-        m_sum = Buyurtma.objects.filter(sana__gte=m_start, sana__lte=today)\
-                 .aggregate(total=Coalesce(Sum("suv_soni"), 0))["total"]
-        d_sum = Buyurtma.objects.filter(sana=today)\
-                 .aggregate(total=Coalesce(Sum("suv_soni"), 0))["total"]
-
-        # Жорий buyurtma бутилкаларини қўшамиз
-        y_count = int(y_sum) + suv_soni
-        m_count = int(m_sum) + suv_soni
-        d_count = int(d_sum) + suv_soni
 
-        # Формат: камида 2 разряд (масалан 03-03-03)
-        return f"{_format_segment(y_count, 2)}-{_format_segment(m_count, 2)}-{_format_segment(d_count, 2)}"
-    
-    
 # ------------------------------
-# Бизнесс ҳудудни текшириш (PostGIS)
+# Бизнесс ҳудудни текшириш (хотирадаги geo_index, совуқ бўлса — PostGIS)
 # ------------------------------
-def _within_business_area(business_id: int, lat: float, lng: float) -> bool:
-    # Business’dan viloyat’ни оламиз
-    viloyat = Business.objects.filter(id=business_id).values_list("viloyat", flat=True).first()
-    if not viloyat:
-        print(f"[AREA] business_id={business_id} uchun viloyat topilmadi")
-        return False
-
-    # 1) Энг яқин марказгача масофани ҳисоблаш (метрда), кейин кмга айлантирамиз
+def _nearest_center_postgis(viloyat: str, lat: float, lng: float):
+    """PostGIS орқали энг яқин марказ: (nomi, dist_km, radius_km) | None."""
+    # Энг яқин марказгача масофани ҳисоблаш (метрда), кейин кмга айлантирамиз
     sql = """
     SELECT
       g.shaxar_yoki_tuman_nomi,
@@ -219,105 +233,143 @@ def _within_business_area(business_id: int, lat: float, lng: float) -> bool:
         row = cur.fetchone()
 
     if not row:
+        return None
+    name, radius_km, dist_m = row
+    return name, float(dist_m) / 1000.0, float(radius_km or 0)
+
+
+def _within_business_area(business_id: int, lat: float, lng: float, viloyat: str | None = None) -> bool:
+    # Business’dan viloyat’ни оламиз (қулфланган қатордан берилмаган бўлса — профил кэшидан)
+    if viloyat is None:
+        profile = business_cache.get(business_id)
+        viloyat = profile.viloyat if profile else None
+    if not viloyat:
+        print(f"[AREA] business_id={business_id} uchun viloyat topilmadi")
+        return False
+
+    # 1) Энг яқин марказ: аввал хотирадаги индекс, у совуқ бўлсагина PostGIS
+    try:
+        nearest = geo_index.nearest(viloyat, float(lat), float(lng))
+        source = "index"
+    except GeoIndexCold as e:
+        logger.warning("geo_index cold (%s), PostGIS fallback", e)
+        nearest = _nearest_center_postgis(viloyat, lat, lng)
+        source = "postgis"
+
+    if not nearest:
         print(f"[AREA] viloyat='{viloyat}' uchun geo_list topilmadi")
         return False
 
-    name, radius_km, dist_m = row
-    dist_km = float(dist_m) / 1000.0
-    radius_km = float(radius_km or 0)
+    name, dist_km, radius_km = nearest
     ok = dist_km <= radius_km
 
     # 🔎 Консолга дебаг чиқиши:
     print(
         f"[AREA] biz_id={business_id} viloyat={viloyat} "
         f"target=({lat:.6f},{lng:.6f}) nearest='{name}' "
-        f"dist_km={dist_km:.3f} radius_km={radius_km:.0f} => ok={ok}"
+        f"dist_km={dist_km:.3f} radius_km={radius_km:.0f} src={source} => ok={ok}"
     )
 
     return ok
 
+# ------------------------------
+# Буюртма учун бизнес қаторини бир марта қулфлаб ўқиш
+# ------------------------------
+ORDER_BUSINESS_FIELDS = (
+    "viloyat", "narxlar_diap_davri", "oy_bosh_sotil_suv_soni", "yil_bosh_sotil_suv_soni",
+    "service_price_rules", "order_num_scheme", "order_num_seq", "hisob_oy_boshi", "hisob_yil_boshi",
+)
+
+
+def _lock_business_for_order(business_id: int) -> Business | None:
+    """
+    Бизнес қаторини SELECT ... FOR UPDATE билан БИР МАРТА ўқийди.
+    Шу объект мавжудлик, viloyat, нарх, order_num ва ҳисоблагичлар учун
+    қайта ишлатилади — транзакция охиригача бошқа буюртма кутиб туради.
+    Қайтаради: Business | None (топилмаса).
+    """
+    return (
+        Business.objects
+        .select_for_update()
+        .only(*ORDER_BUSINESS_FIELDS)
+        .filter(id=business_id)
+        .first()
+    )
+
+
 # ------------------------------
 # Бизнесс ID бўйича йил ва ой бошидан буюртма сонини санаш
 # ------------------------------
-def _inc_month_year_counters(business_id: int, suv_soni: int) -> int:
+def _inc_month_year_counters(business_id: int, suv_soni: int, order_num_seq: int | None = None,
+                             rollover: dict | None = None) -> int:
     """
     public.accounts_business.oy_bosh_sotil_suv_soni ва
     public.accounts_business.yil_bosh_sotil_suv_soni ни атомар равишда oshiradi.
     NULL -> 0 ҳисобланади, keyin + suv_soni қилади.
+    order_num_seq берилса (business схемаси), шу UPDATE'да бирга ёзилади.
+    rollover — roll_counters_if_due() натижаси: нолланган ҳисоблагич suv_soni'дан
+    бошланади, давр белгилари ҳам шу UPDATE'да ёзилади.
     Қайтарилади: update қилинган қаторлар сони (0 ёки 1).
     """
     suv_soni = int(suv_soni or 0)
-    if suv_soni <= 0:
+    fields = dict(rollover or {})
+    for counter in ("oy_bosh_sotil_suv_soni", "yil_bosh_sotil_suv_soni"):
+        if counter in fields:
+            fields[counter] += suv_soni
+        elif suv_soni > 0:
+            fields[counter] = Coalesce(F(counter), 0) + suv_soni
+    if order_num_seq is not None:
+        fields["order_num_seq"] = order_num_seq
+    if not fields:
         return 0
-    return Business.objects.filter(id=business_id).update(
-        oy_bosh_sotil_suv_soni = Coalesce(F("oy_bosh_sotil_suv_soni"), 0) + suv_soni,
-        yil_bosh_sotil_suv_soni = Coalesce(F("yil_bosh_sotil_suv_soni"), 0) + suv_soni,
-    )
+    return Business.objects.filter(id=business_id).update(**fields)
 
 # ------------------------------
 # Буюртмада сумма {ammount}ни аниклаш
 # ------------------------------
-def _calc_amount_for_order(business_id: int, suv_soni: int) -> tuple[Decimal, str, int, int]:
+def _business_pricing(biz: Business) -> tuple[str, int, PriceTable]:
     """
-    business_id ва suv_soni бўйича сумма (amount)ни ҳисоблайди.
-    Кайтарилади: (amount, period, counter_value, unit_price)
-
-    period: 'monthly' | 'yearly'
-    counter_value: narx tanlashда ишлатилган ҳисоблагич қиймати (ой/йил бошидан)
-    unit_price: танланган диапазон бўйича 1 сув нархи
+    (period, counter_value, нарх жадвали). Қоидалар бизнес бўйича бир марта
+    компиляция қилинади (finance/pricing.py). period конфиги йўқ/нотўғри
+    бўлса — бўш жадвал (0 сўм) ва counter_value=0.
     """
-    suv_soni = int(suv_soni or 0)
-    if suv_soni <= 0:
-        raise ValueError("suv_soni > 0 бўлиши керак")
-
-    # 🔒 бизнес қаторини қулфлаб ўқимоқдамиз (атомар ҳисоб)
-    biz = (
-        Business.objects
-        .select_for_update()
-        .only("narxlar_diap_davri", "oy_bosh_sotil_suv_soni", "yil_bosh_sotil_suv_soni", "service_price_rules")
-        .get(id=business_id)
-    )
-
     period = (biz.narxlar_diap_davri or "").strip().lower()
     if period not in {"monthly", "yearly"}:
-        # конфиг йўқ/нотўғри бўлса — 0 сўм
-        return Decimal("0"), period or "monthly", 0, 0
+        return period or "monthly", 0, EMPTY_PRICE_TABLE
 
     counter_value = int(biz.oy_bosh_sotil_suv_soni or 0) if period == "monthly" \
                     else int(biz.yil_bosh_sotil_suv_soni or 0)
+    return period, counter_value, business_price_table(biz.id, biz.service_price_rules)
 
-    # JSONB -> Python list[dict]
-    rules = biz.service_price_rules or []
-    # хавфсизлик: start бўйича сортлаймиз
-    try:
-        rules = sorted(rules, key=lambda r: int(r.get("start", 0)))
-    except Exception:
-        rules = []
 
-    unit_price = 0
-    for r in rules:
-        try:
-            start = int(r.get("start", 0))
-            end_raw = r.get("end", None)
-            end = None if end_raw is None else int(end_raw)
-            price = int(r.get("price", 0))
-        except Exception:
-            continue
+def _tiered_pricing() -> bool:
+    return getattr(settings, "ORDER_PRICING_MODE", "flat") == "tiered"
 
-        if counter_value >= start and (end is None or counter_value <= end):
-            unit_price = price
-            break
 
-    # агар ҳеч бири тўғри келмаса, охирги қоида end=null бўлса шуни, акс ҳолда 0 оламиз
-    if unit_price == 0 and rules:
-        last = rules[-1]
-        if last.get("end") is None:
-            try:
-                unit_price = int(last.get("price", 0))
-            except Exception:
-                unit_price = 0
+def _calc_amount_for_order(biz: Business, suv_soni: int) -> tuple[Decimal, str, int, int]:
+    """
+    Бизнес қатори ва suv_soni бўйича сумма (amount)ни ҳисоблайди.
+    biz — _lock_business_for_order() қулфлаган қатор (қайта ўқимаймиз).
+    Кайтарилади: (amount, period, counter_value, unit_price)
+
+    period: 'monthly' | 'yearly'
+    counter_value: narx tanlashда ишлатилган ҳисоблагич қиймати (ой/йил бошидан)
+    unit_price: танланган диапазон бўйича 1 сув нархи (tiered режимда — биринчи сувники)
+
+    ORDER_PRICING_MODE=tiered бўлса буюртма диапазон чегарасини кесиб ўтганда
+    ҳар сув ўзи тушган диапазон нархида ҳисобланади (PriceTable.amount).
+    """
+    suv_soni = int(suv_soni or 0)
+    if suv_soni <= 0:
+        raise ValueError("suv_soni > 0 бўлиши керак")
+
+    period, counter_value, table = _business_pricing(biz)
+    unit_price = table.unit_price(counter_value)
 
-    amount = Decimal(str(unit_price)) * Decimal(str(suv_soni))
+    if _tiered_pricing():
+        amount = Decimal(table.amount(counter_value, suv_soni))
+    else:
+        amount = Decimal(str(unit_price)) * Decimal(str(suv_soni))
     return amount, period, counter_value, unit_price
 
 
@@ -382,15 +434,7 @@ def create_buyurtma(request):
     if lat_in is None or lng_in is None:
         return JsonResponse({"detail": "lat/lng координаталари талаб қилинади."}, status=400)
 
-    # 6) Хизмат ҳудуди текшируви (бир марта)
-    try:
-        ok = _within_business_area(business_id, lat_f, lng_f)
-    except Exception:
-        return JsonResponse({"detail": _msg["check_failed"][lang]}, status=500)
-    if not ok:
-        return JsonResponse({"detail": _msg["out_of_area"][lang]}, status=400)
-
-    # 7) Диапазон ва Decimal га конверт (сақлаш учун)
+    # 6) Диапазон ва Decimal га конверт (сақлаш учун)
     try:
         lat = Decimal(str(lat_f)); lng = Decimal(str(lng_f))
     except InvalidOperation:
@@ -398,10 +442,7 @@ def create_buyurtma(request):
     if not (-90 <= lat <= 90 and -180 <= lng <= 180):
         return JsonResponse({"detail": "lat/lng кординаталар диапазони нотўғри."}, status=400)
 
-    if not Business.objects.filter(id=business_id).exists():
-        return JsonResponse({"detail": "Бундай business_id мавжуд эмас."}, status=404)
-
-    # 8) Қолган майдонлар
+    # 7) Қолган майдонлар
     acc = data.get("location_accuracy")
     src = (data.get("location_source") or "manual").lower()
     manzil = (data.get("manzil") or "").strip()    
@@ -411,50 +452,68 @@ def create_buyurtma(request):
 
     now_uz = timezone.localtime(timezone.now())
     
-    attempt = 0
-    last_err = None
-    while attempt < 5:
-        attempt += 1
-        order_num = _next_order_num(suv_soni)
-        print(f"Ордер рақами {order_num}")
-        try:
-            with transaction.atomic():
-                # 🆕 1) (ammount) Буюртма суммасини ҳисоблаш
-                amount, period, used_counter, unit_price = _calc_amount_for_order(business_id, suv_soni)
-                obj = Buyurtma.objects.create(
-                    business_id=business_id,
-                    sana=now_uz.date(),
-                    vaqt=now_uz.time().replace(microsecond=0),
-                    client_tg_id=(int(client_tg_id) if str(client_tg_id).isdigit() else None),
-                    client_tel_num=client_tel_num,
-                    suv_soni=suv_soni,
-                    manzil=manzil,
-                    manzil_izoh=manzil_izoh,
-                    buyurtma_statusi="pending",
-                    pay_status=_default_pay_status(),
-                    lat=lat,
-                    lng=lng,
-                    location_accuracy=(int(acc) if acc else None),
-                    location_source=src if src in {"tg", "manual", "geocode"} else "manual",
-                    order_num=order_num,  # 🆕
-                    amount=amount, # Буюртма суммаси
-                )
-                
-                 # 🆕 Ой/Йил бошидан сотилган сув сонини increment қиламиз (Автомар)
-                updated = _inc_month_year_counters(business_id, suv_soni)
-                if updated == 0:
-                    logger.warning("Business %s topilmadi, counters yangilanmadi", business_id)
-                    
-                logger.info("Price calc: period=%s, counter=%s -> unit=%s, amount=%s",
-                            period, used_counter, unit_price, str(amount))
+    # 8) Транзакциядан олдин: мавжудлик ва хизмат ҳудуди (профил кэши + хотирадаги
+    #    индекс — одатда БДга бормайди), кейин global схемада рақам алоҳида қисқа
+    #    транзакцияда ажратилади — рад этилган буюртма рақам олмайди.
+    profile = business_cache.get(business_id)
+    if profile is None:
+        return JsonResponse({"detail": "Бундай business_id мавжуд эмас."}, status=404)
+    try:
+        ok = _within_business_area(business_id, lat_f, lng_f, viloyat=profile.viloyat or "")
+    except Exception:
+        return JsonResponse({"detail": _msg["check_failed"][lang]}, status=500)
+    if not ok:
+        return JsonResponse({"detail": _msg["out_of_area"][lang]}, status=400)
+
+    # 9) Битта транзакция: бизнес қатори бир марта қулфланади ва нарх, order_num
+    #    ва ҳисоблагичлар учун қайта ишлатилади.
+    #    Сўровлар: [global: counter upsert — алоҳида], SELECT ... FOR UPDATE, INSERT, UPDATE.
+    try:
+        reserved = _reserve_order_nums(profile.order_num_scheme, [suv_soni], now_uz.date())
+        with transaction.atomic():
+            biz = _lock_business_for_order(business_id)
+            if biz is None:
+                return JsonResponse({"detail": "Бундай business_id мавжуд эмас."}, status=404)
+            # ой/йил алмашган бўлса ҳисоблагичлар (хотирада) нолланади — нарх янги даврдан
+            rollover = roll_counters_if_due(biz, now_uz.date())
+
+            # 🆕 (ammount) Буюртма суммасини ҳисоблаш
+            amount, period, used_counter, unit_price = _calc_amount_for_order(biz, suv_soni)
+
+            # 🔢 global: олдиндан ажратилган рақам; business: қулфланган қатордаги seq
+            order_num, order_seq = _next_order_num(biz, suv_soni, now_uz.date(), reserved=reserved)
+            print(f"Ордер рақами {order_num}")
+
+            obj = Buyurtma.objects.create(
+                business_id=business_id,
+                sana=now_uz.date(),
+                vaqt=now_uz.time().replace(microsecond=0),
+                client_tg_id=(int(client_tg_id) if str(client_tg_id).isdigit() else None),
+                client_tel_num=client_tel_num,
+                suv_soni=suv_soni,
+                manzil=manzil,
+                manzil_izoh=manzil_izoh,
+                buyurtma_statusi="pending",
+                pay_status=_default_pay_status(),
+                lat=lat,
+                lng=lng,
+                location_accuracy=(int(acc) if acc else None),
+                location_source=src if src in {"tg", "manual", "geocode"} else "manual",
+                order_num=order_num,  # 🆕
+                amount=amount, # Буюртма суммаси
+            )
+            
+            # 🆕 Ой/Йил ҳисоблагичлари (ва business схемасида order_num_seq) — битта UPDATE
+            updated = _inc_month_year_counters(business_id, suv_soni, order_num_seq=order_seq,
+                                               rollover=rollover)
+            if updated == 0:
+                logger.warning("Business %s topilmadi, counters yangilanmadi", business_id)
                 
-            break  # муваффақиятли яратилди
-        except IntegrityError as e:
-            # Масалан, order_num unique бузилса — яна бир марта уринамиз
-            last_err = e
-            continue
-    #print("attempt сигментида қўшилган разряд сони-", attempt, "та")        
-    if attempt >= 5 and last_err:
+            logger.info("Price calc: period=%s, counter=%s -> unit=%s, amount=%s",
+                        period, used_counter, unit_price, str(amount))
+    except IntegrityError:
+        # global схемада йил алмашганда эски рақам такрорланиши мумкин
+        logger.exception("order_num unique бузилди: business_id=%s", business_id)
         return JsonResponse(
             {"detail": "Ички рақамни яратишда муаммо. Илтимос, яна уриниб кўринг."},
             status=500
@@ -480,6 +539,215 @@ def create_buyurtma(request):
         }
     }, status=201)
     
+# ------------------------------
+# Буюртмаларни пакет билан яратиш (call-center импорти)
+# ------------------------------
+ORDER_BATCH_MAX = 200
+
+
+def _parse_batch_item(item) -> tuple[dict | None, str | None]:
+    """
+    Пакетдаги битта буюртмани текширади (create_buyurtma'даги қоидалар билан).
+    Қайтаради: (Buyurtma майдонлари, None) ёки (None, хато матни).
+    """
+    if not isinstance(item, dict):
+        return None, "Буюртма объект (dict) бўлиши керак."
+
+    client_tel_num = _normalize_phone(item.get("client_tel_num", ""))
+    if not client_tel_num:
+        return None, "Буюртмачи телефон рақами талаб қилинади."
+
+    try:
+        suv_soni = int(item.get("suv_soni") or 0)
+    except (TypeError, ValueError):
+        suv_soni = 0
+    if suv_soni <= 0:
+        return None, "Сув сони 1 дан катта бўлсин."
+
+    lat_in, lng_in = _extract_lat_lng(item)
+    if lat_in is None or lng_in is None:
+        return None, "lat/lng координаталари талаб қилинади."
+    try:
+        lat = Decimal(str(float(lat_in))); lng = Decimal(str(float(lng_in)))
+    except (TypeError, ValueError, InvalidOperation):
+        return None, "lat/lng формат нотўғри."
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return None, "lat/lng кординаталар диапазони нотўғри."
+
+    client_tg_id = item.get("client_tg_id")
+    acc = item.get("location_accuracy")
+    try:
+        acc = int(acc) if acc else None
+    except (TypeError, ValueError):
+        acc = None
+    src = (item.get("location_source") or "manual").lower()
+
+    return {
+        "client_tg_id": (int(client_tg_id) if str(client_tg_id).isdigit() else None),
+        "client_tel_num": client_tel_num,
+        "suv_soni": suv_soni,
+        "manzil": (item.get("manzil") or "").strip(),
+        # bulk_create save()'ни чақирмайди — Buyurtma.save()'даги тозалашни шу ерда қиламиз
+        "manzil_izoh": (item.get("manzil_izoh") or item.get("izoh") or "").strip() or None,
+        "lat": lat,
+        "lng": lng,
+        "location_accuracy": acc,
+        "location_source": src if src in {"tg", "manual", "geocode"} else "manual",
+    }, None
+
+
+@csrf_exempt
+@require_POST
+def create_buyurtma_batch(request):
+    """
+    Кириш (JSON): {"business_id": 12, "orders": [{client_tel_num, suv_soni, lat, lng, ...}, ...]}
+    Ҳар бир буюртма create_buyurtma'даги каби текширилади; яроқлилари битта
+    транзакцияда яратилади:
+      - ҳудуд текшируви бир ўтишда (хотирадаги geo_index), транзакциядан олдин;
+      - global схемада рақамлар алоҳида қисқа транзакцияда ажратилади;
+      - бизнес қатори бир марта қулфланади;
+      - нархлар кетма-кет ҳисобланади (ҳар буюртмадан кейин ой/йил ҳисоблагичи ошади);
+      - INSERT — bulk_create;
+      - ой/йил ҳисоблагичлари битта UPDATE билан оширилади.
+    Чиқиш: ҳар бир буюртма учун натижа ёки хато (index бўйича).
+    """
+    try:
+        data = json.loads((request.body or b"").decode("utf-8") or "{}")
+    except (ValueError, UnicodeDecodeError):
+        return JsonResponse({"detail": "JSON нотўғри."}, status=400)
+    if not isinstance(data, dict):
+        return JsonResponse({"detail": "JSON объект кутилмоқда."}, status=400)
+
+    try:
+        business_id = int(data.get("business_id") or 0)
+    except (TypeError, ValueError):
+        business_id = 0
+    if not business_id:
+        return JsonResponse({"detail": "business_id талаб қилинади."}, status=400)
+
+    orders = data.get("orders")
+    if not isinstance(orders, list) or not orders:
+        return JsonResponse({"detail": "orders рўйхати талаб қилинади."}, status=400)
+    if len(orders) > ORDER_BATCH_MAX:
+        return JsonResponse({"detail": f"Бир пакетда кўпи билан {ORDER_BATCH_MAX} та буюртма."}, status=400)
+
+    # 1) Майдонлар текшируви (БДсиз)
+    results = [None] * len(orders)
+    parsed = []  # [(index, fields)]
+    for i, item in enumerate(orders):
+        fields, err = _parse_batch_item(item)
+        if err:
+            results[i] = {"index": i, "ok": False, "detail": err}
+        else:
+            parsed.append((i, fields))
+
+    now_uz = timezone.localtime(timezone.now())
+    created = []  # [(index, Buyurtma, unit_price)]
+
+    profile = business_cache.get(business_id)
+    if profile is None:
+        return JsonResponse({"detail": "Бундай business_id мавжуд эмас."}, status=404)
+
+    # 2) Ҳудуд текшируви — бир ўтишда, транзакциядан олдин (профил кэшидаги viloyat)
+    accepted = []
+    for i, fields in parsed:
+        try:
+            ok = _within_business_area(business_id, float(fields["lat"]), float(fields["lng"]),
+                                       viloyat=profile.viloyat or "")
+        except Exception:
+            logger.exception("batch: ҳудуд текширувида хато (business_id=%s, index=%s)", business_id, i)
+            results[i] = {"index": i, "ok": False, "detail": "Локацияни текширишда носозлик."}
+            continue
+        if not ok:
+            results[i] = {"index": i, "ok": False, "detail": "Локация фаолият ҳудудидан ташқарида."}
+            continue
+        accepted.append((i, fields))
+
+    try:
+        # global схемада рақамлар алоҳида қисқа транзакцияда (фақат қабул қилинганларга)
+        reserved = None
+        if accepted:
+            reserved = _reserve_order_nums(
+                profile.order_num_scheme, [fields["suv_soni"] for _i, fields in accepted], now_uz.date()
+            )
+        with transaction.atomic():
+            biz = _lock_business_for_order(business_id)
+            if biz is None:
+                return JsonResponse({"detail": "Бундай business_id мавжуд эмас."}, status=404)
+            rollover = roll_counters_if_due(biz, now_uz.date())
+
+            if accepted:
+                # 3) Нархлар кетма-кет: ҳар буюртма ўзидан олдингилар сотилгандан кейинги диапазонда
+                # (битта жадвал, битта чақирув)
+                _period, counter, table = _business_pricing(biz)
+                quantities = [fields["suv_soni"] for _i, fields in accepted]
+                unit_prices = table.unit_prices(counter, quantities)
+                if _tiered_pricing():
+                    amounts = [Decimal(a) for a in table.amounts(counter, quantities)]
+                else:
+                    amounts = [Decimal(u) * n for u, n in zip(unit_prices, quantities)]
+                priced = [
+                    (i, fields, amount, unit_price)
+                    for (i, fields), amount, unit_price in zip(accepted, amounts, unit_prices)
+                ]
+
+                # 4) Рақамлар бир қадамда (global — олдиндан ажратилган)
+                order_nums, last_seq = _allocate_order_nums(
+                    biz, [fields["suv_soni"] for _i, fields, _a, _u in priced], now_uz.date(),
+                    reserved=reserved,
+                )
+
+                # 5) bulk INSERT
+                objs = [
+                    Buyurtma(
+                        business_id=business_id,
+                        sana=now_uz.date(),
+                        vaqt=now_uz.time().replace(microsecond=0),
+                        buyurtma_statusi="pending",
+                        pay_status=_default_pay_status(),
+                        order_num=order_num,
+                        amount=amount,
+                        **fields,
+                    )
+                    for (_i, fields, amount, _u), order_num in zip(priced, order_nums)
+                ]
+                objs = Buyurtma.objects.bulk_create(objs)
+                invalidate_main_menu_stats(business_id)  # bulk_create post_save юбормайди
+                created = [(i, obj, unit_price) for (i, _f, _a, unit_price), obj in zip(priced, objs)]
+
+                # 6) Ой/Йил ҳисоблагичлари (ва business схемасида order_num_seq) — битта UPDATE
+                _inc_month_year_counters(business_id, sum(obj.suv_soni for _i, obj, _u in created),
+                                         order_num_seq=last_seq, rollover=rollover)
+    except IntegrityError:
+        logger.exception("batch: order_num unique бузилди: business_id=%s", business_id)
+        return JsonResponse(
+            {"detail": "Ички рақамни яратишда муаммо. Илтимос, яна уриниб кўринг."},
+            status=500
+        )
+
+    for i, obj, unit_price in created:
+        results[i] = {
+            "index": i,
+            "ok": True,
+            "buyurtma_id": obj.id,
+            "order_num": obj.order_num,
+            "sana": str(obj.sana),
+            "vaqt": str(obj.vaqt),
+            "suv_soni": obj.suv_soni,
+            "suv_narxi": unit_price,
+            "tulov_summasi": obj.amount,
+        }
+
+    logger.info("batch: business_id=%s, created=%s, failed=%s",
+                business_id, len(created), len(orders) - len(created))
+    return JsonResponse({
+        "business_id": business_id,
+        "created": len(created),
+        "failed": len(orders) - len(created),
+        "items": results,
+    }, status=201 if created else 400)
+
+
 # ------------------------------
 # Бажарилмаган буюртмаларни рўйхатини қайтариш учун ёрдамчи функция
 # ------------------------------    
@@ -512,6 +780,35 @@ def _fmt_dt(dt):
     return dt.strftime("%d.%m.%y"), dt.strftime("%H:%M")
 
 
+# ------------------------------
+# Бажарилмаган буюртмалар: саҳифалаш (cursor), майдон танлаш, since
+# ------------------------------
+PENDING_PAGE_MAX = 500
+
+# жавобдаги майдон -> керакли устунлар (fields= танланганда фақат шулар ўқилади)
+PENDING_ITEM_COLUMNS = {
+    "buyurtma_sanasi":    ("sana",),
+    "buyurtma_vaqti":     ("vaqt",),
+    "izoh":               ("manzil_izoh",),
+    "buyurtmachi_id":     ("client_tg_id",),
+    "buyurtma_id_raqami": ("order_num",),
+    "suv_soni":           ("suv_soni",),
+    "location":           ("lat", "lng"),
+    "tulov_statusi":      ("pay_status",),
+    "online_payments":    ("pay_status", "order_num"),
+}
+
+
+def _parse_since(raw: str):
+    """ISO вақт (2025-05-01T10:00:00+05:00) -> aware datetime. Нотўғри бўлса ValueError."""
+    dt = parse_datetime(str(raw).strip())
+    if dt is None:
+        raise ValueError("since нотўғри")
+    if timezone.is_naive(dt):
+        dt = timezone.make_aware(dt)
+    return dt
+
+
 # ------------------------------
 # Бажарилмаган буюртмаларни рўйхатини қайтарувчи функция
 # ------------------------------   
@@ -520,75 +817,160 @@ def _fmt_dt(dt):
 def list_pending_orders(request):
     """
     Кириш: business_id (GET query ёки POST JSON)
+    Ихтиёрий:
+      limit  — саҳифа ҳажми (1..500). Берилмаса — аввалгидек бутун рўйхат.
+      cursor — олдинги жавобдаги next_cursor (keyset: sana, vaqt, id — камайиш тартибида).
+      fields — вергул билан: "buyurtma_id_raqami,suv_soni,location" (фақат шу майдонлар).
+      since  — ISO вақт: фақат шундан кейин ўзгарган буюртмалар; pending'дан чиққанлари
+               removed рўйхатида. Кейинги сўровга жавобдаги server_time берилади.
     Чиқиш: скриндаги жадвал учун руйхат
     """
-    # 1) business_id оламиз (GET ёки JSON)
+    # 1) параметрлар (GET ёки JSON)
     if request.method == "GET":
-        business_id = request.GET.get("business_id")
+        params = request.GET
     else:
         try:
-            import json
-            payload = json.loads((request.body or b"").decode("utf-8") or "{}")
+            params = json.loads((request.body or b"").decode("utf-8") or "{}")
         except Exception:
-            payload = {}
-        business_id = payload.get("business_id")
+            params = {}
+        if not isinstance(params, dict):
+            params = {}
+    business_id = params.get("business_id")
     print(f"business_id= {business_id}")
     try:
         business_id = int(business_id)
     except (TypeError, ValueError):
         return JsonResponse({"detail": "business_id талаб қилинади (integer)."}, status=400)
 
-    # 2) pending буюртмаларни оламиз (охиргилари аввал)
-    qs = (Buyurtma.objects
-          .filter(business_id=business_id, buyurtma_statusi="pending")
-          .order_by("-sana", "-vaqt"))
+    limit = params.get("limit")
+    if limit not in (None, ""):
+        try:
+            limit = int(limit)
+        except (TypeError, ValueError):
+            return JsonResponse({"detail": "limit integer бўлиши керак."}, status=400)
+        if not 1 <= limit <= PENDING_PAGE_MAX:
+            return JsonResponse({"detail": f"limit 1..{PENDING_PAGE_MAX} оралиғида бўлсин."}, status=400)
+    else:
+        limit = None
+
+    cursor = params.get("cursor") or None
+    if cursor:
+        try:
+            c_sana, c_vaqt, c_id = decode_cursor(str(cursor))
+        except ValueError:
+            return JsonResponse({"detail": "cursor нотўғри."}, status=400)
+
+    fields = params.get("fields")
+    if isinstance(fields, str):
+        fields = [f.strip() for f in fields.split(",") if f.strip()]
+    if fields:
+        unknown = [f for f in fields if f not in PENDING_ITEM_COLUMNS]
+        if unknown:
+            return JsonResponse({"detail": f"Номаълум майдон(лар): {', '.join(map(str, unknown))}"}, status=400)
+    else:
+        fields = list(PENDING_ITEM_COLUMNS)
+
+    since = params.get("since") or None
+    if since:
+        try:
+            since = _parse_since(since)
+        except ValueError:
+            return JsonResponse({"detail": "since ISO форматда бўлсин (2025-05-01T10:00:00+05:00)."}, status=400)
+
+    server_time = timezone.now()  # кейинги since учун (сўров бошлангандаги вақт)
+
+    # 2) pending буюртмаларни оламиз (охиргилари аввал) — модел эмас, фақат керакли устунлар
+    pending = Buyurtma.objects.filter(business_id=business_id, buyurtma_statusi="pending")
+    qs = pending.filter(updated_at__gt=since) if since else pending
+    if cursor:
+        qs = qs.filter(
+            Q(sana__lt=c_sana)
+            | Q(sana=c_sana, vaqt__lt=c_vaqt)
+            | Q(sana=c_sana, vaqt=c_vaqt, id__lt=c_id)
+        )
+
+    columns = {"id", "sana", "vaqt", "suv_soni"}  # cursor ва жами учун доим керак
+    for f in fields:
+        columns.update(PENDING_ITEM_COLUMNS[f])
+    qs = qs.order_by("-sana", "-vaqt", "-id").values(*sorted(columns))
+
+    if limit is None:
+        orders = list(qs)
+        next_cursor = None
+    else:
+        orders = list(qs[:limit + 1])
+        next_cursor = encode_cursor(orders[limit - 1]) if len(orders) > limit else None
+        orders = orders[:limit]
+
+    # 3) Онлайн тўланганларнинг тўловлари — БИТТА сўров (order_id IN ...), Python'да гуруҳлаймиз
+    #    order_num = transactions.order_id билан боғланяпти
+    online_nums = set()
+    if "online_payments" in fields:
+        online_nums = {o["order_num"] for o in orders
+                       if _human_pay_status(o["pay_status"]) == "Онлайн тўланди" and o["order_num"]}
+    payments_by_order = {}
+    if online_nums:
+        tx_qs = (Transaction.objects
+                 .filter(order_id__in=online_nums)
+                 .order_by("-updated_at")
+                 .values("updated_at", "amount", "order_id"))
+        for tx in tx_qs:
+            p_date, p_time = _fmt_dt(tx["updated_at"])
+            payments_by_order.setdefault(tx["order_id"], []).append({
+                "pay_date": p_date,                   # дд.мм.гг
+                "pay_time": p_time,                   # чч.мм
+                "amount":   str(tx["amount"]),        # decimal -> str
+                "order_id": tx["order_id"],
+            })
 
     rows = []
     total_suv_soni = 0
 
-    for o in qs:
-        buyurtma_sanasi = o.sana.strftime("%d.%m.%y") if o.sana else ""
-        buyurtma_vaqti  = o.vaqt.strftime("%H:%M")   if o.vaqt else ""
-        
-        # 🔹 Тулув статуси (онлайн ёки йўқ)
-        human_status = _human_pay_status(o.pay_status)
-
-        # 🔹 Агар онлайн тўлов бўлса, transactions’дан тўловлар рўйхатини оламиз
-        payments = []
-        if human_status == "Онлайн тўланди":
-            # order_num = transactions.order_id билан боғланяпти
-            tx_qs = (Transaction.objects
-                     .filter(order_id=o.order_num)
-                     .order_by("-updated_at")
-                     .values("updated_at", "amount", "order_id"))
-
-            for tx in tx_qs:
-                p_date, p_time = _fmt_dt(tx["updated_at"])
-                payments.append({
-                    "pay_date": p_date,                   # дд.мм.гг
-                    "pay_time": p_time,                   # чч.мм
-                    "amount":   str(tx["amount"]),        # decimal -> str
-                    "order_id": tx["order_id"],
-                })
-
-        rows.append({
-            "buyurtma_sanasi":   buyurtma_sanasi,                  # дд.мм.гг
-            "buyurtma_vaqti":    buyurtma_vaqti,                   # чч.мм
-            "izoh":              (o.manzil_izoh or ""),            # манзил изоҳ
-            "buyurtmachi_id":    o.client_tg_id,                   # telegram id
-            "buyurtma_id_raqami": o.order_num,                     # ичкий рақам
-            "suv_soni":          int(o.suv_soni or 0),
-            "location":          _point_wkt(o.lat, o.lng),         # "POINT (lng lat)"
-            "tulov_statusi":     _human_pay_status(o.pay_status),  # Онлайн тўланди / Тўланмаган
-            # 🆕 Онлайн бўлса — ҳар бир тўлов алоҳида объект сифатида
-            "online_payments":    payments,                   # [] ёки [{pay_date,...}, ...]
-        })
-        total_suv_soni += int(o.suv_soni or 0)
-
-    return JsonResponse({
+    for o in orders:
+        row = {}
+        if "buyurtma_sanasi" in fields:
+            row["buyurtma_sanasi"] = o["sana"].strftime("%d.%m.%y") if o["sana"] else ""   # дд.мм.гг
+        if "buyurtma_vaqti" in fields:
+            row["buyurtma_vaqti"] = o["vaqt"].strftime("%H:%M") if o["vaqt"] else ""       # чч.мм
+        if "izoh" in fields:
+            row["izoh"] = o["manzil_izoh"] or ""                       # манзил изоҳ
+        if "buyurtmachi_id" in fields:
+            row["buyurtmachi_id"] = o["client_tg_id"]                  # telegram id
+        if "buyurtma_id_raqami" in fields:
+            row["buyurtma_id_raqami"] = o["order_num"]                 # ичкий рақам
+        if "suv_soni" in fields:
+            row["suv_soni"] = int(o["suv_soni"] or 0)
+        if "location" in fields:
+            row["location"] = _point_wkt(o["lat"], o["lng"])           # "POINT (lng lat)"
+        if "tulov_statusi" in fields:
+            row["tulov_statusi"] = _human_pay_status(o["pay_status"])  # Онлайн тўланди / Тўланмаган
+        if "online_payments" in fields:
+            # 🆕 Онлайн бўлса — ҳар бир тўлов алоҳида объект сифатида ([] ёки [{pay_date,...}, ...])
+            row["online_payments"] = (payments_by_order.get(o["order_num"], [])
+                                      if _human_pay_status(o["pay_status"]) == "Онлайн тўланди" else [])
+        rows.append(row)
+        total_suv_soni += int(o["suv_soni"] or 0)
+
+    # саҳифа ёки since бўлса — жами бутун pending рўйхат бўйича (битта aggregate)
+    if limit is not None or since:
+        total_suv_soni = int(pending.aggregate(s=Sum("suv_soni"))["s"] or 0)
+
+    resp = {
         "business_id": business_id,
         "count": len(rows),
         "suv_soni_jami": total_suv_soni,
         "items": rows,
-    }, status=200)
+    }
+    if limit is not None:
+        resp["next_cursor"] = next_cursor
+    if since:
+        # since'дан кейин pending'дан чиққан (бириктирилган, бекор қилинган ва ҳ.к.) буюртмалар
+        resp["removed"] = list(
+            Buyurtma.objects
+            .filter(business_id=business_id, updated_at__gt=since)
+            .exclude(buyurtma_statusi="pending")
+            .values_list("order_num", flat=True)
+        )
+        resp["server_time"] = server_time.isoformat()
+    return JsonResponse(resp, status=200)
     
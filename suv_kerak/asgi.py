@@ -12,5 +12,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'suv_kerak.settings')
+os.environ.setdefault('SERVER_MODE', 'asgi')  # bots: async view'лар уланади
 
 application = get_asgi_application()
@@ -0,0 +1,26 @@
+# suv_kerak/cursors.py
+"""
+Keyset пагинация курсори: (sana, vaqt, id) — URL-хавфсиз base64 JSON.
+
+Буюртмалар рўйхати (orders) ва курьер қолдиқлари тарихи (finance) бир хил
+тартиб калитидан фойдаланади; курсор формати битта жойда.
+"""
+import base64
+import json
+from datetime import date, time
+
+
+def encode_cursor(row) -> str:
+    """row["sana"], row["vaqt"], row["id"] -> курсор."""
+    raw = json.dumps([row["sana"].isoformat(), row["vaqt"].isoformat(), row["id"]])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[date, time, int]:
+    """Курсор -> (sana, vaqt, id). Нотўғри бўлса ValueError."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        sana, vaqt, pk = json.loads(raw)
+        return date.fromisoformat(sana), time.fromisoformat(vaqt), int(pk)
+    except Exception as e:
+        raise ValueError("cursor нотўғри") from e
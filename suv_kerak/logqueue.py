@@ -0,0 +1,78 @@
+# suv_kerak/logqueue.py
+"""
+Навбатли лог handler'и: сўров оқими ёзувни фақат навбатга қўяди,
+форматлаш (json.dumps ҳам) ва stream'га ёзиш QueueListener оқимида бўлади.
+
+LOGGING'да:
+    "access_queue": {"class": "suv_kerak.logqueue.QueueStreamHandler", "formatter": "jsonline"}
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+
+
+class JsonLine:
+    """
+    Лог хабари сифатида dict: json.dumps фақат хабар форматланганда
+    (навбатли режимда — фон оқимида) бажарилади.
+    """
+    __slots__ = ("data",)
+
+    def __init__(self, data: dict):
+        self.data = data
+
+    def __str__(self):
+        return json.dumps(self.data, ensure_ascii=False)
+
+
+class QueueStreamHandler(logging.handlers.QueueHandler):
+    def __init__(self, stream=None, maxsize: int = 10000):
+        super().__init__(queue.Queue(maxsize=maxsize))
+        self.target = logging.StreamHandler(stream)
+        self.dropped = 0  # навбат тўлгани учун ташланган ёзувлар
+        self._listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        atexit.register(self.stop)
+
+    def setFormatter(self, fmt):
+        super().setFormatter(fmt)
+        self.target.setFormatter(fmt)
+
+    def _ensure_listener(self):
+        # gunicorn fork'идан кейин ҳар процесс ўз listener'ини бошлайди
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self.queue = queue.Queue(maxsize=self.queue.maxsize)
+            self._listener = logging.handlers.QueueListener(
+                self.queue, self.target, respect_handler_level=True
+            )
+            self._listener.start()
+            self._pid = os.getpid()
+
+    def prepare(self, record):
+        # Форматламаймиз — бу ишни listener оқими target handler'да қилади
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def emit(self, record):
+        self._ensure_listener()
+        super().emit(record)
+
+    def stop(self):
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()  # навбатдагиларни ёзиб тугатади
+            self._listener = None
+            self._pid = None
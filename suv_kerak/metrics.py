@@ -0,0 +1,118 @@
+# suv_kerak/metrics.py
+"""
+Процесс ичидаги сўров метрикалари (route бўйича) ва Prometheus матн формати.
+Калит — URL шаблони (request.resolver_match.route), шунинг учун
+id'ли йўллар калитларни кўпайтирмайди.
+
+  request_latency — сўров вақти (мс), AccessLogMiddleware ёзади;
+  db_queries      — сўровдаги SQL сони, MetricsMiddleware ёзади;
+  db_time         — сўровдаги жами SQL вақти (мс), MetricsMiddleware ёзади.
+"""
+import bisect
+import threading
+
+# Бакет чегаралари (мс); охиргиси +Inf
+LATENCY_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+# SQL сони бакетлари
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class LatencyHistogram:
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._routes = {}  # route -> [counts (len(buckets)+1), count, sum_ms]
+
+    def observe(self, route: str, duration_ms: float) -> None:
+        i = bisect.bisect_left(self.buckets, duration_ms)
+        with self._lock:
+            st = self._routes.get(route)
+            if st is None:
+                st = self._routes[route] = [[0] * (len(self.buckets) + 1), 0, 0.0]
+            st[0][i] += 1
+            st[1] += 1
+            st[2] += duration_ms
+
+    def snapshot(self) -> dict:
+        """{route: {"buckets": [(le, cumulative_count), ...], "count": n, "sum": s}}"""
+        with self._lock:
+            routes = {r: (list(c), n, s) for r, (c, n, s) in self._routes.items()}
+        out = {}
+        for route, (counts, n, s) in routes.items():
+            cum, acc = [], 0
+            for le, c in zip(self.buckets + (float("inf"),), counts):
+                acc += c
+                cum.append((le, acc))
+            out[route] = {"buckets": cum, "count": n, "sum": s}
+        return out
+
+    def reset(self) -> None:
+        with self._lock:
+            self._routes.clear()
+
+
+def quantile(buckets: list, q: float) -> float:
+    """
+    Кумулятив бакетлардан q-квантилни баҳолайди (бакет ичида чизиқли).
+    +Inf бакетга тушса — охирги чекли чегара қайтади.
+    """
+    total = buckets[-1][1] if buckets else 0
+    if total == 0:
+        return 0.0
+    rank = q * total
+    prev_le, prev_cum = 0.0, 0
+    for le, cum in buckets:
+        if cum >= rank:
+            if le == float("inf"):
+                return float(prev_le)
+            if cum == prev_cum:
+                return float(le)
+            return prev_le + (le - prev_le) * (rank - prev_cum) / (cum - prev_cum)
+        prev_le, prev_cum = le, cum
+    return float(prev_le)
+
+
+request_latency = LatencyHistogram()
+db_queries = LatencyHistogram(QUERY_COUNT_BUCKETS)
+db_time = LatencyHistogram()
+
+
+def _label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _le(le) -> str:
+    return "+Inf" if le == float("inf") else f"{le:g}"
+
+
+def _histogram_lines(name: str, help_text: str, snap: dict) -> list[str]:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for route in sorted(snap):
+        st, r = snap[route], _label(route)
+        for le, cum in st["buckets"]:
+            lines.append(f'{name}_bucket{{route="{r}",le="{_le(le)}"}} {cum}')
+        lines.append(f'{name}_sum{{route="{r}"}} {st["sum"]:.3f}')
+        lines.append(f'{name}_count{{route="{r}"}} {st["count"]}')
+    return lines
+
+
+def _quantile_lines(name: str, help_text: str, snap: dict) -> list[str]:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+    for route in sorted(snap):
+        r = _label(route)
+        for q in QUANTILES:
+            lines.append(f'{name}{{route="{r}",quantile="{q:g}"}} {quantile(snap[route]["buckets"], q):.3f}')
+    return lines
+
+
+def render_prometheus() -> str:
+    """Барча метрикалар Prometheus text exposition форматида."""
+    lat, dbq, dbt = request_latency.snapshot(), db_queries.snapshot(), db_time.snapshot()
+    lines = []
+    lines += _histogram_lines("suvkerak_request_duration_ms", "Request wall time (ms)", lat)
+    lines += _quantile_lines("suvkerak_request_duration_ms_quantile", "Estimated p50/p95/p99 request time (ms)", lat)
+    lines += _histogram_lines("suvkerak_db_queries", "SQL queries per request", dbq)
+    lines += _quantile_lines("suvkerak_db_queries_quantile", "Estimated p50/p95/p99 SQL queries per request", dbq)
+    lines += _histogram_lines("suvkerak_db_time_ms", "Total SQL time per request (ms)", dbt)
+    return "\n".join(lines) + "\n"
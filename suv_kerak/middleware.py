@@ -1,7 +1,18 @@
 # suv_kerak/middleware.py
-import time, json, logging
+import time, logging, random
+from contextlib import nullcontext
+from contextvars import ContextVar
 from datetime import datetime, timezone
 
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from .logqueue import JsonLine
+from .metrics import request_latency, db_queries, db_time
+
 logger = logging.getLogger("access")
 EXCLUDE_PATHS = ("/admin/js/", "/static/", "/favicon.ico", "/healthz")
 
@@ -11,12 +22,58 @@ def _client_ip(meta):
         return xff.split(",")[0].strip()
     return meta.get("REMOTE_ADDR")
 
+def _route_of(request):
+    # URL шаблони (масалан "orders/create/") — гистограмма калитлари чекланган бўлсин
+    match = getattr(request, "resolver_match", None)
+    if match is not None and match.route:
+        return "/" + match.route.lstrip("^").rstrip("$")
+    return "<unmatched>"
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise (фақат sync) + async йўл. Битта sync middleware ҳам ASGI'да бутун
+    занжирни оқимга ўтказади — статик бўлмаган сўров бу ерда тўғридан-тўғри
+    await қилинади, статик файл эса алоҳида оқимда очилади.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None):
+        super().__init__(get_response)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:  # DEBUG: дискдан қидиради
+            static_file = await sync_to_async(self.find_file, thread_sensitive=False)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve, thread_sensitive=False)(static_file, request)
+        return await self.get_response(request)
+
+
 class AccessLogMiddleware:
+    # ASGI'да занжир async қолади — async view'лар оқимга ўтказилмайди
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        # муваффақиятли (<400) сўровлардан қанча улуши логга ёзилади (1.0 — ҳаммаси)
+        self.sample_rate = float(getattr(settings, "ACCESS_LOG_SAMPLE_RATE", 1.0))
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
-        t0 = time.time()
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        t0 = time.perf_counter()
         path = request.path or ""
         status = None
         exc_info = None
@@ -30,16 +87,120 @@ class AccessLogMiddleware:
             raise
         finally:
             if not any(path.startswith(p) for p in EXCLUDE_PATHS):
-                rec = {
-                    "ts": datetime.now(timezone.utc).isoformat(),
-                    "path": path,
-                    "qs": request.META.get("QUERY_STRING", ""),
-                    "method": request.method,
-                    "status": status,
-                    "duration_ms": int((time.time() - t0) * 1000),
-                    "ip": _client_ip(request.META),
-                    "ua": request.META.get("HTTP_USER_AGENT", "")[:200],
-                    "exc": exc_info,  # фақат 500 ларда тўлади
-                }
-                logger.info(json.dumps(rec, ensure_ascii=False))
+                self._record(request, path, status, exc_info, (time.perf_counter() - t0) * 1000.0)
+
+    async def __acall__(self, request):
+        t0 = time.perf_counter()
+        path = request.path or ""
+        status = None
+        exc_info = None
+        try:
+            response = await self.get_response(request)
+            status = getattr(response, "status_code", None)
+            return response
+        except Exception as e:
+            status = 500
+            exc_info = repr(e)[:500]
+            raise
+        finally:
+            if not any(path.startswith(p) for p in EXCLUDE_PATHS):
+                self._record(request, path, status, exc_info, (time.perf_counter() - t0) * 1000.0)
+
+    def _record(self, request, path, status, exc_info, duration_ms):
+        request_latency.observe(_route_of(request), duration_ms)
+
+        if not logger.isEnabledFor(logging.INFO):
+            return  # лог ўчиқ — ёзув ясамаймиз
+        if (status or 0) < 400 and self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return  # муваффақиятли сўровлардан намуна (sampling)
+
+        # dict навбатга тушади; json.dumps handler оқимида (suv_kerak/logqueue.py)
+        logger.info(JsonLine({
+            "ts": datetime.now(timezone.utc).isoformat(),
+            "path": path,
+            "qs": request.META.get("QUERY_STRING", ""),
+            "method": request.method,
+            "status": status,
+            "duration_ms": round(duration_ms, 3),
+            "ip": _client_ip(request.META),
+            "ua": request.META.get("HTTP_USER_AGENT", "")[:200],
+            "exc": exc_info,  # фақат 500 ларда тўлади
+        }))
+
+
+class _QueryStats:
+    """Битта сўровдаги SQL сони ва вақти (connection.execute_wrapper)."""
+    __slots__ = ("count", "ms")
+
+    def __init__(self):
+        self.count = 0
+        self.ms = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        t0 = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.ms += (time.perf_counter() - t0) * 1000.0
+
+
+# async сўровнинг _QueryStats'и: БД иши бошқа оқимда бажарилади (sync_to_async
+# контекстни ўша оқимга кўчиради) — у ерда track_queries() ўз уланишига ўрнатади
+_current_stats = ContextVar("query_stats", default=None)
+
+
+def track_queries():
+    """
+    Жорий оқим уланишида SQL'ни ҳозирги async сўров статистикасига санайдиган
+    context manager (bots/async_views.offload_to_db_thread ишлатади). Метрика
+    ўчиқ ёки sync сўров бўлса — ҳеч нарса қилмайди.
+    """
+    stats = _current_stats.get()
+    return connection.execute_wrapper(stats) if stats is not None else nullcontext()
+
+
+class MetricsMiddleware:
+    """
+    Route бўйича SQL сони ва SQL вақтини йиғади (сўров вақтини AccessLogMiddleware
+    ёзади). Натижалар /metrics да (suv_kerak/views.py). METRICS_ENABLED=0 бўлса
+    Django бу middleware'ни умуман занжирга қўшмайди.
+
+    ASGI'да (async занжир) SQL фақат track_queries() ўрнатилган оқимларда
+    саналади — offload_to_db_thread view'лари; Django оддий sync view'ларни
+    ўзи оқимга ўтказганда уларнинг SQL'и /metrics'га тушмайди.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "METRICS_ENABLED", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = _QueryStats()
+        with connection.execute_wrapper(stats):
+            response = self.get_response(request)
+        self._record(request, stats)
+        return response
+
+    async def __acall__(self, request):
+        stats = _QueryStats()
+        token = _current_stats.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_stats.reset(token)
+        self._record(request, stats)
+        return response
 
+    @staticmethod
+    def _record(request, stats):
+        route = _route_of(request)
+        db_queries.observe(route, stats.count)
+        db_time.observe(route, stats.ms)
@@ -27,6 +27,58 @@ from django.utils import timezone
 TELEGRAM_BOT_TOKEN = os.getenv("BOT_TOKEN", "")
 BACKEND_BASE_URL = os.getenv("WEBHOOK_HOST", "")
 
+# "wsgi" (gunicorn sync worker'лари) ёки "asgi" — suv_kerak/asgi.py ўзи белгилайди;
+# asgi'да bots view'ларининг async вариантлари уланади (bots/async_views.py)
+SERVER_MODE = os.getenv("SERVER_MODE", "wsgi")
+# ASGI: БД билан ишлайдиган view'лар учун thread pool ҳажми (= БД уланишлари чеги)
+ASGI_DB_THREADS = int(os.getenv("ASGI_DB_THREADS", "16"))
+
+# Bot API манзили (локал Bot API сервер ёки бенчмарк учун сохта сервер)
+TELEGRAM_API_BASE = os.getenv("TELEGRAM_API_BASE", "https://api.telegram.org")
+# бот сессиясининг уланишлар пули ва битта update'ни кутиш чеги (сония)
+TELEGRAM_POOL_SIZE = int(os.getenv("TELEGRAM_POOL_SIZE", "20"))
+BOT_UPDATE_TIMEOUT = float(os.getenv("BOT_UPDATE_TIMEOUT", "30"))
+
+# Telegram webhook: "sync" — update сўров ичида ишланади; "queue" — навбатга қўйилиб,
+# дарҳол 200 қайтарилади (bots/webhook_queue.py)
+BOT_WEBHOOK_MODE = os.getenv("BOT_WEBHOOK_MODE", "sync")
+BOT_WEBHOOK_WORKERS = int(os.getenv("BOT_WEBHOOK_WORKERS", "8"))
+BOT_WEBHOOK_QUEUE_SIZE = int(os.getenv("BOT_WEBHOOK_QUEUE_SIZE", "1000"))
+BOT_WEBHOOK_RETRIES = int(os.getenv("BOT_WEBHOOK_RETRIES", "3"))
+BOT_WEBHOOK_RETRY_DELAY = float(os.getenv("BOT_WEBHOOK_RETRY_DELAY", "1.0"))
+
+# Чиқувчи Telegram хабарлари навбати (bots/outbox.py): хабар/сония чеклари,
+# параллел юборишлар, қайта уринишлар ва навбат ҳажми
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "25"))
+TELEGRAM_CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", "1"))
+TELEGRAM_GROUP_RATE = float(os.getenv("TELEGRAM_GROUP_RATE", str(20 / 60)))
+TELEGRAM_SEND_CONCURRENCY = int(os.getenv("TELEGRAM_SEND_CONCURRENCY", "16"))
+TELEGRAM_SEND_RETRIES = int(os.getenv("TELEGRAM_SEND_RETRIES", "4"))
+TELEGRAM_SEND_RETRY_DELAY = float(os.getenv("TELEGRAM_SEND_RETRY_DELAY", "1.0"))
+TELEGRAM_OUTBOX_SIZE = int(os.getenv("TELEGRAM_OUTBOX_SIZE", "10000"))
+
+# geo_list хотирадаги индексининг яшаш муддати (сония)
+GEO_INDEX_TTL = int(os.getenv("GEO_INDEX_TTL", "600"))
+
+# accounts_business профили (lang, viloyat, нарх қоидалари ...) кэшининг яшаш муддати (сония)
+BUSINESS_CACHE_TTL = int(os.getenv("BUSINESS_CACHE_TTL", "60"))
+
+# буюртма суммаси: flat — битта нарх (буюртмадан олдинги ҳисоблагич бўйича) × suv_soni;
+# tiered — ҳар сув ўзи тушган диапазон нархида (буюртма диапазон чегарасини кесиб ўтса)
+ORDER_PRICING_MODE = os.getenv("ORDER_PRICING_MODE", "flat")
+
+# main_menu_stats кэшининг яшаш муддати (сония)
+MAIN_MENU_STATS_TTL = int(os.getenv("MAIN_MENU_STATS_TTL", "15"))
+
+# курер сув/тара тарихи: назорат нуқтасидан кейин шунчадан кўп ҳаракат қайта ўйналса, янги нуқта (snapshot) қўйилади
+COURIER_STOCK_SNAPSHOT_EVERY = int(os.getenv("COURIER_STOCK_SNAPSHOT_EVERY", "100"))
+
+# audit_log: навбат + фон оқими (0 — сўров ичида дарҳол ёзиш)
+AUDIT_LOG_ASYNC = os.getenv("AUDIT_LOG_ASYNC", "1") == "1"
+AUDIT_LOG_BATCH_SIZE = int(os.getenv("AUDIT_LOG_BATCH_SIZE", "200"))
+AUDIT_LOG_FLUSH_INTERVAL = float(os.getenv("AUDIT_LOG_FLUSH_INTERVAL", "1.0"))
+AUDIT_LOG_QUEUE_SIZE = int(os.getenv("AUDIT_LOG_QUEUE_SIZE", "10000"))
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 # .env ни локалда юклаймиз (Heroku’да бу файл йўқ)
@@ -75,6 +127,14 @@ INSTALLED_APPS = [
     'bots.apps.BotsConfig', # suv_kerak боти
 ]
 
+# access лог: навбатли ёзиш ва муваффақиятли сўровлардан намуна улуши (0..1)
+ACCESS_LOG_ASYNC = os.getenv("ACCESS_LOG_ASYNC", "1") == "1"
+ACCESS_LOG_SAMPLE_RATE = float(os.getenv("ACCESS_LOG_SAMPLE_RATE", "1.0"))
+
+# /metrics (Prometheus): SQL сони/вақти йиғилади; токенсиз эндпоинт 404
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "0") == "1"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
@@ -100,6 +160,13 @@ LOGGING = {
             "formatter": "simple",
             "level": "INFO",
             "encoding": "utf-8",      # ✅ тўғри жой
+            "delay": True,            # файл биринчи ёзувда очилади (manage.py/тестлар бўш файл яратмасин)
+        },
+        # access лог — сўров оқими фақат навбатга қўяди, ёзиш фон оқимида
+        "access_queue": {
+            "class": "suv_kerak.logqueue.QueueStreamHandler",
+            "formatter": "jsonline",
+            "level": "INFO",
         },
     },
 
@@ -115,6 +182,12 @@ LOGGING = {
         "aiogram":           {"handlers": ["console"], "level": "INFO", "propagate": False},
         "aiogram.dispatcher":{"handlers": ["console"], "level": "INFO", "propagate": False},
         "django.request":    {"handlers": ["console"], "level": "WARNING", "propagate": False},
+        # AccessLogMiddleware (ACCESS_LOG_ASYNC=0 — консолга тўғридан-тўғри)
+        "access": {
+            "handlers": ["access_queue" if ACCESS_LOG_ASYNC else "console"],
+            "level": os.getenv("ACCESS_LOG_LEVEL", "INFO"),
+            "propagate": False,
+        },
     },
 
     # root каттиқ бўлмасин
@@ -125,7 +198,7 @@ LOGGING = {
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    "suv_kerak.middleware.StaticFilesMiddleware",  # WhiteNoise + async йўл (ASGI)
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.locale.LocaleMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -134,6 +207,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     "suv_kerak.middleware.AccessLogMiddleware",
+    "suv_kerak.middleware.MetricsMiddleware",  # METRICS_ENABLED=0 бўлса ўчиқ
 ]
 
 
@@ -21,6 +21,10 @@ from django.shortcuts import render, redirect
 from django.conf import settings
 from django.utils import translation
 from bots.suv_kerak_bot import aiogram_webhook_view
+from .views import metrics_view
+
+if settings.SERVER_MODE == "asgi":
+    from bots.async_views import aiogram_webhook_view_async as aiogram_webhook_view
 
 def lang_page(request):
     return render(request, "lang.html")   # templates/lang.html
@@ -48,6 +52,9 @@ urlpatterns = [
     # Бот URL’лари – фақат шу ерда
     path("bots/", include(("bots.urls", "bots"), namespace="bots")),
     path("aiogram-bot-webhook/", aiogram_webhook_view, name="aiogram_webhook"),
+
+    # Prometheus метрикалари (METRICS_ENABLED + METRICS_TOKEN)
+    path("metrics", metrics_view, name="metrics"),
 ]
 
 
@@ -0,0 +1,40 @@
+# suv_kerak/views.py
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotFound
+from django.views.decorators.http import require_GET
+
+from .metrics import render_prometheus
+
+
+def check_ops_token(request):
+    """
+    Ички (ops) эндпоинтлар учун METRICS_TOKEN текшируви:
+    `Authorization: Bearer <token>` ёки `?token=<token>`.
+    Рухсат бўлса — None, акс ҳолда тайёр жавоб (токен берилмаган — 404, нотўғри — 401).
+    """
+    token = getattr(settings, "METRICS_TOKEN", "")
+    if not token:
+        return HttpResponseNotFound()
+
+    auth = request.META.get("HTTP_AUTHORIZATION", "")
+    given = auth[7:] if auth.startswith("Bearer ") else request.GET.get("token", "")
+    if not hmac.compare_digest(given.encode(), token.encode()):
+        return HttpResponse("unauthorized\n", status=401, content_type="text/plain")
+    return None
+
+
+@require_GET
+def metrics_view(request):
+    """
+    Prometheus учун метрикалар (check_ops_token билан ҳимояланган).
+    METRICS_ENABLED берилмаган бўлса — 404.
+    """
+    if not getattr(settings, "METRICS_ENABLED", False):
+        return HttpResponseNotFound()
+    denied = check_ops_token(request)
+    if denied is not None:
+        return denied
+
+    return HttpResponse(render_prometheus(), content_type="text/plain; version=0.0.4; charset=utf-8")